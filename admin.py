@@ -4,11 +4,12 @@ CN Chinese Link - 管理后台
 """
 
 import streamlit as st
-import sqlite3
-import json
 import os
 from datetime import datetime
 
+import db
+import rollups
+
 # 数据库路径
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "chinese_learning.db")
 
@@ -40,10 +41,10 @@ def check_password():
     return False
 
 def get_db_connection():
-    """获取数据库连接"""
+    """获取数据库连接（复用连接，并确保索引迁移已执行）"""
     if not os.path.exists(DB_PATH):
         return None
-    return sqlite3.connect(DB_PATH)
+    return db.get_connection(DB_PATH)
 
 def show_user_stats(conn):
     """显示用户统计"""
@@ -93,35 +94,16 @@ def show_role_scene_stats(conn):
     """显示角色和场景统计"""
     st.header("🎭 角色 & 场景统计")
     
-    cursor = conn.execute("""
-        SELECT event_data FROM events 
-        WHERE event_name = 'conversation_started' AND event_data IS NOT NULL
-    """)
-    rows = cursor.fetchall()
+    # 直接读按天汇总表，耗时不随事件数增长
+    role_count = rollups.conversation_counts(conn, "role")
+    scene_count = rollups.conversation_counts(conn, "scene")
+    hsk_count = rollups.conversation_counts(conn, "hsk_level")
+    total = sum(role_count.values())
     
-    if not rows:
+    if not total:
         st.info("暂无对话数据")
         return
     
-    # 统计
-    role_count = {}
-    scene_count = {}
-    hsk_count = {}
-    
-    for row in rows:
-        try:
-            data = json.loads(row[0])
-            role = data.get("role", "未知")
-            scene = data.get("scene", "未知")
-            hsk = data.get("hsk_level", 3)
-            
-            role_count[role] = role_count.get(role, 0) + 1
-            scene_count[scene] = scene_count.get(scene, 0) + 1
-            hsk_count[hsk] = hsk_count.get(hsk, 0) + 1
-        except:
-            continue
-    
-    total = len(rows)
     st.metric("总对话次数", f"{total} 次")
     
     col1, col2 = st.columns(2)
@@ -184,9 +166,8 @@ def show_events(conn):
     """显示埋点事件"""
     st.header("📊 埋点事件")
     
-    # 事件类型统计
-    cursor = conn.execute("SELECT event_name, COUNT(*) FROM events GROUP BY event_name")
-    event_stats = dict(cursor.fetchall())
+    # 事件类型统计（汇总表）
+    event_stats = rollups.event_counts(conn)
     
     if not event_stats:
         st.info("暂无事件记录")
@@ -238,6 +219,9 @@ def main():
         st.error(f"数据库文件不存在: {DB_PATH}")
         return
     
+    # 汇总表追上最新事件（只处理上次之后新增的部分）
+    rollups.refresh(conn)
+    
     # 标签页
     tab1, tab2, tab3, tab4 = st.tabs(["👥 用户", "🎭 角色场景", "📚 生词本", "📊 事件"])
     
@@ -252,8 +236,6 @@ def main():
     
     with tab4:
         show_events(conn)
-    
-    conn.close()
 
 if __name__ == "__main__":
     main()
@@ -14,11 +14,31 @@ import tempfile
 import time
 import base64
 import hashlib
+import logging
 from datetime import datetime
-from openai import OpenAI
 import dashscope
 from dashscope.audio.tts import SpeechSynthesizer
 
+import cassettes
+import context_window
+import db
+import event_writer
+import json_stream
+import llm_gateway
+import mock_servers
+import opening_pool
+import pinyin_engine
+import prompts
+import response_cache
+import speculative
+import translation
+import tts_cache
+import tts_pool
+import tts_prefetch
+import tts_segments
+import tts_stream
+import wire_format
+
 # 尝试导入语音录制组件
 try:
     from streamlit_mic_recorder import mic_recorder
@@ -26,6 +46,8 @@ try:
 except ImportError:
     HAS_MIC_RECORDER = False
 
+logger = logging.getLogger(__name__)
+
 # ============================================================
 # API 配置 - 安全方式：从 Streamlit Secrets 读取
 # ============================================================
@@ -33,18 +55,32 @@ except ImportError:
 # 云端部署：在 Streamlit Cloud 的 Settings > Secrets 中配置
 
 def get_api_key(key_name, default=""):
-    """安全获取 API Key"""
+    """安全获取 API Key（Secrets 优先，其次环境变量）"""
     try:
-        return st.secrets.get(key_name, default)
+        return st.secrets.get(key_name, os.environ.get(key_name, default))
     except:
-        return default
+        return os.environ.get(key_name, default)
 
 DEEPSEEK_API_KEY = get_api_key("DEEPSEEK_API_KEY")
-DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+DEEPSEEK_BASE_URL = get_api_key("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 DASHSCOPE_API_KEY = get_api_key("DASHSCOPE_API_KEY")
 dashscope.api_key = DASHSCOPE_API_KEY
 
-DB_PATH = "chinese_learning.db"
+# 离线运行：指向 mock_servers.py 的 DashScope 替身，例如 http://127.0.0.1:8900/dashscope
+DASHSCOPE_MOCK_URL = get_api_key("DASHSCOPE_MOCK_URL")
+
+# 流式语音播放端点（tts_stream.py）的端口，设置后点击播放时收到第一块音频就开始播放
+TTS_STREAM_PORT = get_api_key("TTS_STREAM_PORT")
+# 浏览器访问播放端点的地址（经反向代理对外提供时设置），默认 http://127.0.0.1:端口
+TTS_STREAM_PUBLIC_URL = get_api_key("TTS_STREAM_PUBLIC_URL")
+
+DB_PATH = db.DB_PATH
+LLM_STREAMING = True  # 流式接收 DeepSeek 回复，中文内容边生成边显示
+SPECULATIVE_PREFETCH = False  # 预取推荐回复对应的 AI 回复（点击即出，但会多消耗 API 调用）
+RESPONSE_CACHE = True  # HSK 1-2 的对话在角色/场景/等级和完整上下文都相同时复用缓存的回复
+LAZY_TRANSLATION = True  # 回复不带英文翻译，点击「翻译」时再翻译（共享翻译记忆）
+EAGER_TTS = True  # AI 回复一到就在后台合成语音，点击播放时不用再等
+SEGMENTED_TTS = True  # 长回复按句切分并行合成再拼接（每句单独缓存）
 
 # ============================================================
 # 密码加密函数
@@ -141,140 +177,46 @@ ROLES = {
     }
 }
 
-# ============================================================
-# 多音字词典 - 用于纠正常见多音字
-# ============================================================
-POLYPHONE_DICT = {
-    # 常见多音字及其正确读音（使用SSML phoneme标注）
-    "行": {"银行": "háng", "行走": "xíng", "行业": "háng", "行为": "xíng", "行李": "xíng"},
-    "长": {"长大": "zhǎng", "长度": "cháng", "长辈": "zhǎng", "长江": "cháng", "成长": "zhǎng"},
-    "了": {"了解": "liǎo", "好了": "le", "完了": "le", "为了": "le", "了不起": "liǎo"},
-    "得": {"得到": "dé", "跑得快": "de", "觉得": "de", "得了": "dé", "取得": "dé"},
-    "地": {"地方": "dì", "慢慢地": "de", "地球": "dì", "土地": "dì"},
-    "还": {"还是": "hái", "还给": "huán", "还有": "hái", "归还": "huán"},
-    "觉": {"觉得": "jué", "睡觉": "jiào", "感觉": "jué", "午觉": "jiào"},
-    "教": {"教室": "jiào", "教书": "jiāo", "教育": "jiào", "教学": "jiāo"},
-    "乐": {"快乐": "lè", "音乐": "yuè", "乐趣": "lè", "乐器": "yuè"},
-    "难": {"难题": "nán", "困难": "nán", "难民": "nàn", "灾难": "nàn"},
-    "发": {"发现": "fā", "头发": "fà", "发展": "fā", "理发": "fà"},
-    "数": {"数学": "shù", "数数": "shǔ", "数字": "shù", "数一数": "shǔ"},
-    "重": {"重要": "zhòng", "重复": "chóng", "重量": "zhòng", "重新": "chóng"},
-    "干": {"干净": "gān", "干活": "gàn", "干部": "gàn", "干燥": "gān"},
-    "少": {"多少": "shǎo", "少年": "shào", "少数": "shǎo", "少女": "shào"},
-    "好": {"好吃": "hǎo", "爱好": "hào", "好人": "hǎo", "好奇": "hào"},
-    "分": {"分钟": "fēn", "分数": "fēn", "身分": "fèn", "成分": "fèn"},
-    "便": {"方便": "biàn", "便宜": "pián", "便利": "biàn", "大便": "biàn"},
-    "看": {"看见": "kàn", "看守": "kān", "看病": "kàn", "看护": "kān"},
-    "调": {"调查": "diào", "空调": "tiáo", "调整": "tiáo", "调动": "diào"},
-}
-
 HSK_LEVELS = {1: "HSK 1 - 初级入门", 2: "HSK 2 - 基础对话", 3: "HSK 3 - 日常交流", 4: "HSK 4 - 中级流利", 5: "HSK 5 - 高级应用", 6: "HSK 6 - 精通掌握"}
 
 # ============================================================
 # 数据库
 # ============================================================
 def init_database():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # 用户表
-    cursor.execute("""CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        nickname TEXT,
-        hsk_level INTEGER DEFAULT 3,
-        total_conversations INTEGER DEFAULT 0,
-        total_words_learned INTEGER DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        last_login TIMESTAMP
-    )""")
-
-    # 对话历史表（关联用户）
-    cursor.execute("""CREATE TABLE IF NOT EXISTS history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        role TEXT,
-        scene TEXT,
-        sender TEXT,
-        content TEXT,
-        pinyin TEXT,
-        english TEXT,
-        keywords TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )""")
-
-    # 生词本（关联用户）
-    cursor.execute("""CREATE TABLE IF NOT EXISTS vocab (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        word TEXT,
-        meaning TEXT,
-        context TEXT,
-        mastered INTEGER DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id),
-        UNIQUE(user_id, word)
-    )""")
-
-    # 埋点事件表
-    cursor.execute("""CREATE TABLE IF NOT EXISTS events (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        event_name TEXT,
-        event_data TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )""")
-
-    conn.commit()
-    conn.close()
+    """初始化表结构 - 每个进程只执行一次，之后的重跑直接返回"""
+    db.init_schema(DB_PATH)
 
 # ============================================================
 # 用户认证函数
 # ============================================================
 def register_user(email, password, nickname=None):
     """注册新用户"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     try:
         password_hash = hash_password(password)
-        cursor.execute(
-            "INSERT INTO users (email, password_hash, nickname) VALUES (?, ?, ?)",
-            (email.lower(), password_hash, nickname or email.split('@')[0])
-        )
-        conn.commit()
+        with db.unit_of_work(DB_PATH) as conn:
+            cursor = conn.execute(
+                "INSERT INTO users (email, password_hash, nickname) VALUES (?, ?, ?)",
+                (email.lower(), password_hash, nickname or email.split('@')[0])
+            )
         user_id = cursor.lastrowid
         return {"success": True, "user_id": user_id}
     except sqlite3.IntegrityError:
         return {"success": False, "error": "该邮箱已被注册 Email already registered"}
-    finally:
-        conn.close()
 
 def login_user(email, password):
     """用户登录"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, password_hash, nickname, hsk_level FROM users WHERE email = ?", (email.lower(),))
-        result = cursor.fetchone()
+        conn = db.get_connection(DB_PATH)
+        result = conn.execute("SELECT id, password_hash, nickname, hsk_level FROM users WHERE email = ?", (email.lower(),)).fetchone()
 
         if result and verify_password(password, result[1]):
             # 更新最后登录时间
-            cursor.execute("UPDATE users SET last_login = ? WHERE id = ?", (datetime.now(), result[0]))
-            conn.commit()
-            conn.close()
+            with db.unit_of_work(DB_PATH) as conn:
+                conn.execute("UPDATE users SET last_login = ? WHERE id = ?", (datetime.now(), result[0]))
             return {"success": True, "user_id": result[0], "nickname": result[2], "hsk_level": result[3]}
 
-        conn.close()
-
         # 如果没有找到用户，检查数据库是否有用户
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
-        conn.close()
+        user_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
 
         if user_count == 0:
             return {"success": False, "error": "数据库已重置，请重新注册 Database reset, please register again"}
@@ -285,11 +227,8 @@ def login_user(email, password):
 
 def get_user_info(user_id):
     """获取用户信息"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, email, nickname, hsk_level, total_conversations, total_words_learned, created_at FROM users WHERE id = ?", (user_id,))
-    result = cursor.fetchone()
-    conn.close()
+    conn = db.get_connection(DB_PATH)
+    result = conn.execute("SELECT id, email, nickname, hsk_level, total_conversations, total_words_learned, created_at FROM users WHERE id = ?", (user_id,)).fetchone()
     if result:
         return {
             "id": result[0], "email": result[1], "nickname": result[2],
@@ -299,132 +238,332 @@ def get_user_info(user_id):
     return None
 
 def update_user_stats(user_id, conversations_delta=0, words_delta=0):
-    """更新用户统计"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE users SET total_conversations = total_conversations + ?, total_words_learned = total_words_learned + ? WHERE id = ?",
-        (conversations_delta, words_delta, user_id)
-    )
-    conn.commit()
-    conn.close()
+    """更新用户统计（在外层 unit_of_work 中时随其一起提交）"""
+    with db.unit_of_work(DB_PATH) as conn:
+        conn.execute(
+            "UPDATE users SET total_conversations = total_conversations + ?, total_words_learned = total_words_learned + ? WHERE id = ?",
+            (conversations_delta, words_delta, user_id)
+        )
+        # 提交成功后才更新缓存，回滚时缓存保持不变
+        db.on_commit(lambda: patch_user_info_cache(user_id, conversations_delta, words_delta), DB_PATH)
+
+# ============================================================
+# 用户信息缓存（会话级）- 侧边栏每次重跑不再查数据库
+# ============================================================
+def get_cached_user_info(user_id):
+    """读穿缓存：会话内第一次查数据库，之后直接返回缓存"""
+    stats = st.session_state.setdefault("user_info_cache_stats", {"hits": 0, "misses": 0})
+    cached = st.session_state.get("user_info_cache")
+    if cached and cached["id"] == user_id:
+        stats["hits"] += 1
+        return cached
+    stats["misses"] += 1
+    user_info = get_user_info(user_id)
+    st.session_state.user_info_cache = user_info
+    return user_info
+
+def patch_user_info_cache(user_id, conversations_delta=0, words_delta=0):
+    """写入数据库后就地更新缓存的计数，不用重新查询"""
+    cached = st.session_state.get("user_info_cache")
+    if cached and cached["id"] == user_id:
+        cached["total_conversations"] += conversations_delta
+        cached["total_words_learned"] += words_delta
+
+def invalidate_user_info_cache():
+    """登录/注册/退出时清空缓存"""
+    st.session_state.user_info_cache = None
+
+def get_user_info_cache_stats():
+    """本会话缓存的命中/未命中次数"""
+    return dict(st.session_state.get("user_info_cache_stats", {"hits": 0, "misses": 0}))
+
+def log_user_info_cache_stats():
+    """会话结束（退出登录）时记录一次本会话的缓存命中情况，然后清零"""
+    stats = get_user_info_cache_stats()
+    if stats["hits"] or stats["misses"]:
+        logger.info("用户信息缓存：命中 %d 次，未命中 %d 次", stats["hits"], stats["misses"])
+    st.session_state.user_info_cache_stats = {"hits": 0, "misses": 0}
 
 # ============================================================
 # 埋点函数
 # ============================================================
 def track_event(event_name, event_data=None):
-    """记录用户行为事件"""
+    """记录用户行为事件 - 放入后台队列批量写入，不阻塞页面；
+    在 unit_of_work 中调用时随该事务一起提交"""
     user_id = st.session_state.get("user_id")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO events (user_id, event_name, event_data) VALUES (?, ?, ?)",
-        (user_id, event_name, json.dumps(event_data or {}))
-    )
-    conn.commit()
-    conn.close()
+    event_writer.record(user_id, event_name, event_data, DB_PATH)
 
 # ============================================================
 # 生词本函数（带用户ID）
 # ============================================================
 def save_word_to_vocab(word, meaning, context=""):
     user_id = st.session_state.get("user_id")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT OR REPLACE INTO vocab (user_id, word, meaning, context, mastered) VALUES (?, ?, ?, ?, 0)", (user_id, word, meaning, context))
-        conn.commit()
-        # 更新用户统计
-        if user_id:
-            update_user_stats(user_id, words_delta=1)
-        # 埋点
-        track_event("word_saved", {"word": word})
+        # 生词、用户统计、埋点合并为一个事务，一次点击只提交一次
+        with db.unit_of_work(DB_PATH) as conn:
+            conn.execute("INSERT OR REPLACE INTO vocab (user_id, word, meaning, context, mastered) VALUES (?, ?, ?, ?, 0)", (user_id, word, meaning, context))
+            # 更新用户统计
+            if user_id:
+                update_user_stats(user_id, words_delta=1)
+            # 埋点
+            track_event("word_saved", {"word": word})
         return True
     except:
         return False
-    finally:
-        conn.close()
 
 def get_all_vocab():
     user_id = st.session_state.get("user_id")
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = db.get_connection(DB_PATH)
     if user_id:
-        cursor.execute("SELECT id, word, meaning, context, created_at FROM vocab WHERE user_id = ? AND mastered = 0 ORDER BY created_at DESC", (user_id,))
+        cursor = conn.execute("SELECT id, word, meaning, context, created_at FROM vocab WHERE user_id = ? AND mastered = 0 ORDER BY created_at DESC", (user_id,))
     else:
-        cursor.execute("SELECT id, word, meaning, context, created_at FROM vocab WHERE mastered = 0 ORDER BY created_at DESC")
-    results = cursor.fetchall()
-    conn.close()
-    return results
+        cursor = conn.execute("SELECT id, word, meaning, context, created_at FROM vocab WHERE mastered = 0 ORDER BY created_at DESC")
+    return cursor.fetchall()
 
 def mark_word_mastered(word_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE vocab SET mastered = 1 WHERE id = ?", (word_id,))
-    conn.commit()
-    conn.close()
-    # 埋点
-    track_event("word_mastered", {"word_id": word_id})
+    with db.unit_of_work(DB_PATH) as conn:
+        conn.execute("UPDATE vocab SET mastered = 1 WHERE id = ?", (word_id,))
+        # 埋点
+        track_event("word_mastered", {"word_id": word_id})
 
 def delete_word(word_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM vocab WHERE id = ?", (word_id,))
-    conn.commit()
-    conn.close()
+    with db.unit_of_work(DB_PATH) as conn:
+        conn.execute("DELETE FROM vocab WHERE id = ?", (word_id,))
+
+# ============================================================
+# 对话历史（持久化 + 恢复）
+# ============================================================
+HISTORY_PAGE_SIZE = 20  # 每次恢复/加载更早对话的消息条数
+
+def append_history(role_name, scene, messages):
+    """把新消息追加到 history 表（只写本轮新增的消息）"""
+    user_id = st.session_state.get("user_id")
+    if not user_id or not messages:
+        return
+    rows = []
+    for msg in messages:
+        content = msg["content"]
+        if isinstance(content, dict):
+            rows.append((user_id, role_name, scene, msg["role"], content.get("chinese", ""), content.get("pinyin", ""),
+                         content.get("english", ""), json.dumps(content.get("keywords", []), ensure_ascii=False),
+                         json.dumps(content.get("suggestions", []), ensure_ascii=False)))
+        else:
+            rows.append((user_id, role_name, scene, msg["role"], str(content), None, None, None, None))
+    with db.unit_of_work(DB_PATH) as conn:
+        conn.executemany(
+            "INSERT INTO history (user_id, role, scene, sender, content, pinyin, english, keywords, suggestions) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+def load_history(role_name, scene, before_id=None, limit=HISTORY_PAGE_SIZE):
+    """按页读取历史，从新往旧翻
+
+    返回 (messages, oldest_id, has_more)：messages 按时间正序，
+    oldest_id 作为下一页的 before_id。
+    """
+    user_id = st.session_state.get("user_id")
+    if not user_id:
+        return [], None, False
+    conn = db.get_connection(DB_PATH)
+    columns = "id, sender, content, pinyin, english, keywords, suggestions"
+    if before_id:
+        cursor = conn.execute(
+            f"SELECT {columns} FROM history WHERE user_id = ? AND role = ? AND scene = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (user_id, role_name, scene, before_id, limit + 1)
+        )
+    else:
+        cursor = conn.execute(
+            f"SELECT {columns} FROM history WHERE user_id = ? AND role = ? AND scene = ? ORDER BY id DESC LIMIT ?",
+            (user_id, role_name, scene, limit + 1)
+        )
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    messages = []
+    for row_id, sender, content, pinyin, english, keywords, suggestions in reversed(rows):
+        if sender == "assistant":
+            content = {
+                "chinese": content or "", "pinyin": pinyin or "", "english": english or "",
+                "keywords": json.loads(keywords) if keywords else [],
+                "suggestions": json.loads(suggestions) if suggestions else [],
+            }
+        messages.append({"role": sender, "content": content})
+    oldest_id = rows[-1][0] if rows else None
+    return messages, oldest_id, has_more
+
+def load_earlier_history(role_name, scene):
+    """加载更早一页并插到当前对话前面"""
+    older, oldest_id, has_more = load_history(role_name, scene, before_id=st.session_state.get("history_before_id"))
+    if older:
+        st.session_state.messages = older + st.session_state.messages
+        st.session_state.history_before_id = oldest_id
+        # 语音/翻译状态按消息下标保存，插入后下标整体后移，需要清掉
+        for key in [k for k in st.session_state.keys() if k.startswith(("audio_", "show_trans_"))]:
+            del st.session_state[key]
+    st.session_state.history_has_more = has_more
 
 # ============================================================
 # DeepSeek LLM
 # ============================================================
-def get_deepseek_response(messages, role_name, scene, hsk_level):
-    try:
-        client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL, timeout=30.0)
-        role_info = ROLES[role_name]
+DEEPSEEK_PARAMS = dict(model="deepseek-chat", temperature=0.8, max_tokens=1000, response_format={"type": "json_object"})
+REPLY_FIELDS = ["chinese", "pinyin", "english", "keywords", "suggestions"]
+# 回复无法解析出中文内容时的兜底回复（不写入回复缓存）
+FALLBACK_REPLY = {"chinese": "抱歉，我没听清，请再说一遍。", "pinyin": "bào qiàn, wǒ méi tīng qīng", "english": "Sorry, I didn't catch that.", "keywords": [], "suggestions": ["请再说一遍", "好的"]}
 
-        system_prompt = f"""你是中文学习应用中的虚拟角色。
-角色: {role_name} ({role_info['title']})
-性格: {role_info['personality']}
-场景: {scene}
-学生水平: HSK {hsk_level}
 
-回复规则:
-1. 沉浸角色，用符合身份的语气说话
-2. 根据HSK{hsk_level}级调整用语难度
-3. 回复简洁自然(1-3句话)
+def build_deepseek_messages(messages, role_name, scene, hsk_level):
+    role_info = ROLES[role_name]
+    system_prompt = prompts.render_system_prompt(role_name, role_info["title"], role_info["personality"], scene, hsk_level,
+                                                 include_english=not LAZY_TRANSLATION)
+    return [{"role": "system", "content": system_prompt}] + messages
 
-输出JSON格式:
-{{"chinese": "中文回复", "pinyin": "拼音", "english": "英文翻译", "keywords": [{{"word": "生词", "meaning": "释义"}}], "suggestions": [{{"cn": "中文回复选项1", "en": "English option 1"}}, {{"cn": "中文回复选项2", "en": "English option 2"}}, {{"cn": "中文回复选项3", "en": "English option 3"}}]}}
 
-只返回JSON！"""
+def normalize_reply(result):
+    """补齐缺失字段，拼音由本地生成"""
+    for field in REPLY_FIELDS:
+        if field not in result:
+            result[field] = "" if field in ["chinese", "pinyin", "english"] else []
+    result["pinyin"] = pinyin_engine.to_pinyin(result["chinese"])
+    return result
 
-        full_messages = [{"role": "system", "content": system_prompt}] + messages
 
-        with st.spinner(f"⏳ {role_name} 正在思考..."):
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=full_messages,
-                temperature=0.8,
-                max_tokens=1000,
-                response_format={"type": "json_object"}
-            )
+def opening_messages(role_name, scene):
+    return [{"role": "user", "content": f"（场景开始：{scene}）请你作为{role_name}先开口说第一句话。"}]
+
+
+def generate_reply(messages, role_name, scene, hsk_level):
+    """非流式请求一条回复（后台线程用，不调用界面函数，失败时抛出异常）"""
+    gateway = llm_gateway.get_gateway(DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL)
+    full_messages = build_deepseek_messages(messages, role_name, scene, hsk_level)
+    response = gateway.chat(full_messages, **DEEPSEEK_PARAMS)
+    return normalize_reply(wire_format.decode(response.choices[0].message.content))
+
+
+def generate_opening(role_name, scene, hsk_level):
+    """生成一条开场白（开场白池后台补充用）"""
+    return generate_reply(opening_messages(role_name, scene), role_name, scene, hsk_level)
+
+
+def translate_with_deepseek(chinese):
+    """把一句中文翻译成英文（不调用界面函数，失败时抛出异常）"""
+    gateway = llm_gateway.get_gateway(DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL)
+    messages = [
+        {"role": "system", "content": "Translate the Chinese sentence into natural English. Return only the translation."},
+        {"role": "user", "content": chinese},
+    ]
+    response = gateway.chat(messages, model="deepseek-chat", temperature=0, max_tokens=200)
+    return response.choices[0].message.content.strip()
+
+
+def summarize_conversation(summary, messages):
+    """把移出上下文窗口的几轮对话合并进已有摘要（在后台线程执行，不调用界面函数）"""
+    gateway = llm_gateway.get_gateway(DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL)
+    dialogue = "\n".join(f"{'学生' if m['role'] == 'user' else '角色'}：{m['content']}" for m in messages)
+    prompt = f"""已有摘要：{summary or "（无）"}
+
+新的对话：
+{dialogue}
+
+把新的对话合并进已有摘要，保留学生透露的个人信息、话题进展和用过的生词，不超过150字。只返回摘要。"""
+    response = gateway.chat([{"role": "user", "content": prompt}], model="deepseek-chat", temperature=0.3, max_tokens=300)
+    return response.choices[0].message.content.strip()
+
+
+def get_speculator():
+    """当前会话的推荐回复预取器"""
+    if "speculator" not in st.session_state:
+        st.session_state.speculator = speculative.Speculator()
+    return st.session_state.speculator
 
-        result = json.loads(response.choices[0].message.content)
 
-        for field in ["chinese", "pinyin", "english", "keywords", "suggestions"]:
-            if field not in result:
-                result[field] = "" if field in ["chinese", "pinyin", "english"] else []
-        return result
-    except json.JSONDecodeError as e:
+def prefetch_suggestion_replies(suggestions, role_name, scene, hsk_level):
+    """在后台为每个推荐回复提前生成 AI 回复"""
+    messages = st.session_state.messages
+    texts = [sug.get("cn", "") if isinstance(sug, dict) else sug for sug in suggestions]
+    # 请求内容在页面线程里准备好，后台线程不读 session_state
+    payloads = {text: get_context_window().preview(messages + [{"role": "user", "content": text}]) for text in texts if text}
+    get_speculator().prefetch(
+        messages[-1], texts,
+        lambda text: generate_reply(payloads[text], role_name, scene, hsk_level)
+    )
+
+
+def get_cached_reply(cache_key, text):
+    """查回复缓存；学生重复上一句（想换个回答）或缓存的回复本次对话已经说过时不用，避免原地打转"""
+    user_texts = [m["content"] for m in st.session_state.messages if m["role"] == "user"]
+    repeated = len(user_texts) >= 2 and response_cache.normalize_text(user_texts[-2]) == response_cache.normalize_text(text)
+    cached = response_cache.get(cache_key, bypass=repeated, db_path=DB_PATH)
+    if cached is None:
+        return None
+    said = {m["content"].get("chinese") for m in st.session_state.messages if m["role"] == "assistant" and isinstance(m["content"], dict)}
+    return None if cached.get("chinese") in said else cached
+
+
+def get_context_window():
+    """当前会话的上下文窗口"""
+    if "context_window" not in st.session_state:
+        st.session_state.context_window = context_window.ContextWindow(summarize_conversation)
+    return st.session_state.context_window
+
+
+def get_deepseek_response(messages, role_name, scene, hsk_level, reply_slot=None):
+    try:
+        gateway = llm_gateway.get_gateway(DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL)
+        full_messages = build_deepseek_messages(messages, role_name, scene, hsk_level)
+
+        if LLM_STREAMING:
+            result = stream_deepseek_response(gateway, full_messages, role_name, DEEPSEEK_PARAMS, reply_slot)
+        else:
+            with st.spinner(f"⏳ {role_name} 正在思考..."):
+                response = gateway.chat(full_messages, **DEEPSEEK_PARAMS)
+            result = wire_format.decode(response.choices[0].message.content)
+
+        return normalize_reply(result)
+    except wire_format.DecodeError as e:
         st.error(f"❌ JSON解析错误: {e}")
-        return {"chinese": "抱歉，我没听清，请再说一遍。", "pinyin": "bào qiàn, wǒ méi tīng qīng", "english": "Sorry, I didn't catch that.", "keywords": [], "suggestions": ["请再说一遍", "好的"]}
+        return dict(FALLBACK_REPLY)
     except Exception as e:
         st.error(f"❌ DeepSeek API 错误: {str(e)}")
         st.info("💡 提示：请检查网络连接，或稍后重试")
         return None
 
+def stream_deepseek_response(gateway, full_messages, role_name, params, reply_slot=None):
+    """流式接收回复，中文字段一到达就在占位气泡里逐字显示，结束后返回解码后的回复
+
+    reply_slot 是 render_chat 在对话末尾留出的位置；不传时在当前位置新建
+    """
+    placeholder = reply_slot if reply_slot is not None else st.empty()
+    placeholder.info(f"⏳ {role_name} 正在思考...")
+    parser = json_stream.StreamingJSONParser()
+    try:
+        for delta in gateway.chat_stream(full_messages, **params):
+            if wire_format.CHINESE_KEY in parser.feed(delta):
+                partial = parser.fields[wire_format.CHINESE_KEY]
+                cursor = "" if wire_format.CHINESE_KEY in parser.completed else "▌"
+                placeholder.markdown(f'<div class="chat-ai"><div class="chinese-text">{partial}{cursor}</div></div>', unsafe_allow_html=True)
+        return wire_format.decode(parser.text)
+    finally:
+        # 完整消息由 render_chat 重新渲染（含拼音、关键词和语音）
+        placeholder.empty()
+
 # ============================================================
 # TTS 语音合成 - 根据角色性别选择音色
 # ============================================================
+def record_speech(service, request, response, start):
+    """设置了 CASSETTE_RECORD 时录制语音请求，供 mock_servers.py 回放"""
+    recorder = cassettes.get_recorder()
+    if recorder is not None:
+        recorder.record(service, request, response, time.monotonic() - start)
+
+
+# 音色配置，也是 TTS 缓存键的一部分
+TTS_VOICES = {
+    "male": {"model": "cosyvoice-v3-flash", "voice": "longanyang", "format": "mp3", "sample_rate": 22050},
+    "female": {"model": "sambert-zhimiao-emo-v1", "voice": None, "format": "mp3", "sample_rate": 16000},
+}
+
+
 def text_to_speech_ali(text, role_name=None):
     """
     语音合成 - 根据角色性别选择音色
@@ -432,49 +571,168 @@ def text_to_speech_ali(text, role_name=None):
     可用音色：
     - 女声: sambert-zhimiao-emo-v1 (旧API)
     - 男声: longanyang (CosyVoice v3)
+
+    合成结果按 (文字, 音色) 缓存在磁盘上，同一句话只合成一次
     """
     try:
-        # 从角色配置中获取性别
-        is_male = False
-        if role_name and role_name in ROLES:
-            is_male = ROLES[role_name].get("gender") == "male"
-
-        if is_male:
-            # 男声使用 CosyVoice v3
-            try:
-                from dashscope.audio.tts_v2 import SpeechSynthesizer as SpeechSynthesizerV2
-                from dashscope.audio.tts_v2 import AudioFormat
-
-                synthesizer = SpeechSynthesizerV2(
-                    model="cosyvoice-v3-flash",
-                    voice="longanyang",
-                    format=AudioFormat.MP3_22050HZ_MONO_256KBPS
-                )
-                audio = synthesizer.call(text)
-
-                if audio and len(audio) > 0:
-                    return audio
-            except Exception as e:
-                st.warning(f"男声合成失败: {e}，使用备用女声")
-
-        # 女声或备用：使用 sambert
-        result = SpeechSynthesizer.call(
-            model='sambert-zhimiao-emo-v1',
-            text=text,
-            sample_rate=16000,
-            format='mp3'
-        )
-        audio_data = result.get_audio_data()
-        if audio_data and len(audio_data) > 0:
-            return audio_data
-
-        st.error("语音合成失败")
-        return None
-
+        return synthesize_speech(text, role_name)
     except Exception as e:
         st.error(f"语音合成错误: {str(e)}")
         return None
 
+
+def voice_spec(role_name):
+    """根据角色性别选择音色，返回 (是否男声, 音色配置)"""
+    is_male = bool(role_name) and ROLES.get(role_name, {}).get("gender") == "male"
+    return is_male, TTS_VOICES["male" if is_male else "female"]
+
+
+def synthesize_speech(text, role_name=None):
+    """合成一条回复的语音；失败时抛出异常（后台线程也会调用，不调用界面函数）"""
+    is_male, spec = voice_spec(role_name)
+    if SEGMENTED_TTS:
+        # 长回复按句并行合成再拼接，每句单独缓存
+        return tts_segments.synthesize(text, lambda sentence: synthesize_cached(sentence, is_male, spec))
+    return synthesize_cached(text, is_male, spec)
+
+
+def synthesize_cached(text, is_male, spec):
+    """查 TTS 缓存，没有时合成并写入缓存"""
+    audio = tts_cache.get(text, **spec, db_path=DB_PATH)
+    if audio:
+        return audio
+
+    start = time.monotonic()
+    if DASHSCOPE_MOCK_URL:
+        audio = get_tts_pool().synthesize(spec["model"], spec["voice"], text)
+    else:
+        audio, spec = synthesize_dashscope(text, is_male)
+        record_speech("tts", {"text": text, "model": spec["model"], "voice": spec["voice"]},
+                      {"audio": cassettes.encode_bytes(audio)}, start)
+
+    # 按实际使用的音色缓存（男声失败退回女声时不会缓存成男声）
+    tts_cache.put(text, audio, **spec, db_path=DB_PATH)
+    return audio
+
+
+def synthesize_dashscope(text, is_male):
+    """调用 DashScope 合成，男声失败时退回女声；返回 (音频, 实际使用的音色配置)，失败时抛出异常"""
+    if is_male:
+        # 男声使用 CosyVoice v3，复用会话池里已经建好的连接
+        male = TTS_VOICES["male"]
+        try:
+            return get_tts_pool().synthesize(male["model"], male["voice"], text), male
+        except Exception as e:
+            logger.warning("男声合成失败，改用备用女声: %s", e)
+
+    # 女声或备用：使用 sambert
+    result = SpeechSynthesizer.call(
+        model='sambert-zhimiao-emo-v1',
+        text=text,
+        sample_rate=16000,
+        format='mp3'
+    )
+    audio_data = result.get_audio_data()
+    if not audio_data:
+        raise RuntimeError("语音合成失败")
+    return audio_data, TTS_VOICES["female"]
+
+
+def open_tts_session(model, voice):
+    """新建一个已连接的合成会话（会话池的 factory）"""
+    if DASHSCOPE_MOCK_URL:
+        return mock_servers.MockSpeechSession(DASHSCOPE_MOCK_URL, model, voice)
+    from dashscope.audio.tts_v2 import AudioFormat
+    return tts_pool.open_cosyvoice_session(model, voice, AudioFormat.MP3_22050HZ_MONO_256KBPS)
+
+
+def get_tts_pool():
+    """全进程共享的合成会话池，按 (模型, 音色) 复用连接"""
+    return tts_pool.get_pool(DASHSCOPE_MOCK_URL or "dashscope", open_tts_session)
+
+
+def stream_speech(text, role_name=None):
+    """缓存命中时返回音频 bytes；否则开始流式合成，返回 SpeechStream（合成完写入 TTS 缓存）"""
+    is_male, spec = voice_spec(role_name)
+    audio = tts_cache.get(text, **spec, db_path=DB_PATH)
+    if audio:
+        return audio
+
+    start = time.monotonic()
+
+    def synthesize(on_chunk):
+        if DASHSCOPE_MOCK_URL:
+            get_tts_pool().synthesize(spec["model"], spec["voice"], text, on_chunk)
+            return spec
+        return stream_dashscope(text, is_male, on_chunk)
+
+    def on_complete(audio, used_spec):
+        if not DASHSCOPE_MOCK_URL:
+            record_speech("tts", {"text": text, "model": used_spec["model"], "voice": used_spec["voice"]},
+                          {"audio": cassettes.encode_bytes(audio)}, start)
+        tts_cache.put(text, audio, **used_spec, db_path=DB_PATH)
+
+    return tts_stream.start(synthesize, on_complete)
+
+
+def stream_dashscope(text, is_male, on_chunk):
+    """男声用 CosyVoice 流式合成，每收到一块音频调用 on_chunk；女声（sambert）整句合成后一次交付。
+    返回实际使用的音色配置，失败时抛出异常"""
+    if is_male:
+        male = TTS_VOICES["male"]
+        received = []
+
+        def deliver(chunk):
+            received.append(len(chunk))
+            on_chunk(chunk)
+
+        try:
+            get_tts_pool().synthesize(male["model"], male["voice"], text, deliver)
+            return male
+        except Exception as e:
+            if received:
+                # 已经播放了一部分男声，不能再换成女声
+                raise RuntimeError(f"男声合成失败: {e}") from e
+            logger.warning("男声合成失败，改用备用女声: %s", e)
+
+    # 女声或备用：使用 sambert
+    audio, spec = synthesize_dashscope(text, False)
+    on_chunk(audio)
+    return spec
+
+
+def speech_stream_url(stream):
+    """流式播放端点上这段音频的地址（首次调用时启动端点）"""
+    base_url = tts_stream.serve("0.0.0.0" if TTS_STREAM_PUBLIC_URL else "127.0.0.1", TTS_STREAM_PORT)
+    return f"{(TTS_STREAM_PUBLIC_URL or base_url).rstrip('/')}/tts/{stream.id}"
+
+
+def get_playback_audio(chinese, role_name):
+    """点击播放时的音频：预合成结果 > 流式合成（设置了播放端点时）> 同步合成"""
+    audio = get_speech_prefetcher().take(chinese)
+    if isinstance(audio, tts_stream.SpeechStream) and audio.done:
+        # 已经合成完的流直接用缓冲区里的完整音频：播放端点只保留 STREAM_TTL 秒，过期后地址会 404
+        audio = audio.audio() if audio.error is None else None
+    if audio is None and TTS_STREAM_PORT:
+        audio = stream_speech(chinese, role_name)
+    return audio or text_to_speech_ali(chinese, role_name)
+
+
+def get_speech_prefetcher():
+    """当前会话的语音预合成任务"""
+    if "speech_prefetcher" not in st.session_state:
+        st.session_state.speech_prefetcher = tts_prefetch.SpeechPrefetcher()
+    return st.session_state.speech_prefetcher
+
+
+def prefetch_speech(content, role_name):
+    """AI 回复一到就在后台合成语音，点击播放时直接使用"""
+    if EAGER_TTS and isinstance(content, dict) and content.get("chinese"):
+        # 开启流式播放时预合成的是流，点击播放时即使还没合成完也能边收边播
+        synthesize = stream_speech if TTS_STREAM_PORT else synthesize_speech
+        get_speech_prefetcher().prefetch(content["chinese"], lambda text: synthesize(text, role_name))
+
+
 # ============================================================
 # ASR 语音识别 - 使用 paraformer-realtime-v2（非流式）
 # ============================================================
@@ -534,6 +792,15 @@ def speech_to_text_ali(audio_bytes):
                 return None
             audio_bytes = converted
 
+        # 离线运行：交给本地 DashScope 替身识别
+        start = time.monotonic()
+        if DASHSCOPE_MOCK_URL:
+            text = mock_servers.MockSpeechClient(DASHSCOPE_MOCK_URL).recognize(audio_bytes).strip()
+            if not text:
+                st.warning("🔇 未检测到语音，请说话清晰一些")
+                return None
+            return text
+
         # 2) 写临时 wav 文件
         with tempfile.NamedTemporaryFile(delete=False, suffix=".wav", mode='wb') as f:
             f.write(audio_bytes)
@@ -578,6 +845,7 @@ def speech_to_text_ali(audio_bytes):
                 st.warning("🔇 未检测到语音，请说话清晰一些")
                 return None
 
+            record_speech("asr", {"audio_sha256": cassettes.audio_key(audio_bytes)}, {"text": text}, start)
             return text
 
         finally:
@@ -814,6 +1082,7 @@ def render_auth():
                 else:
                     result = login_user(email, password)
                     if result["success"]:
+                        invalidate_user_info_cache()
                         st.session_state.user_id = result["user_id"]
                         st.session_state.nickname = result["nickname"]
                         st.session_state.user_hsk_level = result["hsk_level"]
@@ -848,6 +1117,7 @@ def render_auth():
                 else:
                     result = register_user(email, password, nickname)
                     if result["success"]:
+                        invalidate_user_info_cache()
                         st.session_state.user_id = result["user_id"]
                         st.session_state.nickname = nickname or email.split('@')[0]
                         st.session_state.logged_in = True
@@ -951,6 +1221,8 @@ def render_selection():
                 st.session_state.selected_scene = selected_scene
                 st.session_state.hsk_level = hsk_level
                 st.session_state.messages = []
+                st.session_state.resume_history = True
+                st.session_state.history_has_more = False
                 st.session_state.page = "chat"
                 # 埋点：开始对话
                 track_event("conversation_started", {"role": selected_role, "scene": selected_scene, "hsk_level": hsk_level})
@@ -969,11 +1241,24 @@ def render_chat():
     role_info = ROLES[role_name]
     gender_text = "男声" if role_info["gender"] == "male" else "女声"
 
+    # 提前建好语音合成连接，第一次播放也不用等握手（女声 sambert 不走会话池）
+    if role_info["gender"] == "male" or DASHSCOPE_MOCK_URL:
+        spec = voice_spec(role_name)[1]
+        get_tts_pool().warm(spec["model"], spec["voice"])
+
     st.markdown(f'<div class="scene-header"><span style="font-size: 2rem;">{role_info["avatar"]}</span> <strong>{role_name} · {scene}</strong> <span style="font-size: 0.85rem;">HSK {hsk_level} | 🔊{gender_text}</span></div>', unsafe_allow_html=True)
 
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    # 恢复上次的对话（重连/重启后），有历史就不再请求开场白
+    if len(st.session_state.messages) == 0 and st.session_state.get("resume_history"):
+        st.session_state.resume_history = False
+        history, oldest_id, has_more = load_history(role_name, scene)
+        st.session_state.messages = history
+        st.session_state.history_before_id = oldest_id
+        st.session_state.history_has_more = has_more
+
     # AI开场 - 显示加载提示
     if len(st.session_state.messages) == 0:
         st.markdown("""
@@ -983,10 +1268,22 @@ def render_chat():
         </div>
         """, unsafe_allow_html=True)
 
-        opening = [{"role": "user", "content": f"（场景开始：{scene}）请你作为{role_name}先开口说第一句话。"}]
-        response = get_deepseek_response(opening, role_name, scene, hsk_level)
+        # 优先从开场白池取一条，取走后在后台补足；池空时才同步请求
+        response = opening_pool.take(role_name, scene, hsk_level, DB_PATH)
+        opening_pool.refill_async(role_name, scene, hsk_level, generate_opening, DB_PATH)
+        if response is None:
+            response = get_deepseek_response(opening_messages(role_name, scene), role_name, scene, hsk_level)
         if response:
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            opening_msg = {"role": "assistant", "content": response}
+            st.session_state.messages.append(opening_msg)
+            append_history(role_name, scene, [opening_msg])
+            prefetch_speech(response, role_name)
+            st.rerun()
+
+    # 更早的历史按需分页加载
+    if st.session_state.get("history_has_more"):
+        if st.button("⬆️ 加载更早的对话 Load earlier messages", key="load_earlier", use_container_width=True):
+            load_earlier_history(role_name, scene)
             st.rerun()
 
     # 显示对话
@@ -996,6 +1293,9 @@ def render_chat():
         else:
             st.markdown(f'<div class="chat-user">{msg["content"]}</div>', unsafe_allow_html=True)
 
+    # 新回复流式显示的位置：紧跟在对话后面，而不是点击的按钮或表单里
+    reply_slot = st.empty()
+
     st.markdown("---")
 
     # 推荐回复
@@ -1005,6 +1305,9 @@ def render_chat():
         if isinstance(last, dict):
             suggestions = last.get("suggestions", [])
 
+    if suggestions and SPECULATIVE_PREFETCH:
+        prefetch_suggestion_replies(suggestions, role_name, scene, hsk_level)
+
     if suggestions:
         st.markdown("**💡 推荐回复 Suggested Replies：**")
         cols = st.columns(len(suggestions))
@@ -1016,11 +1319,11 @@ def render_chat():
                     en_text = sug.get("en", "")
                     button_label = f"💬 {cn_text}\n({en_text})" if en_text else f"💬 {cn_text}"
                     if st.button(button_label, key=f"sug_{len(st.session_state.messages)}_{idx}", use_container_width=True):
-                        process_input(cn_text, role_name, scene, hsk_level)
+                        process_input(cn_text, role_name, scene, hsk_level, reply_slot)
                 else:
                     # 兼容旧格式
                     if st.button(f"💬 {sug}", key=f"sug_{len(st.session_state.messages)}_{idx}", use_container_width=True):
-                        process_input(sug, role_name, scene, hsk_level)
+                        process_input(sug, role_name, scene, hsk_level, reply_slot)
 
     # ============================================================
     # 输入区域 - 文字 + 语音
@@ -1035,7 +1338,7 @@ def render_chat():
         with col2:
             submit = st.form_submit_button("发送 Send 📤", use_container_width=True)
         if submit and user_input.strip():
-            process_input(user_input.strip(), role_name, scene, hsk_level)
+            process_input(user_input.strip(), role_name, scene, hsk_level, reply_slot)
 
     # 语音输入
     if HAS_MIC_RECORDER:
@@ -1061,7 +1364,7 @@ def render_chat():
                             recognized_text = speech_to_text_ali(audio_bytes)
                             if recognized_text and recognized_text.strip():
                                 st.success(f"🗣️ 识别结果 Result: {recognized_text}")
-                                process_input(recognized_text.strip(), role_name, scene, hsk_level)
+                                process_input(recognized_text.strip(), role_name, scene, hsk_level, reply_slot)
                             else:
                                 st.error("❌ 未能识别，请重试 Recognition failed, please try again")
         except Exception as e:
@@ -1072,7 +1375,9 @@ def render_chat():
     col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("🔄 重新开始 Restart", use_container_width=True):
+            get_speech_prefetcher().discard()
             st.session_state.messages = []
+            st.session_state.history_has_more = False
             st.rerun()
     with col2:
         if st.button("📚 生词本 Vocab", use_container_width=True):
@@ -1080,34 +1385,60 @@ def render_chat():
             st.rerun()
     with col3:
         if st.button("🏠 换角色 Change", use_container_width=True):
+            get_speech_prefetcher().discard()
             st.session_state.page = "select"
             st.rerun()
 
-def process_input(text, role_name, scene, hsk_level):
+def process_input(text, role_name, scene, hsk_level, reply_slot=None):
+    # 点击的是已预取的推荐回复时直接使用预取结果，输入了别的内容则放弃所有预取
+    response = None
+    if SPECULATIVE_PREFETCH:
+        anchor = st.session_state.messages[-1] if st.session_state.messages else None
+        with st.spinner(f"⏳ {role_name} 正在思考..."):
+            response = get_speculator().take(anchor, text)
+
     # 添加用户消息
     st.session_state.messages.append({"role": "user", "content": text})
 
-    # 埋点：用户发送消息
-    track_event("message_sent", {"role": role_name, "scene": scene, "text_length": len(text)})
-
-    # 构建API消息
-    api_messages = []
-    for msg in st.session_state.messages:
-        if msg["role"] == "user":
-            api_messages.append({"role": "user", "content": msg["content"]})
-        else:
-            content = msg["content"]
-            api_messages.append({"role": "assistant", "content": content.get("chinese", "") if isinstance(content, dict) else str(content)})
-
-    # 调用API获取回复
-    response = get_deepseek_response(api_messages, role_name, scene, hsk_level)
+    # 构建API消息：最近几轮原文 + 更早对话的滚动摘要
+    window = get_context_window()
+    api_messages = window.build(st.session_state.messages)
+
+    # 回复来源：预取结果 > 回复缓存 > 请求 DeepSeek
+    reply_source = "prefetch" if response is not None else "llm"
+    use_cache = RESPONSE_CACHE and response_cache.enabled_for(hsk_level)
+    cache_key = response_cache.make_key(role_name, scene, hsk_level, api_messages)
+    if response is None and use_cache:
+        response = get_cached_reply(cache_key, text)
+        if response is not None:
+            reply_source = "cache"
+
+    # 调用API获取回复，记下服务端返回的 prompt tokens 和前缀缓存命中的 tokens
+    usage = {}
+    if response is None:
+        gateway = llm_gateway.get_gateway(DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL)
+        gateway.take_last_usage()  # 丢掉摘要等之前请求留下的
+        response = get_deepseek_response(api_messages, role_name, scene, hsk_level, reply_slot)
+        usage = gateway.take_last_usage()
+        if response and use_cache and response["chinese"] != FALLBACK_REPLY["chinese"]:
+            response_cache.put(cache_key, response, DB_PATH)
+
+    # 埋点：用户发送消息（prompt_tokens 是上下文窗口的估算，api_prompt_tokens 是服务端计数）
+    track_event("message_sent", {"role": role_name, "scene": scene, "text_length": len(text),
+                                 "reply_source": reply_source, **window.last_turn,
+                                 "api_prompt_tokens": usage.get("prompt_tokens", 0),
+                                 "prompt_cache_hit_tokens": usage.get("prompt_cache_hit_tokens", 0)})
 
     if response:
         st.session_state.messages.append({"role": "assistant", "content": response})
-        # 更新用户对话统计
+        prefetch_speech(response, role_name)
         user_id = st.session_state.get("user_id")
-        if user_id:
-            update_user_stats(user_id, conversations_delta=1)
+        with db.unit_of_work(DB_PATH):
+            # 本轮的用户消息和回复一起写入历史（失败的轮次不落盘）
+            append_history(role_name, scene, st.session_state.messages[-2:])
+            # 更新用户对话统计
+            if user_id:
+                update_user_stats(user_id, conversations_delta=1)
     else:
         # API失败时，移除刚添加的用户消息，让用户可以重试
         st.session_state.messages.pop()
@@ -1134,20 +1465,45 @@ def render_ai_message(content, msg_index, role_name):
     with col1:
         if st.button(f"🔊 播放 Play", key=f"play_{msg_index}"):
             with st.spinner("生成语音 Generating..."):
-                audio = text_to_speech_ali(chinese, role_name)
+                audio = get_playback_audio(chinese, role_name)
                 if audio:
                     st.session_state[f"audio_{msg_index}"] = audio
+                    st.session_state[f"autoplay_{msg_index}"] = True
                     st.rerun()
     with col2:
         if st.button("📖 翻译 Translate", key=f"trans_{msg_index}"):
             st.session_state[f"show_trans_{msg_index}"] = not st.session_state.get(f"show_trans_{msg_index}", False)
             st.rerun()
 
-    if f"audio_{msg_index}" in st.session_state and st.session_state[f"audio_{msg_index}"]:
-        st.audio(st.session_state[f"audio_{msg_index}"], format="audio/mp3", autoplay=False)
+    # 只在点击播放后的这一次重绘自动播放，之后重绘（例如从生词本返回）不再重复播放
+    audio = st.session_state.get(f"audio_{msg_index}")
+    autoplay = st.session_state.pop(f"autoplay_{msg_index}", False)
+    if isinstance(audio, tts_stream.SpeechStream):
+        if audio.error is not None:
+            st.error(f"语音合成错误: {audio.error}")
+            del st.session_state[f"audio_{msg_index}"]
+            audio = None
+        elif audio.done:
+            # 合成结束后改存完整音频，不再依赖播放端点的缓冲区（会过期）
+            audio = st.session_state[f"audio_{msg_index}"] = audio.audio()
+        else:
+            # 流式播放：浏览器收到第一块音频就开始播放
+            st.audio(speech_stream_url(audio), format="audio/mp3", autoplay=autoplay)
+            audio = None
+    if audio:
+        st.audio(audio, format="audio/mp3", autoplay=autoplay)
 
     if st.session_state.get(f"show_trans_{msg_index}", False):
-        st.markdown(f'<div class="english-text">📝 {english}</div>', unsafe_allow_html=True)
+        # 回复里没有翻译时按需翻译，结果写回消息，之后重绘不再查询
+        if not english:
+            with st.spinner("翻译中 Translating..."):
+                english = translation.translate(chinese, translate_with_deepseek, DB_PATH)
+            if english is None:
+                st.warning("⚠️ 翻译失败，请重试")
+            else:
+                content["english"] = english
+        if english:
+            st.markdown(f'<div class="english-text">📝 {english}</div>', unsafe_allow_html=True)
 
     if keywords:
         st.markdown("**🏷️ 关键词 Keywords（点击添加 Click to save）：**")
@@ -1192,10 +1548,10 @@ def render_sidebar():
             nickname = st.session_state.get("nickname", "用户")
             st.markdown(f"### 👤 {nickname}")
 
-            # 获取用户统计
+            # 获取用户统计（会话缓存，稳定状态下不访问数据库）
             user_id = st.session_state.get("user_id")
             if user_id:
-                user_info = get_user_info(user_id)
+                user_info = get_cached_user_info(user_id)
                 if user_info:
                     st.markdown(f"""
                     📊 **学习统计 Stats**
@@ -1213,6 +1569,7 @@ def render_sidebar():
 
         st.markdown("---")
         if st.button("🏠 首页 Home", use_container_width=True, key="sb_home"):
+            get_speech_prefetcher().discard()
             st.session_state.page = "landing"
             st.rerun()
         if st.button("📚 生词本 Vocab", use_container_width=True, key="sb_vocab"):
@@ -1224,6 +1581,9 @@ def render_sidebar():
             st.markdown("---")
             if st.button("🚪 退出登录 Logout", use_container_width=True, key="sb_logout"):
                 # 清除用户状态
+                get_speech_prefetcher().discard()
+                log_user_info_cache_stats()
+                invalidate_user_info_cache()
                 st.session_state.logged_in = False
                 st.session_state.user_id = None
                 st.session_state.nickname = None
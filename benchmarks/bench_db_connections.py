@@ -0,0 +1,111 @@
+"""
+CN Chinese Link - 数据库连接基准测试
+对比「每次调用 connect/close」与「线程复用连接 + WAL」的吞吐量 (ops/sec)
+
+使用方法：
+    python benchmarks/bench_db_connections.py [--ops 2000] [--threads 4]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+
+# ============================================================
+# 两种访问方式 - 模拟 get_user_info + track_event
+# ============================================================
+def per_call_op(db_path, user_id):
+    """旧方式：每次调用都新建连接"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, email, nickname, hsk_level, total_conversations, total_words_learned, created_at FROM users WHERE id = ?", (user_id,))
+    cursor.fetchone()
+    conn.close()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO events (user_id, event_name, event_data) VALUES (?, ?, ?)", (user_id, "message_sent", json.dumps({"text_length": 12})))
+    conn.commit()
+    conn.close()
+
+
+def pooled_op(db_path, user_id):
+    """新方式：线程复用连接"""
+    conn = db.get_connection(db_path)
+    conn.execute("SELECT id, email, nickname, hsk_level, total_conversations, total_words_learned, created_at FROM users WHERE id = ?", (user_id,)).fetchone()
+    with conn:
+        conn.execute("INSERT INTO events (user_id, event_name, event_data) VALUES (?, ?, ?)", (user_id, "message_sent", json.dumps({"text_length": 12})))
+
+
+# ============================================================
+# 测试框架
+# ============================================================
+def prepare_db(db_path, wal):
+    db.init_schema(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA journal_mode = {'WAL' if wal else 'DELETE'}")
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (email, password_hash, nickname) VALUES (?, ?, ?)",
+            [(f"user{i}@test.com", "x", f"user{i}") for i in range(100)]
+        )
+    conn.close()
+
+
+def run(op, db_path, ops, threads):
+    """多线程执行 op，返回 (ops/sec, 出错次数)"""
+    errors = []
+    per_thread = ops // threads
+
+    def worker(tid):
+        for i in range(per_thread):
+            try:
+                op(db_path, (tid * per_thread + i) % 100 + 1)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        per_call_path = os.path.join(tmp, "per_call.db")
+        pooled_path = os.path.join(tmp, "pooled.db")
+        prepare_db(per_call_path, wal=False)
+        prepare_db(pooled_path, wal=True)
+
+        print(f"ops={args.ops} threads={args.threads}")
+        print("-" * 50)
+        per_call_rate, per_call_errors = run(per_call_op, per_call_path, args.ops, args.threads)
+        print(f"connect-per-call : {per_call_rate:>10.0f} ops/sec  (locked errors: {per_call_errors})")
+        pooled_rate, pooled_errors = run(pooled_op, pooled_path, args.ops, args.threads)
+        print(f"pooled + WAL     : {pooled_rate:>10.0f} ops/sec  (locked errors: {pooled_errors})")
+        print("-" * 50)
+        print(f"speedup: {pooled_rate / per_call_rate:.2f}x")
+
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+CN Chinese Link - LLM 网关基准测试
+用 mock_servers.py 在本地启动 OpenAI 兼容的模拟服务，对比：
+- 旧方式：每轮对话新建 OpenAI 客户端（新连接）
+- 新方式：共享 LLMGateway（连接池 + keep-alive）
+输出每轮平均耗时和节省的时间。本地是明文 HTTP，不包含真实 DeepSeek 的 TLS 握手，
+线上节省会更多。
+
+使用方法：
+    python benchmarks/bench_llm_gateway.py [--turns 200] [--latency-ms 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+
+import llm_gateway
+import mock_servers
+
+MESSAGES = [{"role": "system", "content": "你是中文学习应用中的虚拟角色。"}, {"role": "user", "content": "你好"}]
+
+
+def new_client_turn(base_url):
+    """旧方式：与原 get_deepseek_response 相同，每次新建客户端"""
+    client = OpenAI(api_key="mock", base_url=base_url, timeout=30.0)
+    client.chat.completions.create(model="deepseek-chat", messages=MESSAGES, temperature=0.8, max_tokens=1000)
+
+
+def gateway_turn(base_url):
+    gateway = llm_gateway.get_gateway("mock", base_url)
+    gateway.chat(MESSAGES, model="deepseek-chat", temperature=0.8, max_tokens=1000)
+
+
+def measure(turn, base_url, turns):
+    turn(base_url)  # 预热
+    start = time.perf_counter()
+    for _ in range(turns):
+        turn(base_url)
+    return (time.perf_counter() - start) / turns * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="模拟服务的生成耗时")
+    args = parser.parse_args()
+
+    server, base_url = mock_servers.start_server(llm_latency=f"fixed:{args.latency_ms}")
+    base_url += "/v1"
+
+    try:
+        old_ms = measure(new_client_turn, base_url, args.turns)
+        new_ms = measure(gateway_turn, base_url, args.turns)
+    finally:
+        server.shutdown()
+
+    print(f"turns={args.turns} server latency={args.latency_ms:.1f}ms")
+    print("-" * 50)
+    print(f"new client per turn : {old_ms:>8.2f} ms/turn")
+    print(f"shared gateway      : {new_ms:>8.2f} ms/turn")
+    print("-" * 50)
+    print(f"saved per turn      : {old_ms - new_ms:>8.2f} ms")
+    print(f"gateway stats       : {llm_gateway.get_gateway('mock', base_url).stats()}")
+
+
+if __name__ == "__main__":
+    main()
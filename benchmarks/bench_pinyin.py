@@ -0,0 +1,152 @@
+"""
+CN Chinese Link - 本地拼音基准测试
+- 转换吞吐：首次转换（分词 + 查词典）和命中整句缓存时每秒处理的句子数
+- 每轮节省：用 mock_servers.py 在本地模拟 DeepSeek（按输出 token 计生成耗时），实测完整一轮
+  （流式接收 + 逐块解析 + 解码 + 拼音）的耗时：
+  旧格式让模型输出 "pinyin" 字段，新格式不输出，拼音在本地生成；两者之差是每轮实际节省的时间
+
+使用方法：
+    python benchmarks/bench_pinyin.py [--rounds 200] [--turns 3] [--ms-per-token 30]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassettes
+import context_window
+import json_stream
+import llm_gateway
+import mock_servers
+import pinyin_engine
+
+MODEL = "deepseek-chat"
+
+# 典型的角色回复（1-3 句）
+REPLIES = [
+    "你好！今天想喝点什么？我们有新出的桂花拿铁。",
+    "这件衣服很便宜，你觉得怎么样？要不要试一试？",
+    "春节回家，妈妈做了一大桌子菜，你多吃点儿。",
+    "项目进度有点慢，我们需要重新调整一下计划。",
+    "哈哈，你说的这个梗我也看到了，太好笑了！",
+    "这道题不难，你先想一想，然后再告诉我答案。",
+    "周末我们一起去吃火锅吧，我知道一家很好吃的店。",
+    "先生，您要几分熟的牛排？配菜可以选沙拉或者薯条。",
+    "你的中文说得越来越好了，继续加油！",
+    "考试之前要好好复习，别忘了带准考证。",
+    "我觉得这个价格有点高，能不能再便宜一点？",
+    "银行九点开门，你可以先去旁边的咖啡店坐一会儿。",
+]
+
+
+def reply_json(chinese, with_pinyin):
+    reply = {"chinese": chinese}
+    if with_pinyin:
+        reply["pinyin"] = pinyin_engine.to_pinyin(chinese)
+    reply.update({"english": "...", "keywords": [{"word": "便宜", "meaning": "cheap"}],
+                  "suggestions": [{"cn": "好的", "en": "OK"}, {"cn": "谢谢", "en": "Thanks"}, {"cn": "再见", "en": "Bye"}]})
+    return json.dumps(reply, ensure_ascii=False)
+
+
+def measure_conversion(rounds):
+    """返回 (首次转换 句/秒, 缓存命中 句/秒, 平均每句首次转换毫秒)"""
+    pinyin_engine.to_pinyin("预热")  # 加载词典
+    sentences = [f"{reply}{i}" for i in range(rounds) for reply in REPLIES]
+    pinyin_engine.to_pinyin.cache_clear()
+    start = time.perf_counter()
+    for sentence in sentences:
+        pinyin_engine.to_pinyin(sentence)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for sentence in sentences:
+        pinyin_engine.to_pinyin(sentence)
+    warm = time.perf_counter() - start
+    return len(sentences) / cold, len(sentences) / warm, cold / len(sentences) * 1000
+
+
+def turn_messages(schema, index):
+    return [{"role": "system", "content": "你是咖啡店店员。"}, {"role": "user", "content": f"{schema} {index}"}]
+
+
+def record_replies(path):
+    """把每条回复按旧格式（带拼音）和新格式（不带拼音）各录一条，completion_tokens 按估算的输出 tokens 计"""
+    cassette = cassettes.Cassette(path)
+    for schema, with_pinyin in (("old", True), ("new", False)):
+        for i, chinese in enumerate(REPLIES):
+            content = reply_json(chinese, with_pinyin)
+            usage = {"prompt_tokens": 20, "completion_tokens": context_window.estimate_tokens(content), "total_tokens": 0}
+            cassette.record("deepseek", {"model": MODEL, "messages": turn_messages(schema, i)},
+                            {"content": content, "usage": usage})
+    return cassettes.Cassette(path)
+
+
+def run_turn(gateway, schema, index):
+    """完整一轮：流式接收、逐块解析、解码；新格式再在本地生成拼音。返回 (耗时毫秒, 输出 tokens)"""
+    start = time.perf_counter()
+    parser = json_stream.StreamingJSONParser()
+    for delta in gateway.chat_stream(turn_messages(schema, index), model=MODEL):
+        parser.feed(delta)
+    reply = json.loads(parser.text)
+    if "pinyin" not in reply:
+        reply["pinyin"] = pinyin_engine.to_pinyin(reply["chinese"])
+    return (time.perf_counter() - start) * 1000, context_window.estimate_tokens(parser.text)
+
+
+def measure_turns(base_url, turns):
+    """每种格式把所有回复各跑 turns 遍，返回 {格式: (平均每轮毫秒, 平均输出 tokens)}"""
+    gateway = llm_gateway.LLMGateway("mock-key", base_url + "/v1")
+    try:
+        run_turn(gateway, "new", 0)  # 预热连接
+        results = {}
+        for schema in ("old", "new"):
+            samples = [run_turn(gateway, schema, i) for _ in range(turns) for i in range(len(REPLIES))]
+            results[schema] = (sum(ms for ms, _ in samples) / len(samples),
+                               sum(tokens for _, tokens in samples) / len(samples))
+        return results
+    finally:
+        gateway.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3, help="每条回复每种格式跑几遍")
+    parser.add_argument("--ms-per-token", type=float, default=30.0, help="模拟 DeepSeek 每个输出 token 的生成耗时")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    pinyin_engine.to_pinyin("加载")
+    load_ms = (time.perf_counter() - start) * 1000
+    cold_rate, warm_rate, cold_ms = measure_conversion(args.rounds)
+    pinyin_engine.to_pinyin.cache_clear()  # 端到端测量时拼音也要现算
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cassette = record_replies(os.path.join(tmp, "replies.jsonl"))
+        # 块间不额外等待，耗时只来自按 token 计的生成时间
+        server, base_url = mock_servers.start_server(cassette=cassette, token_latency=f"fixed:{args.ms_per_token}",
+                                                     chunk_delay=0)
+        try:
+            results = measure_turns(base_url, args.turns)
+        finally:
+            server.shutdown()
+    (old_ms, old_tokens), (new_ms, new_tokens) = results["old"], results["new"]
+
+    print(f"dictionary load        : {load_ms:>9.1f} ms (once per process)")
+    print(f"conversion (cold)      : {cold_rate:>9.0f} sentences/sec  ({cold_ms:.3f} ms/sentence)")
+    print(f"conversion (memoized)  : {warm_rate:>9.0f} sentences/sec")
+    print("-" * 60)
+    print(f"mock DeepSeek          : {args.ms_per_token:.0f} ms/output token, "
+          f"{len(REPLIES)} replies x {args.turns} turns per schema")
+    print(f"output tokens per turn : {old_tokens:>6.1f} -> {new_tokens:.1f} (-{1 - new_tokens / old_tokens:.0%})")
+    print(f"turn, pinyin from LLM  : {old_ms:>9.1f} ms/turn (measured)")
+    print(f"turn, local pinyin     : {new_ms:>9.1f} ms/turn (measured)")
+    print(f"saved per turn         : {old_ms - new_ms:>9.1f} ms/turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+CN Chinese Link - TTS 音频缓存基准测试
+用 mock_servers.py 在本地模拟 DashScope TTS，把同一段对话的语音播放两遍（例如重开会话、另一个用户走同一个场景）：
+- 第一遍：缓存是空的，每句都要合成，合成结果写入 tts_cache
+- 第二遍：每句都从磁盘缓存读取
+最后打印 tts_cache.stats() 里的命中率和节省的字节数
+
+使用方法：
+    python benchmarks/bench_tts_cache.py [--tts-latency fixed:300]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import mock_servers
+import tts_cache
+
+MODEL, VOICE = "cosyvoice-v3-flash", "longanyang"
+
+# 一段咖啡店对话里角色说的话
+CONVERSATION = [
+    "你好！今天想喝点什么？",
+    "我们有新出的桂花拿铁，要不要试一试？",
+    "大杯还是中杯？",
+    "好的，一共三十二块。",
+    "请稍等，马上就好。",
+    "您的拿铁好了，祝您今天愉快！",
+]
+
+
+def play_conversation(session, cache_dir, db_path):
+    """按应用里的顺序播放每句话：先查缓存，没命中再合成并写入缓存；返回平均每句毫秒"""
+    start = time.perf_counter()
+    for text in CONVERSATION:
+        audio = tts_cache.get(text, MODEL, VOICE, cache_dir=cache_dir, db_path=db_path)
+        if audio is None:
+            audio = session.synthesize(text)
+            tts_cache.put(text, audio, MODEL, VOICE, cache_dir=cache_dir, db_path=db_path)
+    return (time.perf_counter() - start) / len(CONVERSATION) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tts-latency", default="fixed:300", help="模拟服务合成耗时")
+    args = parser.parse_args()
+
+    server, mock_url = mock_servers.start_server(tts_latency=args.tts_latency)
+    session = mock_servers.MockSpeechSession(mock_url + "/dashscope", MODEL, VOICE)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "tts_cache.db")
+            cache_dir = os.path.join(tmp, "tts_cache")
+            first_ms = play_conversation(session, cache_dir, db_path)
+            second_ms = play_conversation(session, cache_dir, db_path)
+            stats = tts_cache.stats(db_path)
+            db.close_all()
+    finally:
+        session.close()
+        server.shutdown()
+
+    print(f"utterances={len(CONVERSATION)} x 2 passes, tts latency={args.tts_latency}")
+    print("-" * 60)
+    print(f"first pass (synthesize) : {first_ms:>8.0f} ms/utterance")
+    print(f"second pass (cached)    : {second_ms:>8.1f} ms/utterance")
+    print("-" * 60)
+    print(f"hit ratio               : {stats['hit_rate']:>8.0%}  ({stats['hits']} hits / {stats['misses']} misses)")
+    print(f"bytes saved             : {stats['bytes_saved'] / 1024:>8.1f} KB not re-synthesized")
+    print(f"cache size              : {stats['entries']} entries, {stats['total_bytes'] / 1024:.1f} KB")
+    print(f"server synth requests   : {server.state.counts['tts']['requests']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+CN Chinese Link - 语音合成会话池基准测试
+用 mock_servers.py 在本地模拟 DashScope TTS：新建会话要付出 WebSocket 建连 + 握手的耗时，对比：
+- 旧方式：每句话新建一个合成器（新连接、新握手）
+- 会话池：tts_pool 复用已经建好连接的会话
+顺序合成测每句节省的建连耗时；并发合成测同时进行的会话数上限。
+最后让服务端关闭空闲会话，确认会话池能发现并重连。
+
+使用方法：
+    python benchmarks/bench_tts_pool.py [--utterances 30] [--setup-ms 250] [--tts-latency fixed:300]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_servers
+import tts_pool
+
+MODEL, VOICE = "cosyvoice-v3-flash", "longanyang"
+TEXT = "这个项目的进度比我们预想的要慢一些。"
+
+
+class CountingSession(mock_servers.MockSpeechSession):
+    """记录同时进行的合成数"""
+    active = peak = 0
+    lock = threading.Lock()
+
+    def synthesize(self, text, on_chunk=None):
+        with CountingSession.lock:
+            CountingSession.active += 1
+            CountingSession.peak = max(CountingSession.peak, CountingSession.active)
+        try:
+            return super().synthesize(text, on_chunk)
+        finally:
+            with CountingSession.lock:
+                CountingSession.active -= 1
+
+
+def new_session_per_call(base_url):
+    session = mock_servers.MockSpeechSession(base_url, MODEL, VOICE)
+    try:
+        return session.synthesize(TEXT)
+    finally:
+        session.close()
+
+
+def measure(synthesize, utterances):
+    start = time.perf_counter()
+    for _ in range(utterances):
+        synthesize()
+    return (time.perf_counter() - start) / utterances * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=30)
+    parser.add_argument("--setup-ms", type=float, default=250.0, help="新建会话（握手）耗时")
+    parser.add_argument("--tts-latency", default="fixed:300", help="模拟服务合成耗时")
+    args = parser.parse_args()
+
+    server, mock_url = mock_servers.start_server(tts_latency=args.tts_latency,
+                                                 tts_setup_latency=f"fixed:{args.setup_ms}")
+    base_url = mock_url + "/dashscope"
+    pool = tts_pool.SessionPool(lambda model, voice: mock_servers.MockSpeechSession(base_url, model, voice))
+
+    try:
+        old_ms = measure(lambda: new_session_per_call(base_url), args.utterances)
+        pool.synthesize(MODEL, VOICE, TEXT)   # 预热，与应用里进入对话页时的 warm 相同
+        new_ms = measure(lambda: pool.synthesize(MODEL, VOICE, TEXT), args.utterances)
+
+        # 并发：同时来的请求超过上限时排队，同时进行的合成数不超过 MAX_SESSIONS
+        concurrent_pool = tts_pool.SessionPool(lambda model, voice: CountingSession(base_url, model, voice))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.utterances) as executor:
+            list(executor.map(lambda _: concurrent_pool.synthesize(MODEL, VOICE, TEXT), range(args.utterances)))
+        concurrent_s = time.perf_counter() - start
+
+        # 服务端关闭空闲会话后，会话池重连
+        server.state.session_idle = 0.05
+        time.sleep(0.1)
+        pool.synthesize(MODEL, VOICE, TEXT)
+    finally:
+        server.shutdown()
+
+    print(f"utterances={args.utterances} setup={args.setup_ms:.0f}ms tts latency={args.tts_latency}")
+    print("-" * 60)
+    print(f"new synthesizer per call : {old_ms:>8.0f} ms/utterance")
+    print(f"session pool             : {new_ms:>8.0f} ms/utterance")
+    print(f"setup saved              : {old_ms - new_ms:>8.0f} ms/utterance")
+    print("-" * 60)
+    print(f"concurrent x{args.utterances:<3}          : {concurrent_s:>8.2f} s, peak sessions {CountingSession.peak} "
+          f"(limit {tts_pool.MAX_SESSIONS}), waits {concurrent_pool.waits}")
+    print(f"pool stats               : {pool.stats()}")
+    print(f"server sessions opened   : {server.state.counts['tts']['sessions']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+CN Chinese Link - 按句并行语音合成基准测试
+用 mock_servers.py 在本地模拟 DashScope TTS，合成耗时随字数线性增长（默认 300ms + 每字 40ms），对比：
+- 整句合成：整条回复一次请求
+- 按句并行：tts_segments 切分后在线程池里同时合成，再无损拼接
+分别测 1 句、3 句、6 句的回复，输出平均总耗时。
+
+使用方法：
+    python benchmarks/bench_tts_segments.py [--trials 5] [--tts-latency linear:300,40]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_servers
+import tts_segments
+
+SENTENCES = [
+    "这个项目的进度比我们预想的要慢一些。",
+    "主要原因是供应商那边的零件一直没有按时交付。",
+    "我建议下周一开个会，重新评估一下整体的时间安排。",
+    "另外，预算方面也需要财务部门再核对一遍。",
+    "如果有必要的话，我们可以考虑换一家合作伙伴。",
+    "你先把目前遇到的问题整理成一份报告发给我吧。",
+]
+
+
+def measure(synthesize, text, trials):
+    start = time.perf_counter()
+    for _ in range(trials):
+        audio = synthesize(text)
+    return (time.perf_counter() - start) / trials * 1000, len(audio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--tts-latency", default="linear:300,40", help="模拟服务合成耗时")
+    args = parser.parse_args()
+
+    server, mock_url = mock_servers.start_server(tts_latency=args.tts_latency)
+    client = mock_servers.MockSpeechClient(mock_url + "/dashscope")
+
+    print(f"trials={args.trials} tts latency={args.tts_latency} workers={tts_segments.MAX_WORKERS}")
+    print("-" * 66)
+    print(f"{'sentences':<10}{'chars':>6}{'single call':>16}{'parallel':>14}{'speedup':>10}{'size diff':>11}")
+    try:
+        for count in (1, 3, 6):
+            text = "".join(SENTENCES[:count])
+            single_ms, single_bytes = measure(client.synthesize, text, args.trials)
+            parallel_ms, parallel_bytes = measure(lambda t: tts_segments.synthesize(t, client.synthesize), text, args.trials)
+            print(f"{count:<10}{len(text):>6}{single_ms:>13.0f} ms{parallel_ms:>11.0f} ms"
+                  f"{single_ms / parallel_ms:>9.2f}x{parallel_bytes - single_bytes:>+11}")
+    finally:
+        server.shutdown()
+    print("-" * 66)
+    print(f"tts_segments stats : {tts_segments.stats()}")
+
+
+if __name__ == "__main__":
+    main()
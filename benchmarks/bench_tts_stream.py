@@ -0,0 +1,80 @@
+"""
+CN Chinese Link - 流式语音合成基准测试
+用 mock_servers.py 在本地模拟 DashScope TTS（合成耗时与文字长度无关，固定分布），对比首块音频延迟：
+- 整句合成：等整段音频返回才能开始播放
+- 流式合成：经 tts_stream 的播放端点读取，收到第一块就能开始播放
+输出两种方式的平均首块音频延迟（time-to-first-audio）和整句完成时间。
+
+使用方法：
+    python benchmarks/bench_tts_stream.py [--sentences 20] [--tts-latency uniform:600,1200]
+"""
+
+import argparse
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_servers
+import tts_stream
+
+SENTENCES = [
+    "你好！今天想喝点什么？",
+    "这件衣服很便宜，你觉得怎么样？",
+    "项目进度有点慢，我们需要重新调整一下计划。",
+    "周末我们一起去吃火锅吧，我知道一家很好吃的店。",
+]
+
+
+def blocking(client, text):
+    start = time.perf_counter()
+    client.synthesize(text)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+def streaming(client, text, base_url):
+    """与页面相同的路径：合成写入缓冲区，浏览器从播放端点读取"""
+    start = time.perf_counter()
+    stream = tts_stream.start(lambda on_chunk: client.synthesize_stream(text, on_chunk=on_chunk))
+    with urllib.request.urlopen(f"{base_url}/tts/{stream.id}", timeout=30) as response:
+        response.read1(65536)
+        first = time.perf_counter() - start
+        response.read()
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=20)
+    parser.add_argument("--tts-latency", default="uniform:600,1200", help="模拟服务整句合成耗时")
+    args = parser.parse_args()
+
+    server, mock_url = mock_servers.start_server(tts_latency=args.tts_latency, seed=0)
+    client = mock_servers.MockSpeechClient(mock_url + "/dashscope")
+    base_url = tts_stream.serve()
+    texts = [SENTENCES[i % len(SENTENCES)] for i in range(args.sentences)]
+
+    try:
+        old = [blocking(client, text) for text in texts]
+        new = [streaming(client, text, base_url) for text in texts]
+    finally:
+        server.shutdown()
+
+    def avg_ms(results, index):
+        return sum(r[index] for r in results) / len(results) * 1000
+
+    print(f"sentences={args.sentences} tts latency={args.tts_latency} chunks={mock_servers.TTS_STREAM_CHUNKS}")
+    print("-" * 60)
+    print(f"{'':<18}{'first audio':>16}{'complete':>16}")
+    print(f"{'blocking call':<18}{avg_ms(old, 0):>13.0f} ms{avg_ms(old, 1):>13.0f} ms")
+    print(f"{'streaming':<18}{avg_ms(new, 0):>13.0f} ms{avg_ms(new, 1):>13.0f} ms")
+    print("-" * 60)
+    print(f"first audio saved : {avg_ms(old, 0) - avg_ms(new, 0):>8.0f} ms")
+    print(f"tts_stream stats  : {tts_stream.stats()}")
+
+
+if __name__ == "__main__":
+    main()
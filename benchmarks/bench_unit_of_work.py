@@ -0,0 +1,107 @@
+"""
+CN Chinese Link - Unit of Work 基准测试
+模拟「点击关键词收藏生词」：vocab 插入 + 用户统计 + word_saved 埋点
+对比每次操作的提交次数和吞吐量
+
+使用方法：
+    python benchmarks/bench_unit_of_work.py [--actions 2000]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import event_writer
+
+VOCAB_SQL = "INSERT OR REPLACE INTO vocab (user_id, word, meaning, context, mastered) VALUES (?, ?, ?, ?, 0)"
+STATS_SQL = "UPDATE users SET total_conversations = total_conversations + ?, total_words_learned = total_words_learned + ? WHERE id = ?"
+EVENT_SQL = "INSERT INTO events (user_id, event_name, event_data) VALUES (?, ?, ?)"
+
+
+# ============================================================
+# 三种写法
+# ============================================================
+def per_call_action(db_path, i):
+    """原始写法：三个函数各自 connect + commit"""
+    for sql, params in (
+        (VOCAB_SQL, (1, f"词{i}", "meaning", "context")),
+        (STATS_SQL, (0, 1, 1)),
+        (EVENT_SQL, (1, "word_saved", json.dumps({"word": f"词{i}"}))),
+    ):
+        conn = sqlite3.connect(db_path)
+        conn.set_trace_callback(_count_commit)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+
+def pooled_action(db_path, i):
+    """复用连接，但三次写入各自提交"""
+    conn = db.get_connection(db_path)
+    with conn:
+        conn.execute(VOCAB_SQL, (1, f"词{i}", "meaning", "context"))
+    with conn:
+        conn.execute(STATS_SQL, (0, 1, 1))
+    with conn:
+        conn.execute(EVENT_SQL, (1, "word_saved", json.dumps({"word": f"词{i}"})))
+
+
+def unit_of_work_action(db_path, i):
+    """unit_of_work：同一事务，一次提交"""
+    with db.unit_of_work(db_path) as conn:
+        conn.execute(VOCAB_SQL, (1, f"词{i}", "meaning", "context"))
+        with db.unit_of_work(db_path) as inner:
+            inner.execute(STATS_SQL, (0, 1, 1))
+        event_writer.record(1, "word_saved", {"word": f"词{i}"}, db_path)
+
+
+# ============================================================
+# 测试框架
+# ============================================================
+_commits = 0
+
+
+def _count_commit(statement):
+    global _commits
+    if statement.strip().upper().startswith("COMMIT"):
+        _commits += 1
+
+
+def run(name, action, db_path, actions):
+    global _commits
+    conn = db.get_connection(db_path)
+    conn.set_trace_callback(_count_commit)
+    with conn:
+        conn.execute("INSERT INTO users (email, password_hash) VALUES ('bench@test.com', 'x')")
+    _commits = 0
+
+    start = time.perf_counter()
+    for i in range(actions):
+        action(db_path, i)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22}: {_commits / actions:>4.1f} commits/action  {actions / elapsed:>8.0f} actions/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actions", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"actions={args.actions}")
+        print("-" * 60)
+        run("connect-per-call", per_call_action, os.path.join(tmp, "per_call.db"), args.actions)
+        run("pooled, 3 commits", pooled_action, os.path.join(tmp, "pooled.db"), args.actions)
+        run("unit_of_work", unit_of_work_action, os.path.join(tmp, "uow.db"), args.actions)
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
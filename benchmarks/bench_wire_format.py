@@ -0,0 +1,93 @@
+"""
+CN Chinese Link - 紧凑回复格式基准测试
+- 输出 tokens：完整键名 + 对象数组 vs 短键名 + 数组元组（估算）
+- 容错：对合法回复注入常见的损坏（截断、多余逗号、代码块包裹、字符串内换行、缺少结尾括号、尾部多余文字），
+  对比 json.loads 和 wire_format.decode 能救回的比例
+
+使用方法：
+    python benchmarks/bench_wire_format.py [--trials 2000] [--seed 0]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import context_window
+import wire_format
+
+REPLIES = [
+    ("你好！今天想喝点什么？我们有新出的桂花拿铁。", [("桂花", "osmanthus"), ("拿铁", "latte")],
+     [("来一杯拿铁", "A latte, please"), ("有什么推荐？", "Any recommendations?"), ("我看看菜单", "Let me see the menu")]),
+    ("这件衣服很便宜，你觉得怎么样？", [("便宜", "cheap"), ("衣服", "clothes")],
+     [("我想试试", "I'd like to try it"), ("有别的颜色吗？", "Other colors?"), ("太贵了", "Too expensive")]),
+    ("项目进度有点慢，我们需要重新调整一下计划。", [("进度", "progress"), ("调整", "adjust")],
+     [("我来负责", "I'll handle it"), ("需要加人吗？", "Need more people?"), ("下周完成", "Done next week")]),
+    ("周末我们一起去吃火锅吧，我知道一家很好吃的店。", [("火锅", "hot pot"), ("周末", "weekend")],
+     [("好啊！", "Sure!"), ("在哪儿？", "Where is it?"), ("我不太能吃辣", "I can't eat spicy food")]),
+]
+
+
+def verbose(chinese, keywords, suggestions):
+    return json.dumps({"chinese": chinese, "keywords": [{"word": w, "meaning": m} for w, m in keywords],
+                       "suggestions": [{"cn": c, "en": e} for c, e in suggestions]}, ensure_ascii=False)
+
+
+def compact(chinese, keywords, suggestions):
+    return json.dumps({"c": chinese, "k": [list(k) for k in keywords], "s": [list(s) for s in suggestions]},
+                      ensure_ascii=False)
+
+
+# 常见的损坏方式
+def truncate(text, rng):
+    # 截断在中文回复之后的任意位置（中文回复本身被截断时无法完整恢复）
+    return text[:rng.randint(text.index('",') + 2, len(text) - 1)]
+
+
+CORRUPTIONS = {
+    "truncated": truncate,
+    "trailing comma": lambda text, rng: text.replace("]]", "],]", 1),
+    "code fence": lambda text, rng: f"```json\n{text}\n```",
+    "raw newline": lambda text, rng: text.replace("，", "，\n", 1),
+    "missing brace": lambda text, rng: text[:-1],
+    "trailing prose": lambda text, rng: text + "\n希望对你有帮助！",
+}
+
+
+def parses(decoder, text):
+    try:
+        result = decoder(text)
+    except ValueError:
+        return False
+    return isinstance(result, dict)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    verbose_tokens = sum(context_window.estimate_tokens(verbose(*r)) for r in REPLIES) / len(REPLIES)
+    compact_tokens = sum(context_window.estimate_tokens(compact(*r)) for r in REPLIES) / len(REPLIES)
+    print(f"output tokens per reply : {verbose_tokens:.1f} -> {compact_tokens:.1f} "
+          f"(-{1 - compact_tokens / verbose_tokens:.0%}, estimated)")
+    print("-" * 60)
+    print(f"{'corruption':<16} {'json.loads':>12} {'wire_format':>12}")
+    for name, corrupt in CORRUPTIONS.items():
+        baseline = salvaged = 0
+        for _ in range(args.trials):
+            text = corrupt(compact(*rng.choice(REPLIES)), rng)
+            baseline += parses(json.loads, text)
+            salvaged += parses(wire_format.decode, text)
+        print(f"{name:<16} {baseline / args.trials:>12.0%} {salvaged / args.trials:>12.0%}")
+    print("-" * 60)
+    print(f"decoder stats: {wire_format.stats()}")
+
+
+if __name__ == "__main__":
+    main()
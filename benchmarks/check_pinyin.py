@@ -0,0 +1,70 @@
+"""
+CN Chinese Link - 本地拼音回归检查
+逐句确认 pinyin_engine 对多音字和变调的读法，重点是学习者最常见的"得"字句
+
+使用方法：
+    python benchmarks/check_pinyin.py
+全部通过返回 0，否则打印期望和实际读音并返回 1
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pinyin_engine
+
+# (句子, 期望拼音)
+CASES = (
+    # 补语标记：动词、形容词后面的"得"读 de，不管后面跟什么
+    ("你说得对", "nǐ shuō de duì"),
+    ("做得不错", "zuò de bú cuò"),
+    ("写得好", "xiě de hǎo"),
+    ("唱得好", "chàng de hǎo"),
+    ("说得好听", "shuō de hǎo tīng"),
+    ("吃得饱吗", "chī de bǎo ma"),
+    ("他跑得很快", "tā pǎo de hěn kuài"),
+    ("你的中文说得越来越好了", "nǐ de zhōng wén shuō de yuè lái yuè hǎo le"),
+    ("他高兴得跳了起来", "tā gāo xìng de tiào le qǐ lái"),
+    # "必须"义：主语或情态副词后面、动词前面的"得"读 děi
+    ("我得走了", "wǒ děi zǒu le"),
+    ("我们得快点", "wǒ men děi kuài diǎn"),
+    ("你得去看看", "nǐ děi qù kàn kàn"),
+    ("我还得去", "wǒ hái děi qù"),
+    ("大家都得来", "dà jiā dōu děi lái"),
+    ("好，得走了", "hǎo, děi zǒu le"),
+    # 词典词语里的"得"
+    ("我得到了", "wǒ dé dào le"),
+    ("取得成功", "qǔ dé chéng gōng"),
+    ("得分", "dé fēn"),
+    ("她得病了", "tā dé bìng le"),
+    ("他得奖了", "tā dé jiǎng le"),
+    ("我得罪了他", "wǒ dé zuì le tā"),
+    ("我觉得很好", "wǒ jué de hěn hǎo"),
+    # 一/不 变调
+    ("一起去", "yì qǐ qù"),
+    ("一共", "yí gòng"),
+    ("第一", "dì yī"),
+    ("看一看", "kàn yī kàn"),
+    ("不是", "bú shì"),
+    ("不好", "bù hǎo"),
+)
+
+
+def main():
+    failures = 0
+    for sentence, expected in CASES:
+        actual = pinyin_engine.to_pinyin(sentence)
+        ok = actual == expected
+        print(f"[{'OK' if ok else 'FAIL'}] {sentence}")
+        if not ok:
+            failures += 1
+            print(f"       expected: {expected}")
+            print(f"       actual  : {actual}")
+
+    print(f"\n{len(CASES) - failures}/{len(CASES)} sentences read correctly")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
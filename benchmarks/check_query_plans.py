@@ -0,0 +1,98 @@
+"""
+CN Chinese Link - 查询计划检查
+用 EXPLAIN QUERY PLAN 确认 app.py / admin.py / 查看数据报告.py 的热点查询都走索引
+
+使用方法：
+    python benchmarks/check_query_plans.py
+全部通过返回 0，否则打印查询计划并返回 1
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+# (说明, SQL, 参数, 查询计划中应出现的索引，可以是索引名前缀)
+QUERIES = (
+    ("get_all_vocab 登录用户",
+     "SELECT id, word, meaning, context, created_at FROM vocab WHERE user_id = ? AND mastered = 0 ORDER BY created_at DESC",
+     (1,), "idx_vocab_user_mastered_created"),
+    ("get_all_vocab 未登录",
+     "SELECT id, word, meaning, context, created_at FROM vocab WHERE mastered = 0 ORDER BY created_at DESC",
+     (), "idx_vocab_mastered_created"),
+    # 事件类型统计读汇总表（rollups.event_counts）；不限日期时读整张汇总表（每天每类事件一行），不需要索引
+    ("事件类型统计（汇总表，当天）",
+     "SELECT event_name, SUM(count) FROM rollup_daily_events WHERE day = ? GROUP BY event_name",
+     ("2024-01-01",), "PRIMARY KEY"),
+    ("归档：超过保留天数的事件",
+     "SELECT id FROM events WHERE created_at < ? ORDER BY created_at, id LIMIT ?",
+     ("2024-01-01", 50000), "idx_events_created"),
+    ("单个用户的事件",
+     "SELECT event_name, created_at FROM events WHERE user_id = ? ORDER BY created_at DESC",
+     (1,), "idx_events_user"),
+    ("生词列表（关联用户）",
+     """SELECT v.word, v.meaning, v.mastered, u.email, v.created_at
+        FROM vocab v LEFT JOIN users u ON v.user_id = u.id
+        ORDER BY v.created_at DESC""",
+     (), "idx_vocab_created"),
+    ("汇总表增量：每日事件数",
+     "SELECT COALESCE(date(created_at), ''), COALESCE(event_name, ''), COUNT(*) FROM events WHERE id > ? AND id <= ? GROUP BY 1, 2",
+     (100, 200), "INTEGER PRIMARY KEY"),
+    ("汇总表增量：对话分布",
+     "SELECT COALESCE(date(created_at), ''), role, scene, hsk_level, COUNT(*) FROM events WHERE id > ? AND id <= ? AND +event_name = 'conversation_started' GROUP BY 1, 2, 3, 4",
+     (100, 200), "INTEGER PRIMARY KEY"),
+    ("load_history 最近一页",
+     "SELECT id, sender, content, pinyin, english, keywords, suggestions FROM history WHERE user_id = ? AND role = ? AND scene = ? ORDER BY id DESC LIMIT ?",
+     (1, "王阿姨", "春节回家", 21), "idx_history_user_role_scene"),
+    ("load_history 更早一页",
+     "SELECT id, sender, content, pinyin, english, keywords, suggestions FROM history WHERE user_id = ? AND role = ? AND scene = ? AND id < ? ORDER BY id DESC LIMIT ?",
+     (1, "王阿姨", "春节回家", 100, 21), "idx_history_user_role_scene"),
+    ("开场白池取一条",
+     "SELECT id, content FROM opening_pool WHERE role = ? AND scene = ? AND hsk_level = ? ORDER BY id LIMIT 1",
+     ("王阿姨", "春节回家", 3), "idx_opening_pool_key"),
+    ("回复缓存 LRU 淘汰",
+     "SELECT key FROM llm_response_cache ORDER BY last_used LIMIT ?",
+     (10,), "idx_llm_response_cache_last_used"),
+    ("TTS 缓存 LRU 淘汰",
+     "SELECT key, path, bytes FROM tts_cache ORDER BY last_used",
+     (), "idx_tts_cache_last_used"),
+)
+
+# 已经没有查询使用、由迁移删除的索引：每次写入都要维护，不应该再出现
+DROPPED_INDEXES = ("idx_events_name_created", "idx_events_name_role_scene", "idx_events_name_scene", "idx_events_name_hsk")
+
+
+def explain(conn, sql, params):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db.get_connection(os.path.join(tmp, "plans.db"))
+        print(f"schema version: {db.get_schema_version(conn)}\n")
+        for name, sql, params, index in QUERIES:
+            plan = explain(conn, sql, params)
+            ok = any(index in step for step in plan) and not any("TEMP B-TREE FOR ORDER BY" in step for step in plan)
+            print(f"[{'OK' if ok else 'FAIL'}] {name}")
+            if not ok:
+                failures += 1
+                print(f"       expected index: {index}")
+                for step in plan:
+                    print(f"       {step}")
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for index in DROPPED_INDEXES:
+            ok = index not in existing
+            print(f"[{'OK' if ok else 'FAIL'}] 已删除的索引 {index}")
+            failures += not ok
+        db.close_all()
+
+    print(f"\n{len(QUERIES) + len(DROPPED_INDEXES) - failures}/{len(QUERIES) + len(DROPPED_INDEXES)} checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+CN Chinese Link - 请求录制与回放（cassette）
+- 录制：把真实的 DeepSeek / TTS / ASR 请求和响应逐条追加到 JSONL 文件
+- 回放：mock_servers.py 读取同一个文件，按请求内容找到录制的响应返回
+- 音频等二进制内容用 base64 保存
+
+每行一条记录：
+    {"service": "deepseek" | "tts" | "asr", "key": "...", "request": {...}, "response": {...}, "latency": 秒}
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+
+SERVICES = ("deepseek", "tts", "asr")
+
+
+def request_key(service, request):
+    """请求的规范化哈希（字段顺序无关）"""
+    payload = json.dumps([service, request], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def audio_key(audio_bytes):
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def encode_bytes(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def decode_bytes(text):
+    return base64.b64decode(text)
+
+
+class Cassette:
+    """一个录制文件；录制时追加写入，回放时全部读入内存"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = []
+        self._by_key = {}
+        self._cursor = {service: 0 for service in SERVICES}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def _add(self, entry):
+        self._entries.append(entry)
+        self._by_key.setdefault(entry["key"], []).append(entry)
+
+    def record(self, service, request, response, latency=0.0):
+        """追加一条录制记录"""
+        entry = {"service": service, "key": request_key(service, request), "request": request,
+                 "response": response, "latency": round(latency, 4)}
+        with self._lock:
+            self._add(entry)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def lookup(self, service, request, match=None):
+        """查找录制的记录
+
+        先按完整请求精确匹配；没有时用 match(entry_request) 做宽松匹配（例如只比较最后一条学生消息）；
+        仍然没有时按顺序轮流返回该服务的记录，保证回放永远有响应。没有任何记录时返回 None。
+        """
+        entries = self._by_key.get(request_key(service, request))
+        if entries:
+            return entries[0]
+        candidates = [e for e in self._entries if e["service"] == service]
+        if match is not None:
+            matched = [e for e in candidates if match(e["request"])]
+            if matched:
+                return matched[0]
+        if not candidates:
+            return None
+        with self._lock:
+            entry = candidates[self._cursor[service] % len(candidates)]
+            self._cursor[service] += 1
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ============================================================
+# 录制开关（环境变量 CASSETTE_RECORD=录制文件路径）
+# ============================================================
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+
+def get_recorder():
+    """录制已开启时返回共享的 Cassette，否则返回 None"""
+    path = os.environ.get("CASSETTE_RECORD")
+    if not path:
+        return None
+    with _recorders_lock:
+        if path not in _recorders:
+            _recorders[path] = Cassette(path)
+        return _recorders[path]
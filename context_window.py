@@ -0,0 +1,144 @@
+"""
+CN Chinese Link - 对话上下文窗口
+- 每轮只把最近 KEEP_TURNS 轮原文发给 DeepSeek，更早的对话折叠进一段滚动摘要
+- 摘要是增量更新的：每次只把新移出窗口的几轮合并进已有摘要，不重新总结全部历史
+- 折叠在后台线程里进行，不增加本轮等待时间；摘要到达之前窗口暂时多带几轮原文
+- 记录每轮估算的 prompt tokens 和节省量
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+KEEP_TURNS = 6           # 原文保留的最近轮数（一轮 = 学生 + 角色各一条）
+FOLD_TURNS = 3           # 超出 KEEP_TURNS 这么多轮时才折叠一次，减少摘要请求次数
+TOKEN_BUDGET = 1500      # 摘要 + 原文的估算 token 上限
+SUMMARY_MAX_CHARS = 400  # 本地摘要的长度上限
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-summary")
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：汉字约 0.6 token，其他字符约 0.3 token"""
+    cjk = sum(1 for char in text if "一" <= char <= "鿿")
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+def to_api_message(msg):
+    """会话消息 -> API 消息，角色回复只发中文内容"""
+    content = msg["content"]
+    if msg["role"] == "user":
+        return {"role": "user", "content": content}
+    return {"role": "assistant", "content": content.get("chinese", "") if isinstance(content, dict) else str(content)}
+
+
+def local_summary(summary, messages):
+    """不请求模型的摘要：把新移出窗口的对话压成短句追加到摘要末尾，超长时保留最近的部分"""
+    lines = [f"{'学生' if m['role'] == 'user' else '角色'}：{m['content'][:40]}" for m in messages]
+    merged = "；".join(filter(None, [summary] + lines))
+    return merged[-SUMMARY_MAX_CHARS:]
+
+
+class ContextWindow:
+    """一个对话会话的上下文窗口（存放在 st.session_state 中）
+
+    summarize(summary, messages) 返回合并后的新摘要，在后台线程执行，
+    失败时退回 local_summary。
+    """
+
+    def __init__(self, summarize=local_summary, keep_turns=KEEP_TURNS, fold_turns=FOLD_TURNS, token_budget=TOKEN_BUDGET):
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.fold_turns = fold_turns
+        self.token_budget = token_budget
+
+        self.summary = ""
+        self._last_folded = None   # 最后一条已折叠进摘要的会话消息（按对象身份定位）
+        self._pending = None       # (折叠到的消息, 要折叠的 API 消息, future)
+
+        # 计数器
+        self.turns = 0
+        self.folds = 0
+        self.summary_failures = 0
+        self.total_full_tokens = 0
+        self.total_sent_tokens = 0
+        self.last_turn = {}
+
+    def build(self, messages):
+        """返回本轮要发送的 API 消息（摘要 + 最近原文）"""
+        self._collect()
+        start = self._folded_index(messages)
+        window = [to_api_message(m) for m in messages[start:]]
+
+        overflow = self._overflow(window)
+        if overflow and self._pending is None:
+            boundary = messages[start + overflow - 1]
+            folded = window[:overflow]
+            self._pending = (boundary, folded, _executor.submit(self.summarize, self.summary, folded))
+
+        api_messages = self._with_summary(window)
+
+        full_tokens = sum(estimate_tokens(to_api_message(m)["content"]) for m in messages)
+        sent_tokens = sum(estimate_tokens(m["content"]) for m in api_messages)
+        self.turns += 1
+        self.total_full_tokens += full_tokens
+        self.total_sent_tokens += sent_tokens
+        self.last_turn = {"prompt_tokens": sent_tokens, "tokens_saved": full_tokens - sent_tokens}
+        return api_messages
+
+    def preview(self, messages):
+        """build 会发送的消息，但不计数、不触发折叠（预取用）"""
+        start = self._folded_index(messages)
+        return self._with_summary([to_api_message(m) for m in messages[start:]])
+
+    def stats(self):
+        return {
+            "turns": self.turns,
+            "folds": self.folds,
+            "summary_failures": self.summary_failures,
+            "summary_chars": len(self.summary),
+            "tokens_sent": self.total_sent_tokens,
+            "tokens_saved": self.total_full_tokens - self.total_sent_tokens,
+            "avg_tokens_saved": (self.total_full_tokens - self.total_sent_tokens) / self.turns if self.turns else 0.0,
+        }
+
+    def _with_summary(self, window):
+        if not self.summary:
+            return window
+        return [{"role": "system", "content": f"此前对话摘要：{self.summary}"}] + window
+
+    def _folded_index(self, messages):
+        """已折叠部分之后的第一条消息下标；找不到边界（重新开始了对话）时清空摘要"""
+        if self._last_folded is None:
+            return 0
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i] is self._last_folded:
+                return i + 1
+        self.summary = ""
+        self._last_folded = None
+        self._pending = None
+        return 0
+
+    def _overflow(self, window):
+        """开头需要折叠的消息条数（至少保留最后一轮）"""
+        max_messages = self.keep_turns * 2
+        overflow = 0
+        if len(window) > (self.keep_turns + self.fold_turns) * 2:
+            overflow = len(window) - max_messages
+        tokens = estimate_tokens(self.summary) + sum(estimate_tokens(m["content"]) for m in window[overflow:])
+        while tokens > self.token_budget and overflow < len(window) - 2:
+            tokens -= estimate_tokens(window[overflow]["content"])
+            overflow += 1
+        return overflow
+
+    def _collect(self):
+        """后台折叠完成后应用新摘要"""
+        if self._pending is None or not self._pending[2].done():
+            return
+        boundary, folded, future = self._pending
+        self._pending = None
+        try:
+            self.summary = future.result()
+        except Exception:
+            self.summary_failures += 1
+            self.summary = local_summary(self.summary, folded)
+        self._last_folded = boundary
+        self.folds += 1
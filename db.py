@@ -0,0 +1,423 @@
+"""
+CN Chinese Link - 数据库连接管理
+- 每个线程复用同一个 SQLite 连接，不再每次调用都 connect/close
+- WAL 模式 + busy_timeout，读写互不阻塞，减少 "database is locked"
+- 表结构每个进程只初始化一次，并通过 PRAGMA user_version 做版本化迁移
+- unit_of_work 把一次用户操作的多次写入合并为一个事务
+"""
+
+import atexit
+import contextlib
+import sqlite3
+import threading
+
+DB_PATH = "chinese_learning.db"
+
+# 等待写锁的最长时间（毫秒），超时才抛出 database is locked
+BUSY_TIMEOUT_MS = 5000
+
+# 每个新连接都会执行的 PRAGMA
+CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA journal_mode = WAL",      # 读不阻塞写，写不阻塞读
+    "PRAGMA synchronous = NORMAL",    # WAL 下安全，且只在 checkpoint 时 fsync
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",      # 约 8MB 页缓存
+    "PRAGMA mmap_size = 67108864",    # 64MB 内存映射读
+)
+
+# ============================================================
+# 表结构（版本 0 基线，之后的变更都写在 MIGRATIONS 中）
+# ============================================================
+SCHEMA = (
+    # 用户表
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        nickname TEXT,
+        hsk_level INTEGER DEFAULT 3,
+        total_conversations INTEGER DEFAULT 0,
+        total_words_learned INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP
+    )""",
+
+    # 对话历史表（关联用户）
+    """CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        role TEXT,
+        scene TEXT,
+        sender TEXT,
+        content TEXT,
+        pinyin TEXT,
+        english TEXT,
+        keywords TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )""",
+
+    # 生词本（关联用户）
+    """CREATE TABLE IF NOT EXISTS vocab (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        word TEXT,
+        meaning TEXT,
+        context TEXT,
+        mastered INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        UNIQUE(user_id, word)
+    )""",
+
+    # 埋点事件表
+    """CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        event_name TEXT,
+        event_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )""",
+)
+
+# ============================================================
+# 版本化迁移
+# ============================================================
+def _backfill_event_attributes(conn):
+    """补齐没有写 role/scene/hsk_level 列的事件（手机版等直接 INSERT 的写入方），
+    已经按 "未知" 计入对话分布汇总表的部分改记到正确的分组"""
+    import rollups
+
+    row = conn.execute("SELECT last_event_id FROM rollup_state WHERE name = ?", (rollups.STATE_KEY,)).fetchone()
+    rows = conn.execute(
+        """SELECT COALESCE(date(created_at), ''), role, scene, hsk_level,
+                  json_extract(event_data, '$.role'), json_extract(event_data, '$.scene'), json_extract(event_data, '$.hsk_level')
+           FROM events
+           WHERE id <= ? AND +event_name = 'conversation_started' AND (role IS NULL OR scene IS NULL OR hsk_level IS NULL)
+             AND json_valid(event_data)""",
+        (row[0] if row else 0,)
+    ).fetchall()
+    for day, role, scene, hsk_level, json_role, json_scene, json_hsk in rows:
+        old = (day, role or rollups.UNKNOWN, scene or rollups.UNKNOWN, rollups.DEFAULT_HSK if hsk_level is None else hsk_level)
+        new = (day, role or json_role or rollups.UNKNOWN, scene or json_scene or rollups.UNKNOWN,
+               hsk_level if hsk_level is not None else json_hsk if json_hsk is not None else rollups.DEFAULT_HSK)
+        if old == new:
+            continue
+        conn.execute("""UPDATE rollup_daily_conversations SET count = count - 1
+                        WHERE day = ? AND role = ? AND scene = ? AND hsk_level = ?""", old)
+        conn.execute("""INSERT INTO rollup_daily_conversations (day, role, scene, hsk_level, count) VALUES (?, ?, ?, ?, 1)
+                        ON CONFLICT (day, role, scene, hsk_level) DO UPDATE SET count = count + 1""", new)
+    conn.execute("DELETE FROM rollup_daily_conversations WHERE count <= 0")
+    conn.execute("""UPDATE events SET
+        role = COALESCE(role, json_extract(event_data, '$.role')),
+        scene = COALESCE(scene, json_extract(event_data, '$.scene')),
+        hsk_level = COALESCE(hsk_level, json_extract(event_data, '$.hsk_level'))
+    WHERE (role IS NULL OR scene IS NULL OR hsk_level IS NULL) AND json_valid(event_data)""")
+
+
+# 当前版本记录在 PRAGMA user_version 中，按版本号顺序执行尚未应用的迁移。
+# 每一步可以是 SQL 字符串，也可以是接收 conn 的函数（用于回填数据等）。
+# 已发布的迁移不要修改，只能追加新版本。
+MIGRATIONS = (
+    (1, "events 按事件名/时间/用户访问的索引", (
+        # 管理后台 / 数据报告：WHERE event_name = ? 、GROUP BY event_name、按天统计
+        "CREATE INDEX IF NOT EXISTS idx_events_name_created ON events (event_name, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_events_created ON events (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_events_user ON events (user_id, created_at)",
+    )),
+    (2, "vocab 按用户+掌握状态+时间访问的索引", (
+        # get_all_vocab：WHERE user_id = ? AND mastered = 0 ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_vocab_user_mastered_created ON vocab (user_id, mastered, created_at)",
+        # 未登录时：WHERE mastered = 0 ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_vocab_mastered_created ON vocab (mastered, created_at)",
+        # 管理后台 / 数据报告：ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_vocab_created ON vocab (created_at)",
+    )),
+    (3, "history 保存推荐回复，并按 (用户, 角色, 场景) 分页读取", (
+        "ALTER TABLE history ADD COLUMN suggestions TEXT",
+        # load_history：WHERE user_id = ? AND role = ? AND scene = ? AND id < ? ORDER BY id DESC
+        "CREATE INDEX IF NOT EXISTS idx_history_user_role_scene ON history (user_id, role, scene, id)",
+    )),
+    (4, "events 增加 role/scene/hsk_level 列并回填，统计直接 GROUP BY", (
+        "ALTER TABLE events ADD COLUMN role TEXT",
+        "ALTER TABLE events ADD COLUMN scene TEXT",
+        "ALTER TABLE events ADD COLUMN hsk_level INTEGER",
+        # 回填历史数据；json_valid 跳过损坏的 event_data，避免整条 UPDATE 失败
+        """UPDATE events SET
+            role = json_extract(event_data, '$.role'),
+            scene = json_extract(event_data, '$.scene'),
+            hsk_level = json_extract(event_data, '$.hsk_level')
+        WHERE json_valid(event_data)""",
+        "CREATE INDEX IF NOT EXISTS idx_events_name_role_scene ON events (event_name, role, scene)",
+        "CREATE INDEX IF NOT EXISTS idx_events_name_scene ON events (event_name, scene)",
+        "CREATE INDEX IF NOT EXISTS idx_events_name_hsk ON events (event_name, hsk_level)",
+    )),
+    (5, "按天汇总的统计表（由 rollups.py 增量维护）", (
+        """CREATE TABLE IF NOT EXISTS rollup_daily_events (
+            day TEXT NOT NULL,
+            event_name TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, event_name)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_daily_conversations (
+            day TEXT NOT NULL,
+            role TEXT NOT NULL,
+            scene TEXT NOT NULL,
+            hsk_level INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, role, scene, hsk_level)
+        ) WITHOUT ROWID""",
+        # 已汇总到的 events.id（高水位），历史数据在第一次 refresh 时一次性汇总
+        """CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL
+        )""",
+    )),
+    (6, "预生成的开场白池（由 opening_pool.py 维护）", (
+        """CREATE TABLE IF NOT EXISTS opening_pool (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role TEXT NOT NULL,
+            scene TEXT NOT NULL,
+            hsk_level INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # take：WHERE role = ? AND scene = ? AND hsk_level = ? ORDER BY id LIMIT 1
+        "CREATE INDEX IF NOT EXISTS idx_opening_pool_key ON opening_pool (role, scene, hsk_level, id)",
+    )),
+    (7, "多进程共享的 LLM 回复缓存（由 response_cache.py 维护）", (
+        """CREATE TABLE IF NOT EXISTS llm_response_cache (
+            key TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )""",
+        # LRU 淘汰：ORDER BY last_used LIMIT ?
+        "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used ON llm_response_cache (last_used)",
+    )),
+    (8, "所有用户共享的翻译记忆（由 translation.py 维护）", (
+        """CREATE TABLE IF NOT EXISTS translation_memory (
+            hash TEXT PRIMARY KEY,
+            chinese TEXT NOT NULL,
+            english TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    )),
+    (9, "TTS 音频磁盘缓存的索引（由 tts_cache.py 维护）", (
+        """CREATE TABLE IF NOT EXISTS tts_cache (
+            key TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )""",
+        # LRU 淘汰：ORDER BY last_used
+        "CREATE INDEX IF NOT EXISTS idx_tts_cache_last_used ON tts_cache (last_used)",
+    )),
+    (10, "删除报表改读汇总表后不再使用的 events 索引，减少每次写入事件的维护开销", (
+        # 汇总表增量按 id 范围扫描（+event_name 故意不走索引），角色/场景/等级统计都读汇总表
+        "DROP INDEX IF EXISTS idx_events_name_created",
+        "DROP INDEX IF EXISTS idx_events_name_role_scene",
+        "DROP INDEX IF EXISTS idx_events_name_scene",
+        "DROP INDEX IF EXISTS idx_events_name_hsk",
+    )),
+    (11, "events 的 role/scene/hsk_level 列由数据库从 event_data 补齐，不依赖写入方", (
+        # 手机版 track_event 只写 event_data；插入时列为空、JSON 里有值就补上（在同一事务内，汇总之前）。
+        # CASE 保证 json_valid 先于 json_extract 求值，损坏的 event_data 不会让插入失败
+        """CREATE TRIGGER IF NOT EXISTS events_fill_attributes AFTER INSERT ON events
+        WHEN (NEW.role IS NULL OR NEW.scene IS NULL OR NEW.hsk_level IS NULL)
+            AND CASE WHEN json_valid(NEW.event_data) THEN
+                json_extract(NEW.event_data, '$.role') IS NOT NULL
+                OR json_extract(NEW.event_data, '$.scene') IS NOT NULL
+                OR json_extract(NEW.event_data, '$.hsk_level') IS NOT NULL
+            ELSE 0 END
+        BEGIN
+            UPDATE events SET
+                role = COALESCE(role, json_extract(NEW.event_data, '$.role')),
+                scene = COALESCE(scene, json_extract(NEW.event_data, '$.scene')),
+                hsk_level = COALESCE(hsk_level, json_extract(NEW.event_data, '$.hsk_level'))
+            WHERE id = NEW.id;
+        END""",
+        _backfill_event_attributes,
+    )),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """把数据库升级到最新版本，返回本次应用的版本号列表
+
+    每个迁移在单独的 IMMEDIATE 事务中执行，并在事务内重新读取版本号，
+    多个进程同时启动时只会有一个真正执行。
+    """
+    applied = []
+    for version, _description, steps in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= get_schema_version(conn):
+                conn.execute("ROLLBACK")
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        applied.append(version)
+    return applied
+
+# ============================================================
+# 连接管理
+# ============================================================
+_local = threading.local()
+_lock = threading.Lock()
+_connections = {}          # (thread, db_path) -> connection，用于回收和退出时关闭
+_schema_ready = set()      # 本进程已初始化表结构的数据库路径
+
+
+def _open_connection(db_path):
+    """新建连接并应用 PRAGMA"""
+    # check_same_thread=False：连接只由所属线程使用，
+    # 但线程退出后需要由其他线程负责关闭
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _reap_dead_threads():
+    """关闭已退出线程遗留的连接（调用方需持有 _lock）"""
+    for key in [k for k in _connections if not k[0].is_alive()]:
+        try:
+            _connections.pop(key).close()
+        except sqlite3.Error:
+            pass
+
+
+def init_schema(db_path=DB_PATH):
+    """初始化表结构并执行迁移 - 每个进程每个数据库只执行一次"""
+    if db_path in _schema_ready:
+        return
+    with _lock:
+        if db_path in _schema_ready:
+            return
+        conn = _open_connection(db_path)
+        try:
+            with conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+            migrate(conn)
+        finally:
+            conn.close()
+        _schema_ready.add(db_path)
+
+
+def get_connection(db_path=DB_PATH):
+    """获取当前线程复用的连接（首次使用时自动初始化表结构）
+
+    写操作请用 `with unit_of_work(db_path) as conn:` 包裹，成功自动提交、
+    异常自动回滚，避免把未结束的事务留在复用的连接上。
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is not None:
+        return conn
+
+    init_schema(db_path)
+    conn = _open_connection(db_path)
+    with _lock:
+        _reap_dead_threads()
+        _connections[(threading.current_thread(), db_path)] = conn
+    conns[db_path] = conn
+    return conn
+
+
+# ============================================================
+# 事务（Unit of Work）
+# ============================================================
+def _uow_state():
+    state = getattr(_local, "uow", None)
+    if state is None:
+        state = _local.uow = {}
+    return state
+
+
+@contextlib.contextmanager
+def unit_of_work(db_path=DB_PATH):
+    """把一次用户操作的多次写入合并成一个事务，只提交一次
+
+    可以嵌套：内层直接加入外层事务，只有最外层负责提交或回滚。
+    用 BEGIN IMMEDIATE 一开始就拿写锁，避免读锁升级时的死锁。
+    """
+    conn = get_connection(db_path)
+    state = _uow_state()
+    if db_path in state:
+        state[db_path]["depth"] += 1
+        try:
+            yield conn
+        finally:
+            state[db_path]["depth"] -= 1
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    state[db_path] = {"depth": 1, "on_commit": []}
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        callbacks = state.pop(db_path)["on_commit"]
+    for callback in callbacks:
+        callback()
+
+
+def current_unit_of_work(db_path=DB_PATH):
+    """当前线程正在进行的事务连接，没有则返回 None"""
+    if db_path in _uow_state():
+        return get_connection(db_path)
+    return None
+
+
+def on_commit(callback, db_path=DB_PATH):
+    """事务提交后再执行 callback（例如更新缓存）；不在事务中则立即执行"""
+    state = _uow_state().get(db_path)
+    if state is None:
+        callback()
+    else:
+        state["on_commit"].append(callback)
+
+
+def close_all():
+    """关闭所有连接（进程退出时自动调用）"""
+    with _lock:
+        for conn in _connections.values():
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+        _schema_ready.clear()
+    _local.conns = {}
+
+
+atexit.register(close_all)
@@ -0,0 +1,187 @@
+"""
+CN Chinese Link - 异步埋点写入
+- track_event 只把事件放进内存队列，立即返回，不在页面线程上等磁盘
+- 后台线程攒批，按条数或时间阈值用 executemany 一次事务写入
+- 同一事务内增量更新按天汇总表（rollups.py）
+- 进程退出时把队列里剩下的事件全部写完
+- 在 db.unit_of_work 事务中记录的事件直接随该事务提交，不额外排队
+"""
+
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import db
+import rollups
+
+BATCH_SIZE = 100         # 攒够这么多条立即写
+FLUSH_INTERVAL = 1.0     # 或者距第一条事件超过这么多秒就写
+MAX_QUEUE = 10000        # 队列上限，超出的事件直接丢弃并计数
+
+INSERT_SQL = "INSERT INTO events (user_id, event_name, event_data, created_at, role, scene, hsk_level) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+def _utc_timestamp():
+    """与 SQLite CURRENT_TIMESTAMP 相同的格式（UTC），记录的是事件发生时间而不是落盘时间"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def event_row(user_id, event_name, event_data=None):
+    """INSERT_SQL 对应的一行参数"""
+    event_data = event_data or {}
+    # 统计常用的属性同时写入独立列，报表直接 GROUP BY，不用逐行解析 JSON
+    return (user_id, event_name, json.dumps(event_data), _utc_timestamp(),
+            event_data.get("role"), event_data.get("scene"), event_data.get("hsk_level"))
+
+
+class EventWriter:
+    """后台批量写入 events 表"""
+
+    def __init__(self, db_path=db.DB_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+
+        # 计数器
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0     # 队列已满被丢弃
+        self.failed = 0      # 写入数据库失败
+        self.batches = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, user_id, event_name, event_data=None):
+        """提交一条事件，不阻塞；队列满时丢弃并返回 False"""
+        row = event_row(user_id, event_name, event_data)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def flush(self):
+        """阻塞直到已提交的事件全部落盘"""
+        if not self._thread.is_alive():
+            self._drain_all()
+            return
+        self._queue.join()
+
+    def stop(self, timeout=5.0):
+        """停止后台线程，并写完队列中剩余的事件"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self._drain_all()
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    # ------------------------------------------------------------
+    # 后台线程
+    # ------------------------------------------------------------
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+        self._drain_all()
+
+    def _collect(self):
+        """等到凑满一批，或距第一条事件超过 flush_interval"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain_all(self):
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            conn = db.get_connection(self.db_path)
+            with conn:
+                conn.executemany(INSERT_SQL, batch)
+                rollups.apply_new_events(conn)
+            self.written += len(batch)
+            self.batches += 1
+        except sqlite3.Error:
+            self.failed += len(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+
+# ============================================================
+# 进程级单例
+# ============================================================
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_path=db.DB_PATH):
+    """获取（必要时启动）该数据库的后台写入器"""
+    writer = _writers.get(db_path)
+    if writer is not None:
+        return writer
+    with _writers_lock:
+        if db_path not in _writers:
+            _writers[db_path] = EventWriter(db_path).start()
+        return _writers[db_path]
+
+
+def record(user_id, event_name, event_data=None, db_path=db.DB_PATH):
+    """记录事件：在 unit_of_work 中时随该事务一起提交，否则交给后台写入器"""
+    conn = db.current_unit_of_work(db_path)
+    if conn is not None:
+        conn.execute(INSERT_SQL, event_row(user_id, event_name, event_data))
+        return True
+    return get_writer(db_path).submit(user_id, event_name, event_data)
+
+
+def shutdown():
+    """停止所有写入器并落盘（进程退出时自动调用）"""
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.stop()
+        _writers.clear()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,107 @@
+"""
+CN Chinese Link - 流式 JSON 增量解析
+LLM 流式输出 JSON 时，边收边解析顶层字符串字段（如 "chinese"），
+字段还没生成完就能拿到已到达的部分，用于聊天气泡的逐字显示。
+流结束后应用把累积的原文（parser.text）交给 wire_format.decode 解码，与非流式回复走同一个解码器，
+截断、多余逗号等损坏的输出在那里修复；result() 只做严格的 json.loads。
+"""
+
+import json
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class StreamingJSONParser:
+    """逐段 feed，随时读取顶层字符串字段的当前值"""
+
+    def __init__(self):
+        self._chunks = []
+        self._depth = 0
+        self._in_string = False
+        self._string_is_value = False  # 当前字符串是否是顶层字段的值
+        self._escape = None            # None / "" (刚读到反斜杠) / "u12" (正在读 \\uXXXX)
+        self._high_surrogate = None
+        self._current = []
+        self._expect_key = False
+        self._key = None
+
+        self.fields = {}        # 顶层字符串字段 -> 已到达的文本（可能未完成）
+        self.completed = set()  # 已经完整到达的字段
+
+    def feed(self, chunk):
+        """喂入一段文本，返回本次有更新的顶层字符串字段名集合"""
+        self._chunks.append(chunk)
+        updated = set()
+        for char in chunk:
+            if self._in_string:
+                self._feed_string_char(char, updated)
+            elif char == '"':
+                self._in_string = True
+                self._current = []
+                self._string_is_value = self._depth == 1 and not self._expect_key and self._key is not None
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = char == "{"
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and char == ":":
+                self._expect_key = False
+            elif self._depth == 1 and char == ",":
+                self._expect_key = True
+                self._key = None
+        # 每段只拼接一次，未完成的字段也能读到已到达的部分
+        if self._in_string and self._string_is_value:
+            self.fields[self._key] = "".join(self._current)
+        return updated
+
+    def _feed_string_char(self, char, updated):
+        if self._escape is not None:
+            if self._escape == "" and char != "u":
+                self._append(_ESCAPES.get(char, char), updated)
+                self._escape = None
+            elif self._escape == "":
+                self._escape = "u"
+            else:
+                self._escape += char
+                if len(self._escape) == 5:
+                    self._append_codepoint(int(self._escape[1:], 16), updated)
+                    self._escape = None
+            return
+
+        if char == "\\":
+            self._escape = ""
+        elif char == '"':
+            self._in_string = False
+            text = "".join(self._current)
+            if self._depth == 1 and self._expect_key:
+                self._key = text
+            elif self._string_is_value:
+                self.fields[self._key] = text
+                self.completed.add(self._key)
+                updated.add(self._key)
+        else:
+            self._append(char, updated)
+
+    def _append(self, text, updated):
+        self._current.append(text)
+        if self._string_is_value:
+            updated.add(self._key)
+
+    def _append_codepoint(self, code, updated):
+        # \\ud83d\\ude00 这样的代理对：先暂存高位，等低位到达后合并成一个字符
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._append(chr(code), updated)
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    def result(self):
+        """完整解析（流结束后调用），格式错误时抛出 json.JSONDecodeError"""
+        return json.loads(self.text)
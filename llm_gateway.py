@@ -0,0 +1,203 @@
+"""
+CN Chinese Link - LLM 网关
+- 进程内共享一个 OpenAI 兼容客户端（DeepSeek），HTTP 连接池 + keep-alive，
+  每轮对话不再重新建立 TCP/TLS 连接
+- 每个请求有总截止时间（deadline），瞬时错误在截止时间内带抖动指数退避重试
+- render_chat / process_input 通过 app.get_deepseek_response 走这里访问 DeepSeek
+"""
+
+import random
+import threading
+import time
+
+import openai
+from openai import OpenAI
+
+import cassettes
+
+DEFAULT_DEADLINE = 30.0       # 单次请求（含重试）的总时长上限（秒）
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5            # 第 n 次重试前最多等待 BACKOFF_BASE * 2^(n-1) 秒
+BACKOFF_CAP = 4.0
+
+# 可以重试的错误：超时、连接断开、限流、服务端 5xx
+RETRYABLE_ERRORS = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+class DeadlineExceeded(TimeoutError):
+    """在截止时间内没有拿到结果"""
+
+
+class LLMGateway:
+    """共享客户端 + 截止时间 + 重试"""
+
+    def __init__(self, api_key, base_url, default_deadline=DEFAULT_DEADLINE, max_retries=MAX_RETRIES):
+        self.default_deadline = default_deadline
+        self.max_retries = max_retries
+        # 客户端内部维护 HTTP 连接池，复用同一个实例即可保持 keep-alive 连接；
+        # SDK 自带的重试不看总截止时间，关掉由网关统一处理
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=default_deadline, max_retries=0)
+        # 设置了 CASSETTE_RECORD 时把请求和响应录制下来，供 mock_servers.py 回放
+        self.recorder = cassettes.get_recorder()
+
+        # 计数器
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.deadline_exceeded = 0
+        self.total_latency = 0.0
+        self.streams = 0
+        self.total_first_token_latency = 0.0
+        self.prompt_tokens = 0
+        self.prompt_cache_hit_tokens = 0
+        self._local = threading.local()  # 每个线程最近一次请求的 usage，埋点记录到这一轮
+
+    def chat(self, messages, deadline=None, **params):
+        """chat.completions.create，整个调用（含重试）不超过 deadline 秒"""
+        self.requests += 1
+        start = time.monotonic()
+        deadline_at = start + (deadline or self.default_deadline)
+        attempt = 0
+        while True:
+            remaining = self._remaining(deadline_at, deadline)
+            try:
+                response = self.client.chat.completions.create(messages=messages, timeout=remaining, **params)
+                self.total_latency += time.monotonic() - start
+                self._record_usage(response.usage)
+                self._record_cassette(messages, params, response.choices[0].message.content, response.usage, start)
+                return response
+            except RETRYABLE_ERRORS:
+                attempt += 1
+                self._backoff_or_raise(attempt, deadline_at)
+            except Exception:
+                self.failures += 1
+                raise
+
+    def chat_stream(self, messages, deadline=None, **params):
+        """流式调用，逐段 yield 文本增量
+
+        只在收到第一段之前重试；已经输出过内容后出错直接抛出，避免重复内容。
+        """
+        self.requests += 1
+        self.streams += 1
+        # 最后一个数据块带上 usage，用来统计前缀缓存命中
+        params.setdefault("stream_options", {"include_usage": True})
+        start = time.monotonic()
+        deadline_at = start + (deadline or self.default_deadline)
+        attempt = 0
+        while True:
+            remaining = self._remaining(deadline_at, deadline)
+            received = False
+            content = []
+            usage = None
+            try:
+                stream = self.client.chat.completions.create(messages=messages, stream=True, timeout=remaining, **params)
+                for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                        self._record_usage(usage)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        content.append(delta)
+                        if not received:
+                            received = True
+                            self.total_first_token_latency += time.monotonic() - start
+                        yield delta
+                    if time.monotonic() > deadline_at:
+                        stream.close()
+                        self._remaining(deadline_at, deadline)
+                self.total_latency += time.monotonic() - start
+                self._record_cassette(messages, params, "".join(content), usage, start)
+                return
+            except RETRYABLE_ERRORS:
+                if received:
+                    self.failures += 1
+                    raise
+                attempt += 1
+                self._backoff_or_raise(attempt, deadline_at)
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                self.failures += 1
+                raise
+
+    def _record_usage(self, usage):
+        """累计 prompt tokens 和前缀缓存命中的 tokens
+
+        DeepSeek 返回 prompt_cache_hit_tokens，OpenAI 兼容服务返回 prompt_tokens_details.cached_tokens
+        """
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        hit = getattr(usage, "prompt_cache_hit_tokens", None)
+        if hit is None and usage.prompt_tokens_details is not None:
+            hit = usage.prompt_tokens_details.cached_tokens
+        self.prompt_cache_hit_tokens += hit or 0
+        self._local.last_usage = {"prompt_tokens": usage.prompt_tokens or 0, "prompt_cache_hit_tokens": hit or 0}
+
+    def take_last_usage(self):
+        """取出当前线程最近一次请求的 {prompt_tokens, prompt_cache_hit_tokens} 并清空，没有时返回空字典"""
+        usage = getattr(self._local, "last_usage", None) or {}
+        self._local.last_usage = None
+        return usage
+
+    def _record_cassette(self, messages, params, content, usage, start):
+        if self.recorder is None:
+            return
+        request = {"model": params.get("model"), "messages": messages}
+        response = {"content": content, "usage": usage.model_dump() if usage is not None else None}
+        self.recorder.record("deepseek", request, response, time.monotonic() - start)
+
+    def _remaining(self, deadline_at, deadline):
+        """距截止时间还剩多少秒，已超时则抛出 DeadlineExceeded"""
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded(f"LLM 请求超过 {deadline or self.default_deadline:.0f}s 截止时间")
+        return remaining
+
+    def _backoff_or_raise(self, attempt, deadline_at):
+        """第 attempt 次失败后退避等待；超过重试次数或等待会越过截止时间则重新抛出"""
+        # full jitter：在 [0, 上限] 内随机等待，避免大量请求同时重试
+        backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+        if attempt > self.max_retries or time.monotonic() + backoff >= deadline_at:
+            self.failures += 1
+            raise
+        self.retries += 1
+        time.sleep(backoff)
+
+    def stats(self):
+        succeeded = self.requests - self.failures - self.deadline_exceeded
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "deadline_exceeded": self.deadline_exceeded,
+            "avg_latency": self.total_latency / succeeded if succeeded > 0 else 0.0,
+            "avg_first_token_latency": self.total_first_token_latency / self.streams if self.streams else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_cache_hit_tokens": self.prompt_cache_hit_tokens,
+            "prompt_cache_hit_rate": self.prompt_cache_hit_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
+
+    def close(self):
+        self.client.close()
+
+
+# ============================================================
+# 进程级单例
+# ============================================================
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(api_key, base_url):
+    """获取（必要时创建）共享网关，同一 (api_key, base_url) 全进程复用"""
+    key = (api_key, base_url)
+    gateway = _gateways.get(key)
+    if gateway is not None:
+        return gateway
+    with _gateways_lock:
+        if key not in _gateways:
+            _gateways[key] = LLMGateway(api_key, base_url)
+        return _gateways[key]
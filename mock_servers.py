@@ -0,0 +1,454 @@
+"""
+CN Chinese Link - 本地模拟服务（离线运行和性能测试用）
+- OpenAI 兼容接口：POST /v1/chat/completions（支持 stream），代替 DeepSeek
+- DashScope 替身：POST /dashscope/tts（返回 MP3，"format": "wav" 时返回 WAV；"stream": true 时分块返回）、POST /dashscope/asr（上传 WAV，返回文字）、
+  POST /dashscope/tts/session（模拟 WebSocket 建连和握手，之后带 session 的合成请求复用这个连接）
+- 回放 cassettes.py 录制的真实响应；没有录制文件时返回固定格式的合成响应
+- 可配置延迟分布和错误率（随机种子固定，结果可复现）
+- GET /stats 查看各接口的请求数和注入的错误数
+
+使用方法：
+    python mock_servers.py [--port 8900] [--cassette cassettes/session.jsonl]
+                           [--llm-latency lognormal:800,0.4] [--tts-latency uniform:200,600]
+                           [--asr-latency fixed:300] [--tts-setup-latency fixed:250] [--token-latency fixed:30]
+                           [--error-rate 0.02] [--seed 42]
+                           （--tts-latency linear:300,40 表示 300ms + 每字 40ms；
+                             --token-latency 是 DeepSeek 每生成一个输出 token 的耗时，按 usage.completion_tokens 计）
+
+然后让应用连接本地服务（.streamlit/secrets.toml 或环境变量）：
+    DEEPSEEK_BASE_URL = "http://127.0.0.1:8900/v1"
+    DASHSCOPE_MOCK_URL = "http://127.0.0.1:8900/dashscope"
+"""
+
+import argparse
+import http.client
+import io
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cassettes
+
+STREAM_CHUNK_CHARS = 8         # 流式响应每块的字符数
+STREAM_CHUNK_DELAY = 0.02      # 流式响应块间隔（秒）
+SYNTHETIC_SECONDS_PER_CHAR = 0.2
+TTS_STREAM_CHUNKS = 8          # 流式语音合成分几块返回，合成耗时平均分摊到每块之前
+TTS_SESSION_IDLE = 60.0        # 合成会话空闲多久被服务端关闭（与 DashScope WebSocket 相同）
+
+
+# ============================================================
+# 延迟分布
+# ============================================================
+class Latency:
+    """延迟分布，格式：none | fixed:毫秒 | uniform:最小,最大 | lognormal:中位数,sigma | linear:基础,每字 | recorded
+
+    linear 的耗时随请求长度增长（语音合成按文字字数），其他分布与长度无关
+    """
+
+    def __init__(self, spec="none"):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(x) / 1000 for x in args.split(",")] if args else []
+        if kind == "lognormal":
+            self.args[1] *= 1000   # sigma 不是毫秒
+        if kind not in ("none", "fixed", "uniform", "lognormal", "linear", "recorded"):
+            raise ValueError(f"未知的延迟分布: {spec}")
+
+    def sample(self, rng, recorded=0.0, size=0):
+        """返回秒数；recorded 表示使用录制时的真实耗时，size 是请求长度（字数）"""
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return rng.uniform(self.args[0], self.args[1])
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(self.args[0]), self.args[1])
+        if self.kind == "linear":
+            return self.args[0] + self.args[1] * size
+        if self.kind == "recorded":
+            return recorded
+        return 0.0
+
+
+# ============================================================
+# 合成响应（没有录制记录时使用）
+# ============================================================
+def synthetic_reply(request):
+    """与提示词要求的紧凑 JSON 格式一致的回复；非 JSON 请求（如对话摘要）返回纯文本"""
+    last_user = next((m["content"] for m in reversed(request["messages"]) if m["role"] == "user"), "")
+    if request.get("response_format", {}).get("type") != "json_object":
+        return f"学生和角色聊了：{last_user[:30]}"
+    return json.dumps({
+        "c": f"好的，我听到你说：{last_user[:20]}",
+        "e": "OK, I heard you.",
+        "k": [["好的", "OK"]],
+        "s": [["谢谢", "Thanks"], ["再见", "Bye"], ["你好", "Hello"]],
+    }, ensure_ascii=False)
+
+
+# MPEG-2 Layer III 22050Hz 单声道 32kbps 的静音帧（与应用请求的 MP3_22050HZ_MONO 一致）：
+# 帧头之后的边信息和主数据全为 0，解码出来是静音；每帧 576 个采样、104 字节
+_SILENT_MP3_FRAME = b"\xff\xf3\x40\xc0" + b"\x00" * 100
+_MP3_FRAME_SECONDS = 576 / 22050
+
+
+def synthetic_audio(text, format="mp3"):
+    """与文字长度相当的静音音频，默认与应用相同的 MP3；format="wav" 时返回 16kHz WAV"""
+    seconds = SYNTHETIC_SECONDS_PER_CHAR * max(len(text), 1)
+    if format != "wav":
+        return _SILENT_MP3_FRAME * math.ceil(seconds / _MP3_FRAME_SECONDS)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(b"\x00\x00" * int(16000 * seconds))
+    return buffer.getvalue()
+
+
+def _last_user_message(messages):
+    return next((m["content"] for m in reversed(messages) if m["role"] == "user"), None)
+
+
+# ============================================================
+# HTTP 服务
+# ============================================================
+class MockState:
+    """服务配置 + 计数器，所有请求线程共享"""
+
+    def __init__(self, cassette=None, llm_latency="none", tts_latency="none", asr_latency="none",
+                 tts_setup_latency="none", token_latency="none", error_rate=0.0, seed=0,
+                 chunk_chars=STREAM_CHUNK_CHARS, chunk_delay=STREAM_CHUNK_DELAY, session_idle=TTS_SESSION_IDLE):
+        self.cassette = cassette
+        self.latency = {"deepseek": Latency(llm_latency), "tts": Latency(tts_latency), "asr": Latency(asr_latency)}
+        self.setup_latency = Latency(tts_setup_latency)
+        self.token_latency = Latency(token_latency)
+        self.error_rate = error_rate
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.session_idle = session_idle
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sessions = {}   # 合成会话 id -> 最近使用时间
+        self.counts = {service: {"requests": 0, "replayed": 0, "errors": 0} for service in cassettes.SERVICES}
+        self.counts["tts"]["sessions"] = 0
+
+    def plan(self, service, entry, size=0):
+        """决定本次请求的延迟和是否注入错误"""
+        with self._lock:
+            counts = self.counts[service]
+            counts["requests"] += 1
+            counts["replayed"] += entry is not None
+            delay = self.latency[service].sample(self._rng, entry["latency"] if entry else 0.0, size)
+            failed = self._rng.random() < self.error_rate
+            counts["errors"] += failed
+            status = self._rng.choice((429, 503)) if failed else 200
+        return delay, status
+
+    def generation_delay(self, completion_tokens):
+        """生成 completion_tokens 个输出 token 的耗时（秒）"""
+        with self._lock:
+            return self.token_latency.sample(self._rng) * completion_tokens
+
+    def setup_delay(self):
+        """新建合成会话（建连 + 握手）的耗时"""
+        with self._lock:
+            return self.setup_latency.sample(self._rng)
+
+    def open_session(self):
+        with self._lock:
+            session_id = uuid.uuid4().hex
+            self._sessions[session_id] = time.monotonic()
+            self.counts["tts"]["sessions"] += 1
+            return session_id
+
+    def touch_session(self, session_id):
+        """会话还有效时刷新最近使用时间并返回 True；空闲太久的会话关闭"""
+        with self._lock:
+            last_used = self._sessions.get(session_id)
+            now = time.monotonic()
+            if last_used is None or now - last_used > self.session_idle:
+                self._sessions.pop(session_id, None)
+                return False
+            self._sessions[session_id] = now
+            return True
+
+    def lookup(self, service, request, match=None):
+        return self.cassette.lookup(service, request, match) if self.cassette is not None else None
+
+
+def make_handler(state):
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # 支持 keep-alive
+        disable_nagle_algorithm = True  # 头和正文分两次写，避免 Nagle + 延迟 ACK 的 40ms 停顿
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json(200, state.counts)
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.endswith("/chat/completions"):
+                self._chat(json.loads(body))
+            elif self.path.endswith("/dashscope/tts/session"):
+                self._tts_session()
+            elif self.path.endswith("/dashscope/tts"):
+                self._tts(json.loads(body))
+            elif self.path.endswith("/dashscope/asr"):
+                self._asr(body)
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        # ---------------- OpenAI 兼容 ----------------
+        def _chat(self, payload):
+            request = {"model": payload.get("model"), "messages": payload["messages"]}
+            last_user = _last_user_message(payload["messages"])
+            entry = state.lookup("deepseek", request, lambda r: _last_user_message(r["messages"]) == last_user)
+            delay, status = state.plan("deepseek", entry)
+            time.sleep(delay)
+            if status != 200:
+                self._send_json(status, {"error": {"message": "mock injected error", "type": "server_error"}})
+                return
+
+            content = entry["response"]["content"] if entry else synthetic_reply(payload)
+            usage = (entry["response"].get("usage") if entry else None) or {
+                "prompt_tokens": sum(len(m["content"]) for m in payload["messages"]),
+                "completion_tokens": len(content), "total_tokens": 0,
+            }
+            generation = state.generation_delay(usage.get("completion_tokens") or 0)
+            if payload.get("stream"):
+                self._chat_stream(payload, content, usage, generation)
+                return
+            time.sleep(generation)
+            self._send_json(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": payload.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+
+        def _chat_stream(self, payload, content, usage, generation=0.0):
+            """generation 是生成全部内容的耗时，按字数分摊到每块之前"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            base = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": payload.get("model")}
+            for i in range(0, len(content), state.chunk_chars):
+                if i:
+                    time.sleep(state.chunk_delay)
+                delta = {"content": content[i:i + state.chunk_chars]}
+                time.sleep(generation * len(delta["content"]) / len(content))
+                self._write_event(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+            self._write_event(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+            if payload.get("stream_options", {}).get("include_usage"):
+                self._write_event(dict(base, choices=[], usage=usage))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_event(self, data):
+            self._write_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        # ---------------- DashScope 替身 ----------------
+        def _tts_session(self):
+            time.sleep(state.setup_delay())
+            self._send_json(200, {"session": state.open_session()})
+
+        def _tts(self, payload):
+            if "session" in payload and not state.touch_session(payload["session"]):
+                self._send_json(410, {"code": "SessionClosed", "message": "session closed"})
+                return
+            request = {"text": payload["text"], "model": payload.get("model"), "voice": payload.get("voice")}
+            entry = state.lookup("tts", request, lambda r: r["text"] == payload["text"])
+            delay, status = state.plan("tts", entry, len(payload["text"]))
+            if payload.get("stream") and status == 200:
+                # 流式：合成耗时分摊到每块之前，第一块很快就到
+                delay /= TTS_STREAM_CHUNKS
+            time.sleep(delay)
+            if status != 200:
+                self._send_json(status, {"code": "Throttling", "message": "mock injected error"})
+                return
+            if entry:
+                audio, content_type = cassettes.decode_bytes(entry["response"]["audio"]), "audio/mpeg"
+            else:
+                audio_format = payload.get("format") or "mp3"
+                audio = synthetic_audio(payload["text"], audio_format)
+                content_type = "audio/wav" if audio_format == "wav" else "audio/mpeg"
+            if payload.get("stream"):
+                self._tts_stream(content_type, audio, delay)
+            else:
+                self._send(200, content_type, audio)
+
+        def _tts_stream(self, content_type, audio, chunk_delay):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            size = -(-len(audio) // TTS_STREAM_CHUNKS)
+            for i in range(0, len(audio), size):
+                if i:
+                    time.sleep(chunk_delay)
+                self._write_chunk(audio[i:i + size])
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _asr(self, audio_bytes):
+            entry = state.lookup("asr", {"audio_sha256": cassettes.audio_key(audio_bytes)})
+            delay, status = state.plan("asr", entry)
+            time.sleep(delay)
+            if status != 200:
+                self._send_json(status, {"code": "Throttling", "message": "mock injected error"})
+                return
+            self._send_json(200, {"text": entry["response"]["text"] if entry else "你好"})
+
+        # ---------------- 工具 ----------------
+        def _send_json(self, status, data):
+            self._send(status, "application/json", json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+        def _send(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MockHandler
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """在后台线程启动模拟服务，返回 (server, 根地址)；options 见 MockState"""
+    state = MockState(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+# ============================================================
+# 应用侧的 DashScope 替身客户端
+# ============================================================
+class MockSpeechClient:
+    """app.py 在设置 DASHSCOPE_MOCK_URL 时用它代替 dashscope SDK"""
+
+    def __init__(self, base_url, timeout=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def synthesize(self, text, model=None, voice=None):
+        body = json.dumps({"text": text, "model": model, "voice": voice}, ensure_ascii=False).encode("utf-8")
+        return self._post("/tts", body, "application/json")
+
+    def synthesize_stream(self, text, model=None, voice=None, on_chunk=None, chunk_size=16384):
+        """流式合成：每收到一块音频调用 on_chunk(bytes)"""
+        body = json.dumps({"text": text, "model": model, "voice": voice, "stream": True}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.base_url + "/tts", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            for chunk in iter(lambda: response.read1(chunk_size), b""):
+                on_chunk(chunk)
+
+    def recognize(self, wav_bytes):
+        return json.loads(self._post("/asr", wav_bytes, "audio/wav"))["text"]
+
+    def _post(self, path, body, content_type):
+        request = urllib.request.Request(self.base_url + path, data=body, headers={"Content-Type": content_type})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+
+class MockSpeechSession:
+    """模拟一条 DashScope WebSocket 合成连接：建立时付出握手耗时，之后在同一个 keep-alive 连接上合成多句。
+    接口与 tts_pool.CosyVoiceSession 相同"""
+
+    def __init__(self, base_url, model=None, voice=None, timeout=30.0):
+        url = urllib.parse.urlsplit(base_url.rstrip("/"))
+        self.path = url.path
+        self.model = model
+        self.voice = voice
+        self._conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+        self.session_id = json.loads(self._post("/tts/session", {}).read())["session"]
+
+    def synthesize(self, text, on_chunk=None, chunk_size=16384):
+        payload = {"text": text, "model": self.model, "voice": self.voice, "session": self.session_id,
+                   "stream": on_chunk is not None}
+        response = self._post("/tts", payload)
+        if on_chunk is None:
+            return response.read()
+        chunks = []
+        for chunk in iter(lambda: response.read1(chunk_size), b""):
+            chunks.append(chunk)
+            on_chunk(chunk)
+        return b"".join(chunks)
+
+    def is_alive(self):
+        return self._conn.sock is not None
+
+    def close(self):
+        self._conn.close()
+
+    def _post(self, path, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        try:
+            self._conn.request("POST", self.path + path, body, {"Content-Type": "application/json"})
+            response = self._conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            self._conn.close()
+            raise ConnectionError(f"语音合成连接断开: {e}") from e
+        if response.status == 410:
+            # 服务端已经关闭了这个会话，相当于连接断开
+            response.read()
+            self._conn.close()
+            raise ConnectionError("语音合成连接断开: session closed")
+        if response.status != 200:
+            # 限流等服务端错误和 SDK 一样作为普通异常抛出，连接还能继续用，不触发重连
+            error = json.loads(response.read() or b"{}")
+            raise RuntimeError(f"语音合成失败: HTTP {response.status} {error.get('code', '')}")
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--cassette", help="回放的录制文件（CASSETTE_RECORD 录制）")
+    parser.add_argument("--llm-latency", default="none")
+    parser.add_argument("--tts-latency", default="none")
+    parser.add_argument("--asr-latency", default="none")
+    parser.add_argument("--tts-setup-latency", default="none", help="新建语音合成会话（WebSocket 握手）的耗时")
+    parser.add_argument("--token-latency", default="none", help="DeepSeek 每个输出 token 的生成耗时")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 429/503 的概率")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cassette = cassettes.Cassette(args.cassette) if args.cassette else None
+    server, base_url = start_server(
+        args.host, args.port, cassette=cassette, llm_latency=args.llm_latency, tts_latency=args.tts_latency,
+        asr_latency=args.asr_latency, tts_setup_latency=args.tts_setup_latency, token_latency=args.token_latency,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    print(f"✅ 模拟服务已启动: {base_url}（录制记录 {len(cassette) if cassette else 0} 条）")
+    print(f"   DEEPSEEK_BASE_URL  = {base_url}/v1")
+    print(f"   DASHSCOPE_MOCK_URL = {base_url}/dashscope")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+CN Chinese Link - 开场白池
+- 开场白只取决于 (角色, 场景, HSK 等级)，提前生成几条存进 SQLite，进入对话时直接取一条
+- 每条只发一次（取出即删除），同一用户反复进入也不会总是同一句
+- 取走后在后台线程补足到 POOL_SIZE 条，池空时才回退到同步请求 DeepSeek
+- 存在数据库里，重启后仍然可用
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+POOL_SIZE = 3          # 每个 (角色, 场景, HSK) 保留的开场白条数
+REFILL_WORKERS = 2     # 同时在后台生成的请求数
+
+_executor = ThreadPoolExecutor(max_workers=REFILL_WORKERS, thread_name_prefix="opening-refill")
+_inflight = set()      # 正在补充的 (db_path, role, scene, hsk_level)，避免重复提交
+_inflight_lock = threading.Lock()
+
+# 计数器
+_stats = {"hits": 0, "misses": 0, "generated": 0, "failed": 0}
+
+
+def take(role, scene, hsk_level, db_path=db.DB_PATH):
+    """取出一条开场白（取出即删除），池为空时返回 None"""
+    with db.unit_of_work(db_path) as conn:
+        row = conn.execute(
+            "SELECT id, content FROM opening_pool WHERE role = ? AND scene = ? AND hsk_level = ? ORDER BY id LIMIT 1",
+            (role, scene, hsk_level)
+        ).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM opening_pool WHERE id = ?", (row[0],))
+    if row is None:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    return json.loads(row[1])
+
+
+def put(role, scene, hsk_level, content, db_path=db.DB_PATH):
+    with db.unit_of_work(db_path) as conn:
+        conn.execute(
+            "INSERT INTO opening_pool (role, scene, hsk_level, content) VALUES (?, ?, ?, ?)",
+            (role, scene, hsk_level, json.dumps(content, ensure_ascii=False))
+        )
+
+
+def size(role, scene, hsk_level, db_path=db.DB_PATH):
+    conn = db.get_connection(db_path)
+    return conn.execute(
+        "SELECT COUNT(*) FROM opening_pool WHERE role = ? AND scene = ? AND hsk_level = ?",
+        (role, scene, hsk_level)
+    ).fetchone()[0]
+
+
+def refill_async(role, scene, hsk_level, generate, db_path=db.DB_PATH, target=POOL_SIZE):
+    """在后台把池补足到 target 条
+
+    generate(role, scene, hsk_level) 返回开场白 dict，失败时返回 None 或抛出异常；
+    它在后台线程里执行，不能调用 streamlit 的界面函数。
+    同一个 key 已经在补充时直接返回 False。
+    """
+    key = (db_path, role, scene, hsk_level)
+    with _inflight_lock:
+        if key in _inflight:
+            return False
+        _inflight.add(key)
+    _executor.submit(_refill, key, generate, target)
+    return True
+
+
+def _refill(key, generate, target):
+    db_path, role, scene, hsk_level = key
+    try:
+        for _ in range(target - size(role, scene, hsk_level, db_path)):
+            content = generate(role, scene, hsk_level)
+            if not content:
+                _stats["failed"] += 1
+                return
+            put(role, scene, hsk_level, content, db_path)
+            _stats["generated"] += 1
+    except Exception:
+        _stats["failed"] += 1
+    finally:
+        with _inflight_lock:
+            _inflight.discard(key)
+
+
+def stats():
+    lookups = _stats["hits"] + _stats["misses"]
+    return dict(_stats, inflight=len(_inflight), hit_rate=_stats["hits"] / lookups if lookups else 0.0)
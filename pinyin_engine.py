@@ -0,0 +1,191 @@
+"""
+CN Chinese Link - 本地拼音生成
+- 回复的拼音不再让 DeepSeek 输出，由本地词典生成：减少约三分之一的输出 tokens，声调也更可靠
+- 词典：pypinyin 附带的单字读音表和词语读音表（只用数据，分词和消歧在这里完成）
+- 正向最长匹配分词，词语读音优先于单字默认读音
+- POLYPHONE_DICT 是消歧层：其中的词语优先级最高，覆盖词典里的读音
+- 分词之后统一做一遍上下文处理：一/不 的变调、单独出现的"得"按上下文读 de 或 děi
+- 整句结果做缓存，同一句话（开场白池、回复缓存、历史记录）只转换一次
+"""
+
+import functools
+import threading
+import unicodedata
+
+# 常见多音字：词语 -> 该多音字在词中的读音
+POLYPHONE_DICT = {
+    "行": {"银行": "háng", "行走": "xíng", "行业": "háng", "行为": "xíng", "行李": "xíng"},
+    "长": {"长大": "zhǎng", "长度": "cháng", "长辈": "zhǎng", "长江": "cháng", "成长": "zhǎng"},
+    "了": {"了解": "liǎo", "好了": "le", "完了": "le", "为了": "le", "了不起": "liǎo"},
+    "得": {"得到": "dé", "跑得快": "de", "觉得": "de", "得了": "dé", "取得": "dé",
+           "得分": "dé", "记得": "de", "值得": "de", "懂得": "de",
+           # 跟在代词后面也读 dé 的动词（她得病了），要在 DEI_AFTER 规则之前按词匹配
+           "得病": "dé", "得奖": "dé", "得罪": "dé"},
+    "地": {"地方": "dì", "慢慢地": "de", "地球": "dì", "土地": "dì"},
+    "还": {"还是": "hái", "还给": "huán", "还有": "hái", "归还": "huán"},
+    "觉": {"觉得": "jué", "睡觉": "jiào", "感觉": "jué", "午觉": "jiào"},
+    "教": {"教室": "jiào", "教书": "jiāo", "教育": "jiào", "教学": "jiāo"},
+    "乐": {"快乐": "lè", "音乐": "yuè", "乐趣": "lè", "乐器": "yuè"},
+    "难": {"难题": "nán", "困难": "nán", "难民": "nàn", "灾难": "nàn"},
+    "发": {"发现": "fā", "头发": "fà", "发展": "fā", "理发": "fà"},
+    "数": {"数学": "shù", "数数": "shǔ", "数字": "shù", "数一数": "shǔ"},
+    "重": {"重要": "zhòng", "重复": "chóng", "重量": "zhòng", "重新": "chóng"},
+    "干": {"干净": "gān", "干活": "gàn", "干部": "gàn", "干燥": "gān"},
+    "少": {"多少": "shǎo", "少年": "shào", "少数": "shǎo", "少女": "shào"},
+    "好": {"好吃": "hǎo", "爱好": "hào", "好人": "hǎo", "好奇": "hào"},
+    "分": {"分钟": "fēn", "分数": "fēn", "身分": "fèn", "成分": "fèn"},
+    "便": {"方便": "biàn", "便宜": "pián", "便利": "biàn", "大便": "biàn"},
+    "看": {"看见": "kàn", "看守": "kān", "看病": "kàn", "看护": "kān"},
+    "调": {"调查": "diào", "空调": "tiáo", "调整": "tiáo", "调动": "diào"},
+    # 这些词里的"一"读原调，不参与变调
+    "一": {"统一": "yī", "唯一": "yī", "万一": "yī", "之一": "yī", "星期一": "yī", "周一": "yī", "一月": "yī"},
+}
+
+# 变调：一 在第四声前读 yí、在其他声调前读 yì；不 在第四声前读 bú
+NUMERALS = set("零一二三四五六七八九十百千万亿两")
+DIGITS = set("零一二三四五六七八九十")     # 一 后面是百/千/万/亿 时照常变调（一百 yì bǎi）
+TONE_MARKS = {tone: set(marks) for tone, marks in {1: "āēīōūǖ", 2: "áéíóúǘń", 3: "ǎěǐǒǔǚň", 4: "àèìòùǜ"}.items()}
+
+# 单独出现的"得"：跟在主语（代词、指示词）或情态副词后面、后面还有字时是"必须"义，读 děi（我得走了、大家都得来），
+# 句首或标点后的"得"同样读 děi（好，得走了）；其他情况跟在动词、形容词后面，是补语标记，读 de（说得对、写得好）。
+# dé 只出现在词典词语里（得到、取得、得分）
+DEI_AFTER = ("我", "你", "您", "他", "她", "它", "咱", "们", "大家", "谁", "自己",
+             "这", "那", "这个", "那个", "这些", "那些",
+             "还", "也", "就", "都", "又", "总", "必须", "可能", "恐怕", "一定", "非")
+
+MAX_WORD_LEN = 8         # 参与最长匹配的最大词长
+SENTENCE_CACHE_SIZE = 4096
+
+# 中文标点 -> 拼音里使用的半角标点（NFKC 处理不了的部分）
+PUNCTUATION = {"。": ".", "、": ",", "“": '"', "”": '"', "‘": "'", "’": "'", "《": '"', "》": '"', "…": "...", "～": "~"}
+
+_words = None            # 词语 -> 每个字的读音
+_chars = None            # 单字 -> 默认读音
+_load_lock = threading.Lock()
+
+
+def is_hanzi(char):
+    return "\u4e00" <= char <= "\u9fff" or "\u3400" <= char <= "\u4dbf"
+
+
+def _load():
+    """第一次使用时加载词典（约 0.2 秒）"""
+    global _words, _chars
+    with _load_lock:
+        if _words is not None:
+            return
+        from pypinyin.phrases_dict import phrases_dict
+        from pypinyin.pinyin_dict import pinyin_dict
+
+        chars = {chr(code): readings.split(",")[0] for code, readings in pinyin_dict.items()}
+        words = {word: [r[0] for r in readings] for word, readings in phrases_dict.items() if len(word) <= MAX_WORD_LEN}
+        # 多音字消歧层：覆盖词典读音
+        for char, examples in POLYPHONE_DICT.items():
+            for word, reading in examples.items():
+                syllables = list(words.get(word) or [chars.get(c, c) for c in word])
+                for i, c in enumerate(word):
+                    if c == char:
+                        syllables[i] = reading
+                words[word] = syllables
+        _chars = chars
+        _words = words
+
+
+def segment(text):
+    """正向最长匹配，返回 [(片段, 读音列表或 None)]；非汉字片段的读音为 None"""
+    if _words is None:
+        _load()
+    result = []
+    i, n = 0, len(text)
+    while i < n:
+        if not is_hanzi(text[i]):
+            j = i + 1
+            while j < n and not is_hanzi(text[j]):
+                j += 1
+            result.append((text[i:j], None))
+            i = j
+            continue
+        for length in range(min(MAX_WORD_LEN, n - i), 1, -1):
+            word = text[i:i + length]
+            if word in _words:
+                result.append((word, _words[word]))
+                i += length
+                break
+        else:
+            result.append((text[i], [_chars.get(text[i], text[i])]))
+            i += 1
+    return result
+
+
+def _tone(syllable):
+    for tone, marks in TONE_MARKS.items():
+        if marks & set(syllable):
+            return tone
+    return 5
+
+
+def apply_context(pieces):
+    """分词之后的上下文处理：一/不 变调，单独的"得"读 de 或 děi；返回新的 [(片段, 读音列表或 None)]
+
+    POLYPHONE_DICT["一"] 里的词按词典读音，不变调。
+    """
+    # 摊平成逐字的 [字, 读音, 所在片段下标]，变调要看相邻的字，可能跨词
+    flat = []
+    for index, (piece, syllables) in enumerate(pieces):
+        if syllables is None:
+            flat.append([None, None, index])
+        else:
+            flat.extend([char, syllable, index] for char, syllable in zip(piece, syllables))
+    fixed_yi = POLYPHONE_DICT["一"]
+    for i, (char, syllable, index) in enumerate(flat):
+        prev_char = flat[i - 1][0] if i > 0 else None
+        next_char, next_syllable = flat[i + 1][:2] if i + 1 < len(flat) else (None, None)
+        piece = pieces[index][0]
+        if char == "一" and syllable in ("yī", "yí", "yì") and piece not in fixed_yi:
+            # 句末、序数（第一）、数字里（十一、一二三）、重叠动词中间（看一看）读原调
+            if (next_char is None or prev_char in NUMERALS or prev_char == "第"
+                    or next_char in DIGITS or prev_char == next_char):
+                flat[i][1] = "yī"
+            else:
+                flat[i][1] = "yí" if _tone(next_syllable) == 4 else "yì"
+        elif char == "不" and syllable in ("bù", "bú"):
+            flat[i][1] = "bú" if next_syllable and _tone(next_syllable) == 4 else "bù"
+        elif char == "得" and len(piece) == 1 and (prev_char or next_char):
+            # 往前最多看两个字，不跨标点
+            before = ""
+            for c, _, _ in reversed(flat[max(0, i - 2):i]):
+                if c is None:
+                    break
+                before = c + before
+            if next_char is not None and (not before or before.endswith(DEI_AFTER)):
+                flat[i][1] = "děi"
+            else:
+                flat[i][1] = "de"
+    result = [(piece, None if syllables is None else []) for piece, syllables in pieces]
+    for char, syllable, index in flat:
+        if char is not None:
+            result[index][1].append(syllable)
+    return result
+
+
+@functools.lru_cache(maxsize=SENTENCE_CACHE_SIZE)
+def to_pinyin(text):
+    """整句转拼音，音节用空格分隔，标点紧跟前一个音节，例如 "你好！" -> "nǐ hǎo!" """
+    parts = []
+    for piece, syllables in apply_context(segment(text)):
+        if syllables is not None:
+            parts.extend(syllables)
+            continue
+        piece = unicodedata.normalize("NFKC", "".join(PUNCTUATION.get(c, c) for c in piece)).strip()
+        if not piece:
+            continue
+        if parts and not piece[0].isalnum():
+            parts[-1] += piece
+        else:
+            parts.append(piece)
+    return " ".join(parts)
+
+
+def cache_stats():
+    info = to_pinyin.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
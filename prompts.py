@@ -0,0 +1,52 @@
+"""
+CN Chinese Link - 系统提示词模板
+- 固定的回复规则和 JSON 格式放在最前面，所有角色/场景/等级逐字节相同，
+  DeepSeek 的上下文硬盘缓存按前缀命中，这部分只在第一次请求时计费和计算
+- 角色、场景、HSK 等级等可变部分放在固定前缀之后
+- 模板在导入时编译一次，渲染结果按 (角色, 场景, HSK) 缓存
+- 不要求模型输出拼音，拼音由 pinyin_engine.py 在本地生成
+- 按需翻译模式下也不要求输出英文翻译
+- 回复使用短键名的紧凑格式，由 wire_format.py 解码
+"""
+
+import functools
+from string import Template
+
+# 固定前缀：不要在这里插入任何变量，改动会让所有已缓存的前缀失效
+STATIC_PREFIX_WITH_ENGLISH = """你是中文学习应用中的虚拟角色。
+
+回复规则:
+1. 沉浸角色，用符合身份的语气说话
+2. 根据下方给出的学生 HSK 等级调整用语难度
+3. 回复简洁自然(1-3句话)
+
+输出紧凑JSON（c=中文回复，e=英文翻译，k=生词[词, 释义]，s=推荐回复[中文, 英文]）:
+{"c": "中文回复", "e": "英文翻译", "k": [["生词", "释义"]], "s": [["中文回复选项1", "English option 1"], ["中文回复选项2", "English option 2"], ["中文回复选项3", "English option 3"]]}
+
+只返回JSON！
+"""
+
+# 按需翻译模式：回复不带 english，点击「翻译」时再由 translation.py 翻译
+STATIC_PREFIX = STATIC_PREFIX_WITH_ENGLISH.replace("e=英文翻译，", "").replace('"e": "英文翻译", ', "")
+
+ROLE_TEMPLATE = Template("""
+角色: $role_name ($title)
+性格: $personality
+场景: $scene
+学生水平: HSK $hsk_level""")
+
+RENDER_CACHE_SIZE = 512   # 6 个角色 × 约 19 个场景 × 6 个等级，留有余量
+
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_system_prompt(role_name, title, personality, scene, hsk_level, include_english=False):
+    """固定前缀 + 角色信息"""
+    prefix = STATIC_PREFIX_WITH_ENGLISH if include_english else STATIC_PREFIX
+    return prefix + ROLE_TEMPLATE.substitute(
+        role_name=role_name, title=title, personality=personality, scene=scene, hsk_level=hsk_level
+    )
+
+
+def cache_stats():
+    info = render_system_prompt.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
@@ -0,0 +1,99 @@
+"""
+CN Chinese Link - LLM 回复缓存
+- 低等级学生（HSK 1-2）的对话高度重复（同一角色、场景下点同一个推荐回复），相同的对话直接复用之前的回复
+- 缓存键 = (角色, 场景, HSK 等级, 归一化后的完整上下文（含滚动摘要）, 提示词版本)：
+  缓存是所有用户共享的，回复可能用到上下文里的任何细节（名字、职业），只有模型看到的内容完全相同时才能复用
+- 存在 SQLite 里，所有 Streamlit 进程共享；条目有过期时间（TTL），超过上限时按最近使用时间淘汰（LRU）
+- 每次调用都可以 bypass，避免对话陷入重复循环
+"""
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+
+import db
+import prompts
+
+MAX_HSK_LEVEL = 2           # 只缓存这个等级及以下的对话，高等级对话很少重复
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES = 5000
+EVICT_EVERY = 100           # 每写入这么多次检查一次条目数
+
+# 提示词变化后旧缓存自动失效
+PROMPT_VERSION = hashlib.sha256(prompts.STATIC_PREFIX.encode("utf-8")).hexdigest()[:12]
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s。！？!?.,，~～…]+$")
+_WHITESPACE = re.compile(r"\s+")
+
+# 计数器（本进程）
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "evicted": 0}
+
+
+def normalize_text(text):
+    """全半角统一、去掉多余空白和句末标点，"你好！" 和 "你好" 视为相同"""
+    text = unicodedata.normalize("NFKC", text).strip().lower()
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", text))
+
+
+def enabled_for(hsk_level):
+    return hsk_level <= MAX_HSK_LEVEL
+
+
+def make_key(role, scene, hsk_level, api_messages):
+    """根据本轮发给模型的全部消息（含滚动摘要）计算缓存键"""
+    payload = [PROMPT_VERSION, role, scene, hsk_level] + [[m["role"], normalize_text(m["content"])] for m in api_messages]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def get(key, ttl=TTL_SECONDS, bypass=False, db_path=db.DB_PATH):
+    """命中时返回缓存的回复，并刷新最近使用时间"""
+    if bypass:
+        _stats["bypassed"] += 1
+        return None
+    now = time.time()
+    # 先只读查询，未命中时不占用写锁；命中后才开写事务刷新使用时间
+    row = db.get_connection(db_path).execute(
+        "SELECT content FROM llm_response_cache WHERE key = ? AND created_at > ?", (key, now - ttl)
+    ).fetchone()
+    if row is None:
+        _stats["misses"] += 1
+        return None
+    with db.unit_of_work(db_path) as conn:
+        conn.execute("UPDATE llm_response_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+    _stats["hits"] += 1
+    return json.loads(row[0])
+
+
+def put(key, content, db_path=db.DB_PATH):
+    now = time.time()
+    with db.unit_of_work(db_path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_response_cache (key, content, created_at, last_used, hits) VALUES (?, ?, ?, ?, 0)",
+            (key, json.dumps(content, ensure_ascii=False), now, now)
+        )
+        _stats["writes"] += 1
+        if _stats["writes"] % EVICT_EVERY == 0:
+            evict(conn)
+
+
+def evict(conn, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+    """删除过期条目，超过上限时删除最久未使用的条目"""
+    deleted = conn.execute("DELETE FROM llm_response_cache WHERE created_at <= ?", (time.time() - ttl,)).rowcount
+    excess = conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0] - max_entries
+    if excess > 0:
+        deleted += conn.execute(
+            "DELETE FROM llm_response_cache WHERE key IN (SELECT key FROM llm_response_cache ORDER BY last_used LIMIT ?)",
+            (excess,)
+        ).rowcount
+    _stats["evicted"] += deleted
+    return deleted
+
+
+def stats(db_path=db.DB_PATH):
+    """本进程的命中率 + 缓存表的总体情况"""
+    conn = db.get_connection(db_path)
+    entries, total_hits = conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_response_cache").fetchone()
+    lookups = _stats["hits"] + _stats["misses"]
+    return dict(_stats, hit_rate=_stats["hits"] / lookups if lookups else 0.0, entries=entries, total_hits=total_hits)
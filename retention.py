@@ -0,0 +1,220 @@
+"""
+CN Chinese Link - 埋点事件归档与压缩
+- 超过保留天数的事件按批导出为压缩的列式归档文件（gzip JSON，每列一个数组）
+- 导出后从 events 表删除，并执行增量 VACUUM，让热数据库保持小巧
+- manifest.json 记录每个归档段的行数、时间范围和事件类型计数，
+  数据报告不用解压就能汇总，需要明细时用 iter_archived_events 按时间筛选读取
+- 归档段先以 pending 状态写进 manifest，删除提交后再去掉 pending；中途中断时，
+  读取方按 events 表里是否还有这些事件判断归档段是否生效，下次归档时补完或丢弃
+
+使用方法：
+    python retention.py [--days 90] [--archive-dir event_archive] [--db chinese_learning.db]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import db
+import rollups
+
+RETENTION_DAYS = 90            # 默认保留最近 90 天的事件
+ARCHIVE_DIR = "event_archive"
+BATCH_ROWS = 50000             # 每个归档段的最大行数
+VACUUM_PAGES = 2000            # 每批删除后最多回收的页数
+
+SEGMENT_FORMAT = "cnlink-events-columnar-v1"
+COLUMNS = ("id", "user_id", "event_name", "event_data", "created_at", "role", "scene", "hsk_level")
+MANIFEST = "manifest.json"
+
+# ============================================================
+# 归档文件
+# ============================================================
+def _manifest_path(archive_dir):
+    return os.path.join(archive_dir, MANIFEST)
+
+
+def _read_manifest(archive_dir):
+    path = _manifest_path(archive_dir)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["segments"]
+
+
+def _committed(conn, segment):
+    """pending 归档段的删除是否已经提交：id 不会复用，段里最小的事件 id 已不在 events 表即已提交"""
+    return conn.execute("SELECT 1 FROM events WHERE id = ?", (segment["min_id"],)).fetchone() is None
+
+
+def list_segments(archive_dir=ARCHIVE_DIR, conn=None):
+    """读取 manifest，返回已生效的归档段列表（按时间顺序）
+
+    pending 的归档段只有在事件已经从 events 表删除时才算生效，避免和表里的事件重复计数；
+    不传 conn 时无法判断，一律跳过。
+    """
+    return [s for s in _read_manifest(archive_dir)
+            if not s.get("pending") or (conn is not None and _committed(conn, s))]
+
+
+def _save_manifest(archive_dir, segments):
+    path = _manifest_path(archive_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"format": SEGMENT_FORMAT, "segments": segments}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _write_segment(archive_dir, rows):
+    """把一批事件写成列式压缩文件，返回 manifest 条目"""
+    data = {name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)}
+    ids, created = data["id"], data["created_at"]
+    filename = f"events_{min(ids)}-{max(ids)}.json.gz"
+    path = os.path.join(archive_dir, filename)
+
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump({"format": SEGMENT_FORMAT, "columns": list(COLUMNS), "data": data}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+    event_counts = {}
+    for name in data["event_name"]:
+        event_counts[name] = event_counts.get(name, 0) + 1
+    valid_times = [t for t in created if t]
+    return {
+        "file": filename,
+        "rows": len(rows),
+        "min_id": min(ids),
+        "max_id": max(ids),
+        "first_at": min(valid_times) if valid_times else None,
+        "last_at": max(valid_times) if valid_times else None,
+        "event_counts": event_counts,
+        "bytes": os.path.getsize(path),
+    }
+
+
+def read_segment(archive_dir, filename):
+    """读取一个归档段，返回 {列名: 数组}"""
+    with gzip.open(os.path.join(archive_dir, filename), "rt", encoding="utf-8") as f:
+        return json.load(f)["data"]
+
+
+def iter_archived_events(archive_dir=ARCHIVE_DIR, since=None, until=None, event_name=None, conn=None):
+    """按条件遍历归档事件，每行是与 COLUMNS 对应的元组
+
+    since / until 是 created_at 字符串范围 [since, until)，
+    先用 manifest 里的时间范围跳过不相关的归档段，再解压读取。conn 同 list_segments。
+    """
+    for segment in list_segments(archive_dir, conn):
+        if since and segment["last_at"] and segment["last_at"] < since:
+            continue
+        if until and segment["first_at"] and segment["first_at"] >= until:
+            continue
+        if event_name and event_name not in segment["event_counts"]:
+            continue
+        data = read_segment(archive_dir, segment["file"])
+        for row in zip(*(data[name] for name in COLUMNS)):
+            created_at = row[4] or ""
+            if since and created_at < since:
+                continue
+            if until and created_at >= until:
+                continue
+            if event_name and row[2] != event_name:
+                continue
+            yield row
+
+# ============================================================
+# 归档 + 删除 + 压缩
+# ============================================================
+def _ensure_incremental_vacuum(conn):
+    """auto_vacuum 只能在 VACUUM 时切换，只需要做一次"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+def archive_old_events(conn, days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR, batch_rows=BATCH_ROWS):
+    """把 days 天之前的事件归档并从 events 表删除，返回归档的行数"""
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    _ensure_incremental_vacuum(conn)
+
+    # 上次中断留下的 pending 归档段：删除已提交的补完，未提交的丢弃（事件还在表里，这次重新归档）
+    manifest = _read_manifest(archive_dir)
+    segments = [dict(s, pending=False) if s.get("pending") else s
+                for s in manifest if not s.get("pending") or _committed(conn, s)]
+    if segments != manifest:
+        _save_manifest(archive_dir, segments)
+    archived = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 删除前先确保这些事件已经计入汇总表，归档后报表总数不变
+            rollups.apply_new_events(conn)
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM events WHERE created_at < ? ORDER BY created_at, id LIMIT ?",
+                (cutoff, batch_rows)
+            ).fetchall()
+            if not rows:
+                conn.execute("ROLLBACK")
+                break
+            segment = _write_segment(archive_dir, rows)
+            conn.executemany("DELETE FROM events WHERE id = ?", [(row[0],) for row in rows])
+            # 先以 pending 写进 manifest 再提交删除：反过来的顺序中断后事件已经删除却不在 manifest 里，报表就读不到了；
+            # pending 期间读取方按 events 表判断是否生效，不会和表里的事件重复计数。
+            # 同一 id 范围重跑时覆盖旧条目，避免重复计数
+            previous = segments
+            segments = [s for s in segments if s["file"] != segment["file"]] + [dict(segment, pending=True)]
+            _save_manifest(archive_dir, segments)
+            try:
+                conn.execute("COMMIT")
+            except BaseException:
+                segments = previous
+                _save_manifest(archive_dir, segments)
+                raise
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        segments = segments[:-1] + [dict(segment, pending=False)]
+        _save_manifest(archive_dir, segments)
+        archived += len(rows)
+        # incremental_vacuum 每 step 只回收一页，execute 只走一步，要用 executescript 执行完
+        conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+
+    if archived:
+        conn.executescript("PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);")
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="保留最近多少天的事件")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--db", default=db.DB_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ 数据库文件不存在: {args.db}")
+        return
+
+    conn = db.get_connection(args.db)
+    size_before = os.path.getsize(args.db)
+    try:
+        archived = archive_old_events(conn, args.days, args.archive_dir)
+    except sqlite3.Error as e:
+        print(f"❌ 归档失败: {e}")
+        return
+    finally:
+        size_after = os.path.getsize(args.db)
+        db.close_all()
+
+    print(f"✅ 归档 {archived} 条事件 -> {args.archive_dir}")
+    print(f"   数据库大小: {size_before / 1024:.0f}KB -> {size_after / 1024:.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+CN Chinese Link - 统计汇总表
+- 按天汇总事件数（event_name）和对话分布（role, scene, hsk_level）
+- 以 events.id 为高水位增量累加，每次只处理新增事件
+- 管理后台和数据报告只读汇总表，耗时不随事件总数增长
+"""
+
+# 汇总表中代替 NULL 的默认值，与报表原来的显示口径一致
+UNKNOWN = "未知"
+DEFAULT_HSK = 3
+
+STATE_KEY = "events"
+
+
+def apply_new_events(conn):
+    """把高水位之后的新事件累加进汇总表，返回处理的事件数
+
+    调用方必须已经处在写事务中（例如 `with conn:` 里刚插入过事件），
+    这样多个进程并发调用也不会重复累加。
+    `+event_name` 禁止走 event_name 索引，确保只按 id 范围读取新增部分。
+    """
+    row = conn.execute("SELECT last_event_id FROM rollup_state WHERE name = ?", (STATE_KEY,)).fetchone()
+    last_id = row[0] if row else 0
+    max_id = conn.execute("SELECT MAX(id) FROM events").fetchone()[0]
+    if max_id is None or max_id <= last_id:
+        return 0
+
+    conn.execute("""
+        INSERT INTO rollup_daily_events (day, event_name, count)
+        SELECT COALESCE(date(created_at), ''), COALESCE(event_name, ''), COUNT(*)
+        FROM events WHERE id > ? AND id <= ?
+        GROUP BY 1, 2
+        ON CONFLICT (day, event_name) DO UPDATE SET count = count + excluded.count
+    """, (last_id, max_id))
+
+    conn.execute("""
+        INSERT INTO rollup_daily_conversations (day, role, scene, hsk_level, count)
+        SELECT COALESCE(date(created_at), ''), COALESCE(role, ?), COALESCE(scene, ?), COALESCE(hsk_level, ?), COUNT(*)
+        FROM events WHERE id > ? AND id <= ? AND +event_name = 'conversation_started'
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (day, role, scene, hsk_level) DO UPDATE SET count = count + excluded.count
+    """, (UNKNOWN, UNKNOWN, DEFAULT_HSK, last_id, max_id))
+
+    conn.execute("""
+        INSERT INTO rollup_state (name, last_event_id) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET last_event_id = excluded.last_event_id
+    """, (STATE_KEY, max_id))
+
+    return conn.execute("SELECT COUNT(*) FROM events WHERE id > ? AND id <= ?", (last_id, max_id)).fetchone()[0]
+
+
+def refresh(conn):
+    """在独立的 IMMEDIATE 事务中追上最新事件（报表打开前调用）"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        processed = apply_new_events(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return processed
+
+# ============================================================
+# 读取
+# ============================================================
+def event_counts(conn, day=None):
+    """各类事件总数 {event_name: count}，可只看某一天"""
+    if day:
+        cursor = conn.execute("SELECT event_name, SUM(count) FROM rollup_daily_events WHERE day = ? GROUP BY event_name", (day,))
+    else:
+        cursor = conn.execute("SELECT event_name, SUM(count) FROM rollup_daily_events GROUP BY event_name")
+    return dict(cursor.fetchall())
+
+
+def conversation_counts(conn, *columns):
+    """conversation_started 按 role / scene / hsk_level 分组计数
+
+    传一个列名时 key 是该列的值，多个列名时 key 是元组。
+    """
+    group = ", ".join(columns)
+    rows = conn.execute(f"SELECT {group}, SUM(count) FROM rollup_daily_conversations GROUP BY {group}").fetchall()
+    if len(columns) == 1:
+        return {row[0]: row[1] for row in rows}
+    return {row[:-1]: row[-1] for row in rows}
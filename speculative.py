@@ -0,0 +1,94 @@
+"""
+CN Chinese Link - 推荐回复的预测性预取
+- 用户阅读角色回复时，在后台为每个推荐回复提前请求 AI 的下一句
+- 用户点击推荐回复时直接使用已经生成（或正在生成）的结果，不再等完整的一次请求
+- 用户输入了别的内容时，取消尚未开始的预取，已经在跑的结果直接丢弃
+- 成本上限：全进程同时进行的预取请求数 MAX_INFLIGHT，每个会话累计最多 SESSION_BUDGET 次
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_BRANCHES = 3       # 每轮最多预取的推荐回复数
+MAX_INFLIGHT = 6       # 全进程同时进行的预取请求上限，满了就不再预取
+SESSION_BUDGET = 30    # 每个会话累计最多发起的预取请求数
+WAIT_TIMEOUT = 30.0    # 点击时预取还没完成，最多等待这么久
+
+_executor = ThreadPoolExecutor(max_workers=MAX_INFLIGHT, thread_name_prefix="speculative")
+_inflight = threading.BoundedSemaphore(MAX_INFLIGHT)
+
+
+class Speculator:
+    """一个会话的预取状态（存放在 st.session_state 中，只在页面线程里调用）"""
+
+    def __init__(self, budget=SESSION_BUDGET):
+        self.budget = budget
+        self._anchor = None     # 这批预取对应的角色回复（按对象身份比较）
+        self._branches = {}     # 推荐回复文本 -> future
+
+        # 计数器
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.wasted = 0         # 已经发出但没用上的请求
+        self.skipped = 0        # 超出并发或预算没有预取
+
+    def prefetch(self, anchor, texts, generate):
+        """为 anchor 之后的每个推荐回复预取 generate(text) 的结果，同一 anchor 只预取一次"""
+        if anchor is self._anchor:
+            return
+        self.discard()
+        self._anchor = anchor
+        for text in texts[:MAX_BRANCHES]:
+            if not text or text in self._branches:
+                continue
+            if self.launched >= self.budget or not _inflight.acquire(blocking=False):
+                self.skipped += 1
+                continue
+            future = _executor.submit(generate, text)
+            # 取消或完成时都会回调，释放并发名额
+            future.add_done_callback(lambda _: _inflight.release())
+            self._branches[text] = future
+            self.launched += 1
+
+    def take(self, anchor, text, timeout=WAIT_TIMEOUT):
+        """取出 text 对应的预取结果并丢弃其他分支；没有预取或预取失败时返回 None"""
+        future = self._branches.pop(text, None) if anchor is self._anchor else None
+        self.discard()
+        if future is None:
+            self.misses += 1
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except Exception:
+            self.misses += 1
+            self.wasted += 1
+            return None
+        if not result:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def discard(self):
+        """放弃当前所有分支"""
+        for future in self._branches.values():
+            if future.cancel():
+                self.cancelled += 1
+            else:
+                self.wasted += 1
+        self._branches.clear()
+        self._anchor = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "launched": self.launched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "wasted": self.wasted,
+            "skipped": self.skipped,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,63 @@
+"""
+CN Chinese Link - 按需翻译 + 翻译记忆
+- 主回复不再生成英文翻译，用户点击「📖 翻译」时才翻译
+- 翻译结果存入所有用户共享的 translation_memory 表（按中文句子的哈希），同一句话只翻译一次
+- 命中翻译记忆时立即返回，不请求模型
+"""
+
+import hashlib
+
+import db
+
+# 计数器（本进程）
+_stats = {"hits": 0, "misses": 0, "failed": 0}
+
+
+def sentence_hash(chinese):
+    return hashlib.sha256(chinese.strip().encode("utf-8")).hexdigest()
+
+
+def lookup(chinese, db_path=db.DB_PATH):
+    """查翻译记忆，命中时累计命中次数"""
+    key = sentence_hash(chinese)
+    # 只读查询，未命中时不占用写锁
+    row = db.get_connection(db_path).execute("SELECT english FROM translation_memory WHERE hash = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    with db.unit_of_work(db_path) as conn:
+        conn.execute("UPDATE translation_memory SET hits = hits + 1 WHERE hash = ?", (key,))
+    return row[0]
+
+
+def remember(chinese, english, db_path=db.DB_PATH):
+    with db.unit_of_work(db_path) as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO translation_memory (hash, chinese, english) VALUES (?, ?, ?)",
+            (sentence_hash(chinese), chinese.strip(), english)
+        )
+
+
+def translate(chinese, translate_fn, db_path=db.DB_PATH):
+    """先查翻译记忆，没有时调用 translate_fn(chinese) 翻译并记住；失败时返回 None"""
+    if not chinese.strip():
+        return ""
+    english = lookup(chinese, db_path)
+    if english is not None:
+        _stats["hits"] += 1
+        return english
+    _stats["misses"] += 1
+    try:
+        english = translate_fn(chinese)
+    except Exception:
+        _stats["failed"] += 1
+        return None
+    if english:
+        remember(chinese, english, db_path)
+    return english
+
+
+def stats(db_path=db.DB_PATH):
+    conn = db.get_connection(db_path)
+    entries, total_hits = conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM translation_memory").fetchone()
+    lookups = _stats["hits"] + _stats["misses"]
+    return dict(_stats, hit_rate=_stats["hits"] / lookups if lookups else 0.0, entries=entries, total_hits=total_hits)
@@ -0,0 +1,118 @@
+"""
+CN Chinese Link - TTS 音频磁盘缓存
+- 按 (文字, 模型, 音色, 格式, 采样率) 的哈希缓存合成结果，重启、新会话、其他用户播放同一句话都直接读文件
+- 音频文件存放在 CACHE_DIR 下，SQLite 表 tts_cache 做索引（大小、最近使用时间、命中次数）
+- 总大小超过 MAX_BYTES 时按最近使用时间淘汰（LRU）
+- 并发安全：文件先写临时文件再原子替换；索引的增删都在事务里，多个进程同时读写也不会读到半个文件
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import db
+
+CACHE_DIR = "tts_cache"
+MAX_BYTES = 200 * 1024 * 1024     # 缓存目录总大小上限
+EVICT_TO = 0.9                    # 淘汰到上限的 90%，避免每次写入都触发淘汰
+
+# 计数器（本进程）
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0, "bytes_saved": 0}
+
+
+def cache_key(text, model, voice, format, sample_rate):
+    payload = json.dumps([text, model, voice, format, sample_rate], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _file_path(cache_dir, key, format):
+    # 按哈希前两位分子目录，避免单个目录文件过多
+    return os.path.join(cache_dir, key[:2], f"{key}.{format}")
+
+
+def get(text, model, voice=None, format="mp3", sample_rate=None, cache_dir=CACHE_DIR, db_path=db.DB_PATH):
+    """命中时返回音频 bytes，并刷新最近使用时间"""
+    key = cache_key(text, model, voice, format, sample_rate)
+    conn = db.get_connection(db_path)
+    row = conn.execute("SELECT path FROM tts_cache WHERE key = ?", (key,)).fetchone()
+    audio = None
+    if row is not None:
+        try:
+            with open(os.path.join(cache_dir, row[0]), "rb") as f:
+                audio = f.read()
+        except OSError:
+            # 文件被删掉了（手动清理或其他进程刚淘汰），索引一并删除
+            with db.unit_of_work(db_path) as conn:
+                conn.execute("DELETE FROM tts_cache WHERE key = ?", (key,))
+    if not audio:
+        _stats["misses"] += 1
+        return None
+    with db.unit_of_work(db_path) as conn:
+        conn.execute("UPDATE tts_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+    _stats["hits"] += 1
+    _stats["bytes_saved"] += len(audio)
+    return audio
+
+
+def put(text, audio, model, voice=None, format="mp3", sample_rate=None, cache_dir=CACHE_DIR, db_path=db.DB_PATH,
+        max_bytes=MAX_BYTES):
+    """写入缓存，超过总大小上限时淘汰最久未使用的文件"""
+    if not audio:
+        return
+    key = cache_key(text, model, voice, format, sample_rate)
+    path = _file_path(cache_dir, key, format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+    now = time.time()
+    with db.unit_of_work(db_path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO tts_cache (key, path, bytes, created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, 0)",
+            (key, os.path.relpath(path, cache_dir), len(audio), now, now)
+        )
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM tts_cache").fetchone()[0]
+        victims = _select_victims(conn, total, max_bytes) if total > max_bytes else []
+    _stats["writes"] += 1
+    _remove_files(cache_dir, victims)
+
+
+def _select_victims(conn, total, max_bytes):
+    """在写事务中删除最久未使用的索引，返回要删除的文件；文件在事务提交后再删"""
+    victims = []
+    target = max_bytes * EVICT_TO
+    for key, path, size in conn.execute("SELECT key, path, bytes FROM tts_cache ORDER BY last_used"):
+        if total <= target:
+            break
+        victims.append((key, path))
+        total -= size
+    conn.executemany("DELETE FROM tts_cache WHERE key = ?", [(key,) for key, _ in victims])
+    return victims
+
+
+def _remove_files(cache_dir, victims):
+    for _, path in victims:
+        try:
+            os.unlink(os.path.join(cache_dir, path))
+        except OSError:
+            pass
+    _stats["evicted"] += len(victims)
+
+
+def stats(db_path=db.DB_PATH):
+    """本进程的命中率 / 节省的字节数 + 缓存的总体情况（累计命中节省的字节数按索引估算）"""
+    conn = db.get_connection(db_path)
+    entries, total_bytes, lifetime_saved = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(bytes * hits), 0) FROM tts_cache"
+    ).fetchone()
+    lookups = _stats["hits"] + _stats["misses"]
+    return dict(_stats, hit_rate=_stats["hits"] / lookups if lookups else 0.0,
+                entries=entries, total_bytes=total_bytes, lifetime_bytes_saved=lifetime_saved)
@@ -0,0 +1,300 @@
+"""
+CN Chinese Link - 语音合成会话池
+- 按 (模型, 音色) 保留已经建好连接的合成会话，用完放回，下一句不用再建立连接和 WebSocket 握手
+- 借出前做健康检查：连接已经断开或空闲超过 MAX_IDLE（服务端快要断开）的会话直接关闭，换一个新的
+- 连接断开（ConnectionError / OSError）时关闭这个会话，用新建的会话重试一次（重连）；已经交付过音频块时不重试，
+  避免重复播放；其他错误（例如服务端拒绝这段文字）重连也没用，直接抛出，连接还在的会话放回池里
+- 每个 (模型, 音色) 同时借出的会话数不超过 MAX_SESSIONS，超出时排队等待
+- 会话对象需要实现 synthesize(text, on_chunk=None) -> bytes / is_alive() / close()，连接断开时抛出 ConnectionError，
+  CosyVoiceSession 是 DashScope 的实现，mock_servers.MockSpeechSession 是本地替身
+- SDK 缺少复用连接用到的内部方法时，open_cosyvoice_session 退回每句新建一个 SpeechSynthesizer（CosyVoiceCallSession），
+  仍然是男声，并记录一条警告
+"""
+
+import inspect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_SESSIONS = 4        # 每个 (模型, 音色) 同时进行的合成数
+MAX_IDLE = 50.0         # DashScope 连接空闲约 60 秒会被服务端断开，提前换掉
+ACQUIRE_TIMEOUT = 30.0  # 等待空闲名额的最长时间
+SYNTHESIS_TIMEOUT = 30.0
+
+_warm_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tts-pool-warm")
+_pools = {}
+_pools_lock = threading.Lock()
+_reuse_unsupported = False  # 当前 SDK 不支持复用连接，已经退回每句新建合成器
+
+logger = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """合成会话池，factory(model, voice) 新建一个已连接的会话"""
+
+    def __init__(self, factory, max_sessions=MAX_SESSIONS, max_idle=MAX_IDLE):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.max_idle = max_idle
+        self._idle = {}      # (model, voice) -> [(会话, 放回时间)]，后放回的在后面
+        self._slots = {}     # (model, voice) -> BoundedSemaphore
+        self._busy = {}      # (model, voice) -> 借出中的会话数
+        self._warming = {}   # (model, voice) -> 已提交、还没建好的预热数
+        self._lock = threading.Lock()
+
+        # 计数器
+        self.created = 0
+        self.reused = 0
+        self.unhealthy = 0   # 健康检查没通过被关闭的会话
+        self.reconnects = 0  # 合成失败后换新会话重试
+        self.waits = 0       # 名额用完需要排队的次数
+        self.setup_total = 0.0
+
+    def synthesize(self, model, voice, text, on_chunk=None):
+        """借一个会话合成 text（on_chunk 不为空时流式交付音频块），用完放回"""
+        key = (model, voice)
+        slot = self._slot(key)
+        if not slot.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not slot.acquire(timeout=ACQUIRE_TIMEOUT):
+                raise TimeoutError("等待语音合成会话超时")
+        with self._lock:
+            self._busy[key] = self._busy.get(key, 0) + 1
+        try:
+            delivered = []
+
+            def deliver(chunk):
+                delivered.append(len(chunk))
+                on_chunk(chunk)
+
+            session = self._checkout(key)
+            try:
+                audio = self._synthesize_once(key, session, text, deliver if on_chunk else None)
+            except OSError:
+                if delivered:
+                    raise
+                with self._lock:
+                    self.reconnects += 1
+                session = self._create(key)
+                audio = self._synthesize_once(key, session, text, deliver if on_chunk else None)
+            self._checkin(key, session)
+            return audio
+        finally:
+            with self._lock:
+                self._busy[key] -= 1
+            slot.release()
+
+    def _synthesize_once(self, key, session, text, on_chunk):
+        """合成失败时处理会话：连接断开的关闭，其他错误时连接还在的放回池里"""
+        try:
+            return session.synthesize(text, on_chunk)
+        except OSError:
+            session.close()
+            raise
+        except Exception:
+            if session.is_alive():
+                self._checkin(key, session)
+            else:
+                session.close()
+            raise
+
+    def warm(self, model, voice, count=1):
+        """在后台预先建立连接，让第一句话也不用等握手
+
+        页面每次重新运行都会调用；空闲的、正在预热的和借出中（用完会放回）的会话都算已有，只补差额。
+        """
+        key = (model, voice)
+        with self._lock:
+            missing = (count - len(self._idle.get(key, [])) - self._warming.get(key, 0)
+                       - self._busy.get(key, 0))
+            if missing <= 0:
+                return
+            self._warming[key] = self._warming.get(key, 0) + missing
+        for _ in range(missing):
+            _warm_executor.submit(self._warm_one, key)
+
+    def _warm_one(self, key):
+        try:
+            self._checkin(key, self._create(key))
+        except Exception:
+            pass  # 预热失败不影响使用，合成时再建
+        finally:
+            with self._lock:
+                self._warming[key] -= 1
+
+    def _slot(self, key):
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.max_sessions)
+            return self._slots[key]
+
+    def _checkout(self, key):
+        """取最近放回的健康会话，没有时新建"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                session, returned_at = idle.pop()
+            if time.monotonic() - returned_at < self.max_idle and session.is_alive():
+                with self._lock:
+                    self.reused += 1
+                return session
+            session.close()
+            with self._lock:
+                self.unhealthy += 1
+        return self._create(key)
+
+    def _checkin(self, key, session):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_sessions:
+                idle.append((session, time.monotonic()))
+                return
+        session.close()
+
+    def _create(self, key):
+        start = time.monotonic()
+        session = self.factory(*key)
+        with self._lock:
+            self.created += 1
+            self.setup_total += time.monotonic() - start
+        return session
+
+    def close(self):
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session, _ in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+    def stats(self):
+        with self._lock:
+            checkouts = self.created + self.reused
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "unhealthy": self.unhealthy,
+                "reconnects": self.reconnects,
+                "waits": self.waits,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "reuse_rate": self.reused / checkouts if checkouts else 0.0,
+                "avg_setup_latency": self.setup_total / self.created if self.created else 0.0,
+            }
+
+
+def get_pool(name, factory):
+    """获取（必要时创建）共享会话池，同一 name 全进程复用"""
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = SessionPool(factory)
+        return _pools[name]
+
+
+# ============================================================
+# DashScope CosyVoice 会话
+# ============================================================
+class CosyVoiceSession:
+    """一条 DashScope WebSocket 连接，多句合成复用
+
+    SDK 没有公开复用连接的接口，这里和 SDK 自带的 SpeechSynthesizerObjectPool 一样
+    调用 SpeechSynthesizer 的内部方法：先建立连接，每次合成前重置状态并设置为用完不关闭连接。
+    """
+
+    def __init__(self, model, voice, audio_format):
+        from dashscope.audio.tts_v2 import SpeechSynthesizer
+
+        self.model = model
+        self.voice = voice
+        self.audio_format = audio_format
+        self.synthesizer = SpeechSynthesizer(model=model, voice=voice, format=audio_format)
+        # 先确认用到的内部方法都在，SDK 版本不对时在这里抛出 AttributeError / TypeError，而不是合成到一半
+        for name in ("connect", "reset", "is_connected"):
+            getattr(self.synthesizer, f"_SpeechSynthesizer__{name}")
+        update_params = self.synthesizer._SpeechSynthesizer__update_params
+        if "close_ws_after_use" not in inspect.signature(update_params).parameters:
+            raise TypeError("SpeechSynthesizer 不支持 close_ws_after_use")
+        self.synthesizer._SpeechSynthesizer__connect()
+
+    def synthesize(self, text, on_chunk=None):
+        from dashscope.audio.tts_v2 import ResultCallback
+        from websocket import WebSocketException
+
+        synthesizer = self.synthesizer
+        synthesizer._SpeechSynthesizer__reset()
+        synthesizer._SpeechSynthesizer__update_params(
+            self.model, self.voice, self.audio_format, close_ws_after_use=False
+        )
+        # 同步模式下 SDK 仍会把每块音频交给 callback.on_data，同时拼出完整音频；
+        # 会话会被复用，每次都重新设置，不流式时清掉上一句的 callback
+        callback = None
+        if on_chunk is not None:
+            callback = ResultCallback()
+            callback.on_data = lambda data: on_chunk(bytes(data))
+        synthesizer.callback = callback
+        try:
+            audio = synthesizer.call(text, timeout_millis=int(SYNTHESIS_TIMEOUT * 1000))
+        except WebSocketException as e:
+            raise ConnectionError(f"语音合成连接断开: {e}") from e
+        if not audio:
+            raise RuntimeError("语音合成失败")
+        return audio
+
+    def is_alive(self):
+        return self.synthesizer._SpeechSynthesizer__is_connected()
+
+    def close(self):
+        try:
+            self.synthesizer.close()
+        except Exception:
+            pass
+
+
+class CosyVoiceCallSession:
+    """不复用连接：每句新建一个 SpeechSynthesizer，整句合成后一次交付音频（SDK 不支持复用连接时的退路）"""
+
+    def __init__(self, model, voice, audio_format):
+        self.model = model
+        self.voice = voice
+        self.audio_format = audio_format
+
+    def synthesize(self, text, on_chunk=None):
+        from dashscope.audio.tts_v2 import SpeechSynthesizer
+
+        synthesizer = SpeechSynthesizer(model=self.model, voice=self.voice, format=self.audio_format)
+        try:
+            audio = synthesizer.call(text)
+        finally:
+            try:
+                synthesizer.close()
+            except Exception:
+                pass
+        if not audio:
+            raise RuntimeError("语音合成失败")
+        if on_chunk is not None:
+            on_chunk(audio)
+        return audio
+
+    def is_alive(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def open_cosyvoice_session(model, voice, audio_format):
+    """新建 CosyVoice 会话；SDK 缺少复用连接用到的内部方法时退回每句新建合成器，并记录警告"""
+    global _reuse_unsupported
+    if not _reuse_unsupported:
+        try:
+            return CosyVoiceSession(model, voice, audio_format)
+        except (AttributeError, TypeError) as e:
+            _reuse_unsupported = True
+            logger.warning("DashScope SDK 不支持复用语音合成连接（%s），改为每句新建 SpeechSynthesizer；"
+                           "请升级 dashscope>=1.25.2", e)
+    return CosyVoiceCallSession(model, voice, audio_format)
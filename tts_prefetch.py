@@ -0,0 +1,79 @@
+"""
+CN Chinese Link - AI 回复语音的后台预合成
+- AI 回复一到就在后台线程开始合成语音，用户点「播放」时直接拿到已合成的音频，
+  合成还没结束时等待同一个任务，不重复请求
+- 用户离开对话（重新开始、换角色）时取消尚未开始的任务，已经在跑的任务结果仍会写入 TTS 磁盘缓存
+- 每个会话只保留最近 MAX_PENDING 条未播放的任务，更早的取消
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4        # 全进程同时合成的任务数
+MAX_PENDING = 8        # 每个会话最多保留的未播放任务数
+WAIT_TIMEOUT = 30.0    # 点击播放时合成还没完成，最多等待这么久
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tts-prefetch")
+
+
+class SpeechPrefetcher:
+    """一个会话的预合成任务（存放在 st.session_state 中，只在页面线程里调用）"""
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self._jobs = OrderedDict()   # 文字 -> future
+
+        # 计数器
+        self.launched = 0
+        self.ready = 0        # 点击时已经合成好
+        self.attached = 0     # 点击时还在合成，等待同一个任务
+        self.misses = 0       # 没有预合成或预合成失败
+        self.cancelled = 0
+
+    def prefetch(self, text, synthesize):
+        """在后台执行 synthesize(text)，同一句话只提交一次"""
+        if not text or text in self._jobs:
+            return
+        self._jobs[text] = _executor.submit(synthesize, text)
+        self.launched += 1
+        while len(self._jobs) > self.max_pending:
+            _, future = self._jobs.popitem(last=False)
+            self.cancelled += future.cancel()
+
+    def take(self, text, timeout=WAIT_TIMEOUT):
+        """取出 text 的合成结果；没有预合成、超时或失败时返回 None"""
+        future = self._jobs.pop(text, None)
+        if future is None:
+            self.misses += 1
+            return None
+        done = future.done()
+        try:
+            audio = future.result(timeout=timeout)
+        except Exception:
+            audio = None
+        if not audio:
+            self.misses += 1
+            return None
+        if done:
+            self.ready += 1
+        else:
+            self.attached += 1
+        return audio
+
+    def discard(self):
+        """离开对话时取消尚未开始的任务"""
+        for future in self._jobs.values():
+            self.cancelled += future.cancel()
+        self._jobs.clear()
+
+    def stats(self):
+        plays = self.ready + self.attached + self.misses
+        return {
+            "launched": self.launched,
+            "ready": self.ready,
+            "attached": self.attached,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "pending": len(self._jobs),
+            "instant_rate": self.ready / plays if plays else 0.0,
+        }
@@ -0,0 +1,165 @@
+"""
+CN Chinese Link - 按句并行语音合成
+- 长回复按句末标点切分，各句在有上限的线程池里同时合成，总耗时接近最长的一句而不是所有句子之和
+- 每句单独走 TTS 缓存，换个说法但包含相同句子的回复也能复用
+- 拼接不重新编码：MP3 去掉 ID3 标签和 Xing/Info 头后直接拼接帧，WAV 合并采样数据后重写文件头
+- 各段格式不一致（例如男声失败退回了女声）时无法直接拼接，改为整句合成一次
+"""
+
+import io
+import re
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4        # 全进程同时合成的句子数
+MIN_CHARS = 8          # 太短的句子并入下一句，避免一个字一个请求、语调断裂
+
+_SENTENCE_RE = re.compile(r".+?(?:[。！？!?；;…]+[”’」』）)\"']*|\n+|$)", re.S)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tts-segment")
+
+# 计数器（本进程）
+_stats = {"single": 0, "segmented": 0, "segments": 0, "fallback": 0}
+
+
+class JoinError(ValueError):
+    """各段音频格式不一致，无法直接拼接"""
+
+
+def split_sentences(text):
+    """按句末标点切分，标点和后引号留在句尾；短句并入下一句"""
+    segments = []
+    pending = ""
+    for match in _SENTENCE_RE.findall(text):
+        pending += match.strip()
+        if len(pending) >= MIN_CHARS:
+            segments.append(pending)
+            pending = ""
+    if pending:
+        if segments:
+            segments[-1] += pending
+        else:
+            segments.append(pending)
+    return segments
+
+
+# ============================================================
+# 拼接
+# ============================================================
+_MP3_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],   # MPEG-1 Layer III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],        # MPEG-2 / 2.5 Layer III
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_header(data, pos):
+    """解析 pos 处的 MP3 帧头，返回 (帧长度, 采样率, 是否单声道)；不是 Layer III 帧头时返回 None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 3
+    layer = (data[pos + 1] >> 1) & 3
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[3 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (data[pos + 2] >> 1) & 1
+    length = (144 if version == 3 else 72) * bitrate // sample_rate + padding
+    return length, sample_rate, data[pos + 3] >> 6 == 3
+
+
+def _is_vbr_header(data, pos):
+    """pos 处的帧是否是 Xing/Info/VBRI 头帧：Xing/Info 紧跟在边信息之后，VBRI 固定在帧头后 32 字节"""
+    mpeg1 = (data[pos + 1] >> 3) & 3 == 3
+    mono = data[pos + 3] >> 6 == 3
+    crc = 2 if data[pos + 1] & 1 == 0 else 0
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = pos + 4 + crc + side_info
+    return data[xing:xing + 4] in (b"Xing", b"Info") or data[pos + 36:pos + 40] == b"VBRI"
+
+
+def _mp3_frames(data):
+    """去掉 ID3v2/ID3v1 标签和 Xing/Info/VBRI 头帧，返回 (音频帧, (采样率, 是否单声道))"""
+    start = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+    while start < end and _mp3_header(data, start) is None:
+        start += 1
+    header = _mp3_header(data, start)
+    if header is None:
+        raise JoinError("不是 MP3 音频")
+    length, sample_rate, mono = header
+    if _is_vbr_header(data, start):
+        start += length   # 时长信息只对原来那一段有效，拼接后删掉
+    return data[start:end], (sample_rate, mono)
+
+
+def _join_wav(parts):
+    params = None
+    frames = []
+    for part in parts:
+        with wave.open(io.BytesIO(part), "rb") as w:
+            current = (w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getcomptype())
+            if params is not None and current != params:
+                raise JoinError(f"WAV 参数不一致: {params} / {current}")
+            params = current
+            frames.append(w.readframes(w.getnframes()))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(params[0])
+        w.setsampwidth(params[1])
+        w.setframerate(params[2])
+        w.writeframes(b"".join(frames))
+    return buffer.getvalue()
+
+
+def _join_mp3(parts):
+    params = None
+    frames = []
+    for part in parts:
+        data, current = _mp3_frames(part)
+        if params is not None and current != params:
+            raise JoinError(f"MP3 参数不一致: {params} / {current}")
+        params = current
+        frames.append(data)
+    return b"".join(frames)
+
+
+def join_audio(parts):
+    """把同一格式、同一参数的多段音频拼成一段，不重新编码；不能直接拼接时抛出 JoinError"""
+    if len(parts) == 1:
+        return parts[0]
+    wav = [part[:4] == b"RIFF" for part in parts]
+    if all(wav):
+        return _join_wav(parts)
+    if any(wav):
+        raise JoinError("WAV 和 MP3 混在一起")
+    return _join_mp3(parts)
+
+
+# ============================================================
+# 合成
+# ============================================================
+def synthesize(text, synthesize_one):
+    """按句切分后并行调用 synthesize_one(句子) 再拼接；只有一句或无法拼接时整句调用一次"""
+    segments = split_sentences(text)
+    if len(segments) < 2:
+        _stats["single"] += 1
+        return synthesize_one(text)
+    parts = [future.result() for future in [_executor.submit(synthesize_one, s) for s in segments]]
+    try:
+        audio = join_audio(parts)
+    except JoinError:
+        _stats["fallback"] += 1
+        return synthesize_one(text)
+    _stats["segmented"] += 1
+    _stats["segments"] += len(segments)
+    return audio
+
+
+def stats():
+    return dict(_stats, avg_segments=_stats["segments"] / _stats["segmented"] if _stats["segmented"] else 0.0)
@@ -0,0 +1,198 @@
+"""
+CN Chinese Link - 流式语音合成与播放
+- 合成函数每收到一块音频就写进 SpeechStream 缓冲区，不等整句合成完
+- 本地播放端点 GET /tts/<id> 用分块传输把缓冲区边收边转发给浏览器，
+  <audio> 收到第一块就开始播放
+- 合成结束后完整音频交给 on_complete（写入 TTS 磁盘缓存），缓冲区保留 STREAM_TTL 秒供重复播放
+- 记录首块音频延迟（time-to-first-audio）和整句合成耗时
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_WORKERS = 4         # 全进程同时进行的流式合成数
+STREAM_TTL = 300.0      # 合成结束后缓冲区保留的秒数
+CHUNK_TIMEOUT = 30.0    # 播放端点等待下一块音频的最长时间
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tts-stream")
+_streams = {}           # id -> SpeechStream
+_lock = threading.Lock()
+_server = None
+
+# 计数器（本进程）
+_stats = {"streams": 0, "completed": 0, "failed": 0, "first_audio_total": 0.0, "first_audio_count": 0,
+          "complete_total": 0.0}
+
+
+class SpeechStream:
+    """一句话的音频缓冲区：合成线程写入，播放端点和页面线程读取"""
+
+    def __init__(self, content_type="audio/mpeg"):
+        self.id = uuid.uuid4().hex
+        self.content_type = content_type
+        self.started = time.monotonic()
+        self.first_audio_latency = None   # 首块音频延迟（秒）
+        self.total_latency = None         # 整句合成耗时（秒）
+        self.error = None
+        self.done = False
+        self._chunks = []
+        self._cond = threading.Condition()
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        with self._cond:
+            if self.first_audio_latency is None:
+                self.first_audio_latency = time.monotonic() - self.started
+                _record_first_audio(self.first_audio_latency)
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self.total_latency = time.monotonic() - self.started
+            self._cond.notify_all()
+
+    def iter_chunks(self, timeout=CHUNK_TIMEOUT):
+        """按顺序逐块返回音频，直到合成结束；合成失败或等待超时时抛出异常"""
+        index = 0
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: index < len(self._chunks) or self.done, timeout):
+                    raise TimeoutError("等待音频超时")
+                chunks = self._chunks[index:]
+                finished = self.done
+                error = self.error
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if finished and index >= len(self._chunks):
+                if error is not None:
+                    raise error
+                return
+
+    def wait_first(self, timeout=CHUNK_TIMEOUT):
+        """等到第一块音频（或合成结束），返回是否已有音频"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._chunks or self.done, timeout)
+            return bool(self._chunks)
+
+    def audio(self):
+        """目前收到的全部音频"""
+        with self._cond:
+            return b"".join(self._chunks)
+
+
+def _record_first_audio(latency):
+    with _lock:
+        _stats["first_audio_total"] += latency
+        _stats["first_audio_count"] += 1
+
+
+def start(synthesize, on_complete=None, content_type="audio/mpeg"):
+    """在后台执行 synthesize(on_chunk) 并返回 SpeechStream；成功后调用 on_complete(完整音频, synthesize 的返回值)"""
+    stream = SpeechStream(content_type)
+    with _lock:
+        _expire_locked()
+        _streams[stream.id] = stream
+        _stats["streams"] += 1
+    _executor.submit(_run, stream, synthesize, on_complete)
+    return stream
+
+
+def _run(stream, synthesize, on_complete):
+    try:
+        result = synthesize(stream.feed)
+        audio = stream.audio()
+        if not audio:
+            raise RuntimeError("语音合成失败")
+    except Exception as e:
+        stream.finish(e)
+        with _lock:
+            _stats["failed"] += 1
+        return
+    stream.finish()
+    with _lock:
+        _stats["completed"] += 1
+        _stats["complete_total"] += stream.total_latency
+    if on_complete is not None:
+        try:
+            on_complete(audio, result)
+        except Exception:
+            pass  # 写缓存失败不影响播放
+
+
+def _expire_locked():
+    now = time.monotonic()
+    expired = [key for key, s in _streams.items() if s.done and now - s.started - s.total_latency > STREAM_TTL]
+    for key in expired:
+        del _streams[key]
+
+
+def get(stream_id):
+    with _lock:
+        return _streams.get(stream_id)
+
+
+# ============================================================
+# 播放端点
+# ============================================================
+class StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # 每块音频立即发出
+
+    def do_GET(self):
+        stream = get(self.path.rstrip("/").rsplit("/", 1)[-1]) if self.path.startswith("/tts/") else None
+        if stream is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", stream.content_type)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in stream.iter_chunks():
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+        except Exception:
+            # 浏览器中途断开或合成失败：不发送结束块，浏览器按出错处理
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(host="127.0.0.1", port=0):
+    """启动播放端点（进程内只启动一次），返回根地址"""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), StreamHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="tts-stream-server", daemon=True).start()
+        return f"http://{host}:{_server.server_port}"
+
+
+def stats():
+    with _lock:
+        first_count = _stats["first_audio_count"]
+        completed = _stats["completed"]
+        return {
+            "streams": _stats["streams"],
+            "completed": completed,
+            "failed": _stats["failed"],
+            "buffered": len(_streams),
+            "avg_first_audio_latency": _stats["first_audio_total"] / first_count if first_count else 0.0,
+            "avg_complete_latency": _stats["complete_total"] / completed if completed else 0.0,
+        }
@@ -0,0 +1,180 @@
+"""
+CN Chinese Link - LLM 回复的紧凑格式与容错解码
+- 模型输出短键名 + 数组元组，减少输出 tokens：
+    {"c": "中文回复", "e": "英文翻译", "k": [["生词", "释义"]], "s": [["中文选项", "English"]]}
+- decode 把它还原成页面使用的消息格式（chinese / english / keywords / suggestions），
+  旧的完整键名格式（录制文件、旧缓存）同样可以解码
+- JSON 被截断或有小错误（代码块包裹、末尾多余逗号、字符串里的换行、缺少结尾括号）时先修复再解析，
+  只有实在拿不到中文回复时才失败
+"""
+
+import json
+
+CHINESE_KEY = "c"    # 流式解析时要逐字显示的字段
+
+FIELD_ALIASES = {"c": "chinese", "e": "english", "k": "keywords", "s": "suggestions"}
+MAX_CUT_POINTS = 20  # 修复时最多回退尝试的逗号位置数
+
+# 计数器（本进程）
+_stats = {"clean": 0, "repaired": 0, "failed": 0}
+
+
+class DecodeError(ValueError):
+    """回复无法解析出中文内容"""
+
+
+# ============================================================
+# 修复
+# ============================================================
+def _strip_fence(text):
+    """去掉 ```json ... ``` 代码块包裹"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rstrip().rstrip("`")
+    return text
+
+
+def _drop_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _closers(stack):
+    return "".join(reversed(stack))
+
+
+def repair(text):
+    """尽量把有问题的 JSON 修复成对象，失败时抛出 DecodeError
+
+    逐字符扫描，记录括号栈和对象/数组中每个逗号的位置，
+    然后补全截断的字符串和括号，或者回退到某个逗号之前的完整成员再补全。
+    """
+    text = _strip_fence(text)
+    start = text.find("{")
+    if start < 0:
+        raise DecodeError("回复中没有 JSON 对象")
+
+    out = []
+    stack = []
+    cut_points = []      # (逗号前的长度, 当时的括号栈)
+    in_string = escape = False
+    for char in text[start:]:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+            continue
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            out.append(stack.pop())   # 用期望的括号，顺便修正括号不匹配
+            if not stack:
+                break                 # 对象已完整，忽略后面多余的内容
+        elif char == ",":
+            _drop_trailing_comma(out)
+            cut_points.append((len(out), tuple(stack)))
+            out.append(char)
+        else:
+            out.append(char)
+
+    head = "".join(out)
+    if in_string:
+        head = (head[:-1] if escape else head) + '"'
+    completed = head + _closers(stack)
+    cuts = ["".join(out[:length]) + _closers(snapshot) for length, snapshot in reversed(cut_points[-MAX_CUT_POINTS:])]
+    # 被截断时优先回退到最后一个完整成员，避免留下半截的生词或推荐回复；
+    # 中文回复本身被截断时（之后没有逗号）才使用补全的半句
+    candidates = cuts + [completed] if stack or in_string else [completed] + cuts
+
+    fallback = None
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            if "c" in data or "chinese" in data:
+                return data
+            fallback = fallback or data
+    if fallback is not None:
+        return fallback
+    raise DecodeError("JSON 无法修复")
+
+
+# ============================================================
+# 解码
+# ============================================================
+def _text(value):
+    """只接受字符串；null、数字等当作空字符串，不能显示成 None"""
+    return value if isinstance(value, str) else ""
+
+
+def _pair(item, first, second):
+    """["a", "b"] / {"first": "a", "second": "b"} / "a" -> {first: "a", second: "b"}
+
+    第一个元素不是字符串时为空，调用方会丢掉这一项
+    """
+    if isinstance(item, dict):
+        return {first: _text(item.get(first)), second: _text(item.get(second))}
+    if isinstance(item, (list, tuple)):
+        return {first: _text(item[0]) if item else "", second: _text(item[1]) if len(item) > 1 else ""}
+    return {first: _text(item), second: ""}
+
+
+def to_message(data):
+    """紧凑格式或完整格式 -> 页面使用的消息格式"""
+    message = {FIELD_ALIASES.get(key, key): value for key, value in data.items()}
+    keywords = message.get("keywords")
+    suggestions = message.get("suggestions")
+    message["keywords"] = [p for p in (_pair(k, "word", "meaning") for k in keywords or []) if p["word"]] \
+        if isinstance(keywords, list) else []
+    message["suggestions"] = [p for p in (_pair(s, "cn", "en") for s in suggestions or []) if p["cn"]] \
+        if isinstance(suggestions, list) else []
+    if not isinstance(message.get("chinese", ""), str):
+        # "c": null 或数字、列表都当作没有中文回复，交给修复 / 兜底处理，不能显示成 "None"
+        message["chinese"] = ""
+    return message
+
+
+def decode(text):
+    """解析模型输出，必要时修复；没有中文回复时抛出 DecodeError"""
+    repaired = False
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        try:
+            data = repair(text)
+        except DecodeError:
+            _stats["failed"] += 1
+            raise
+        repaired = True
+
+    message = to_message(data)
+    if not message.get("chinese", "").strip():
+        _stats["failed"] += 1
+        raise DecodeError("回复中没有中文内容")
+    _stats["repaired" if repaired else "clean"] += 1
+    return message
+
+
+def stats():
+    broken = _stats["repaired"] + _stats["failed"]
+    return dict(_stats, salvage_rate=_stats["repaired"] / broken if broken else 0.0)
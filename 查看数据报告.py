@@ -5,14 +5,22 @@ CN Chinese Link - 数据查看报告
 使用方法：
 1. 双击运行此文件
 2. 或在命令行运行: python 查看数据报告.py
+3. 查询归档事件明细: python 查看数据报告.py --since 2024-01-01 --until 2024-02-01 --event message_sent
 """
 
-import sqlite3
+import argparse
+import collections
 import os
 from datetime import datetime
 
+import db
+import retention
+import rollups
+
 # 数据库路径
 DB_PATH = os.path.join(os.path.dirname(__file__), "chinese_learning.db")
+# 归档事件目录（retention.py 生成）
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), retention.ARCHIVE_DIR)
 
 def print_header(title):
     """打印标题"""
@@ -52,44 +60,19 @@ def view_users(conn):
 
 def view_role_scene_stats(conn):
     """查看角色和场景统计 - 关键业务数据"""
-    import json
-
     print_header("🎭 角色 & 场景统计 Role & Scene Analysis")
 
-    cursor = conn.execute("""
-        SELECT event_data FROM events 
-        WHERE event_name = 'conversation_started' AND event_data IS NOT NULL
-    """)
-    rows = cursor.fetchall()
+    # 直接读按天汇总表，耗时不随事件数增长
+    role_count = rollups.conversation_counts(conn, "role")
+    scene_count = rollups.conversation_counts(conn, "scene")
+    hsk_count = rollups.conversation_counts(conn, "hsk_level")
+    role_scene_pairs = {f"{role} + {scene}": count for (role, scene), count in rollups.conversation_counts(conn, "role", "scene").items()}
+    total_conversations = sum(role_count.values())
 
-    if not rows:
+    if not total_conversations:
         print("暂无对话数据")
         return
 
-    # 统计角色、场景、HSK等级
-    role_count = {}
-    scene_count = {}
-    hsk_count = {}
-    role_scene_pairs = {}
-
-    for row in rows:
-        try:
-            data = json.loads(row[0])
-            role = data.get("role", "未知")
-            scene = data.get("scene", "未知")
-            hsk = data.get("hsk_level", 3)
-
-            role_count[role] = role_count.get(role, 0) + 1
-            scene_count[scene] = scene_count.get(scene, 0) + 1
-            hsk_count[hsk] = hsk_count.get(hsk, 0) + 1
-
-            pair = f"{role} + {scene}"
-            role_scene_pairs[pair] = role_scene_pairs.get(pair, 0) + 1
-        except:
-            continue
-
-    total_conversations = len(rows)
-
     print(f"\n📊 总对话次数: {total_conversations} 次\n")
 
     # 角色排名
@@ -146,9 +129,8 @@ def view_events(conn):
         print("暂无事件记录")
         return
 
-    # 统计事件类型
-    cursor2 = conn.execute("SELECT event_name, COUNT(*) FROM events GROUP BY event_name")
-    event_stats = dict(cursor2.fetchall())
+    # 统计事件类型（汇总表）
+    event_stats = rollups.event_counts(conn)
 
     print(f"\n总事件数: {sum(event_stats.values())} 条\n")
     print("事件类型统计:")
@@ -166,6 +148,51 @@ def view_events(conn):
             print(f"  数据: {event_data}")
         print()
 
+def view_archive(conn, since=None, until=None, event_name=None, limit=20):
+    """查看已归档的历史事件：汇总只读 manifest，明细按时间范围和事件名解压查询"""
+    print_header("🗄️ 归档事件 Archived Events")
+
+    segments = retention.list_segments(ARCHIVE_DIR, conn)
+    if not segments:
+        print("暂无归档事件")
+        return
+
+    total_rows = sum(seg["rows"] for seg in segments)
+    total_bytes = sum(seg["bytes"] for seg in segments)
+    first_at = min(seg["first_at"] for seg in segments if seg["first_at"])
+    last_at = max(seg["last_at"] for seg in segments if seg["last_at"])
+
+    print(f"\n归档段数: {len(segments)} 个，共 {total_rows} 条事件，压缩后 {total_bytes / 1024:.0f}KB")
+    print(f"时间范围: {first_at} ~ {last_at}\n")
+
+    event_counts = {}
+    for seg in segments:
+        for event_name, count in seg["event_counts"].items():
+            event_counts[event_name] = event_counts.get(event_name, 0) + count
+    print("归档事件类型统计:")
+    for name, count in sorted(event_counts.items(), key=lambda x: -x[1]):
+        print(f"  - {name}: {count} 次")
+
+    # 明细：只解压时间范围内、包含该事件的归档段
+    matched = 0
+    recent = collections.deque(maxlen=limit)
+    for row in retention.iter_archived_events(ARCHIVE_DIR, since=since, until=until, event_name=event_name,
+                                                conn=conn):
+        matched += 1
+        recent.append(row)
+
+    filters = "，".join(f for f in (since and f"从 {since}", until and f"到 {until}", event_name and f"事件 {event_name}") if f)
+    print("\n" + "-" * 60)
+    print(f"归档事件明细（{filters or '全部'}）: 共 {matched} 条，显示最近 {len(recent)} 条\n")
+
+    emails = dict(conn.execute("SELECT id, email FROM users").fetchall())
+    for event_id, user_id, name, event_data, created_at, role, scene, hsk_level in reversed(recent):
+        print(f"[{created_at}] {name}")
+        print(f"  用户: {emails.get(user_id) or (f'ID={user_id}' if user_id else '匿名')}")
+        if event_data and event_data != '{}':
+            print(f"  数据: {event_data}")
+        print()
+
 def view_vocab(conn):
     """查看生词本"""
     print_header("📚 生词本 Vocabulary")
@@ -207,16 +234,16 @@ def view_summary(conn):
     # 用户统计
     user_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
 
-    # 事件统计
-    event_count = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    # 事件统计（汇总表）
+    event_count = sum(rollups.event_counts(conn).values())
 
     # 生词统计
     vocab_total = conn.execute("SELECT COUNT(*) FROM vocab").fetchone()[0]
     vocab_mastered = conn.execute("SELECT COUNT(*) FROM vocab WHERE mastered=1").fetchone()[0]
 
-    # 今日活跃
+    # 今日活跃（汇总表）
     today = datetime.now().strftime("%Y-%m-%d")
-    today_events = conn.execute(f"SELECT COUNT(*) FROM events WHERE created_at LIKE '{today}%'").fetchone()[0]
+    today_events = sum(rollups.event_counts(conn, day=today).values())
 
     print(f"""
 ┌─────────────────────────────────────┐
@@ -233,6 +260,12 @@ def view_summary(conn):
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="CN Chinese Link 后端数据报告")
+    parser.add_argument("--since", help="归档事件明细的开始时间（含），如 2024-01-01")
+    parser.add_argument("--until", help="归档事件明细的结束时间（不含）")
+    parser.add_argument("--event", help="只看某个事件名的归档明细")
+    args = parser.parse_args()
+
     print("\n" + "🇨🇳" * 20)
     print("\n   CN Chinese Link (中国缘) - 后端数据报告\n")
     print("🇨🇳" * 20)
@@ -244,8 +277,9 @@ def main():
         input("\n按回车键退出...")
         return
 
-    # 连接数据库
-    conn = sqlite3.connect(DB_PATH)
+    # 连接数据库（会自动执行尚未应用的迁移），汇总表追上最新事件
+    conn = db.get_connection(DB_PATH)
+    rollups.refresh(conn)
 
     try:
         # 显示汇总
@@ -263,12 +297,15 @@ def main():
         # 显示事件
         view_events(conn)
 
+        # 显示归档事件
+        view_archive(conn, since=args.since, until=args.until, event_name=args.event)
+
         print("\n" + "=" * 60)
         print("  报告生成完毕！")
         print("=" * 60)
 
     finally:
-        conn.close()
+        db.close_all()
 
     input("\n按回车键退出...")
 